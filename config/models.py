@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.cache import cache
 
 import uuid
 
@@ -71,10 +72,61 @@ class SchoolConfig(models.Model):
         # Removed Singleton pattern to allow multiple schools
         super().save(*args, **kwargs)
     
+    # Per-user tenant membership is cached so resolving the school of a
+    # request costs at most one query (loading the config row itself).
+    TENANT_CACHE_TIMEOUT = 300  # 5 minutes; invalidated by config.signals
+
+    @staticmethod
+    def tenant_cache_key(user_id):
+        return f'school_config_user_{user_id}'
+
+    @classmethod
+    def invalidate_user_school(cls, user_id):
+        """Forget the cached school membership of a user"""
+        if user_id:
+            cache.delete(cls.tenant_cache_key(user_id))
+
+    @classmethod
+    def get_user_school_ids(cls, user):
+        """
+        Get the ids of the schools a user is linked to, in resolution order:
+        school admin, teacher, non-teaching staff, student, transport driver.
+        Computed with a single joined query and cached per user.
+        """
+        key = cls.tenant_cache_key(user.pk)
+        school_ids = cache.get(key)
+        if school_ids is None:
+            row = User.objects.filter(pk=user.pk).values(
+                'school_config__id',
+                'teacher__school_id',
+                'staff_profile__school_id',
+                'student_profile__school_id',
+                'transport_driver_profile__school_id',
+            ).first() or {}
+            school_ids = []
+            for school_id in row.values():
+                if school_id and school_id not in school_ids:
+                    school_ids.append(school_id)
+            cache.set(key, school_ids, cls.TENANT_CACHE_TIMEOUT)
+        return school_ids
+
     @classmethod
     def get_config(cls, user=None, request=None):
         """ Get the configuration instance for a specific user/school """
-        
+        # Resolve at most once per request; SchoolTenantMiddleware exposes the
+        # result as request.school and every later call reuses it.
+        if request is not None:
+            memo_key = (getattr(user, 'pk', None), request.headers.get('X-Portal-Slug'))
+            memo = getattr(request, '_school_config_memo', None)
+            if memo and memo[0] == memo_key:
+                return memo[1]
+            config = cls._resolve_config(user, request)
+            request._school_config_memo = (memo_key, config)
+            return config
+        return cls._resolve_config(user, request)
+
+    @classmethod
+    def _resolve_config(cls, user=None, request=None):
         # 0. Check for explicit School Context via Header (if request provided)
         if request:
             portal_slug = request.headers.get('X-Portal-Slug')
@@ -85,49 +137,26 @@ class SchoolConfig(models.Model):
                     # Even if header is present, ensure user is actually allowed to access this school
                     # This prevents IDOR where a logged-in user of School A accesses School B's data by changing the header
                     if user and user.is_authenticated:
-                        is_authorized = False
-                        
-                        # 1. School Admin
-                        if config.admin == user:
-                            is_authorized = True
-                        
-                        # 2. Linked Profiles
-                        elif hasattr(user, 'teacher') and user.teacher.school == config:
-                            is_authorized = True
-                        elif hasattr(user, 'staff_profile') and user.staff_profile.school == config:
-                            is_authorized = True
-                        elif hasattr(user, 'student_profile') and user.student_profile.school == config:
-                            is_authorized = True
-                        elif hasattr(user, 'transport_driver_profile') and user.transport_driver_profile.school == config:
-                            is_authorized = True
-                        elif user.is_superuser:
-                             # Superusers can access any school if they explicitly request it via header
-                            is_authorized = True
-                            
-                        if is_authorized:
+                        # School admin or any linked profile; superusers can access any
+                        # school if they explicitly request it via header
+                        if config.pk in cls.get_user_school_ids(user) or user.is_superuser:
                             return config
                         # If not authorized, we fall through to normal user-based resolution
                         # or could raise PermissionDenied. But falling through is safer legacy behavior.
 
         if user and user.is_authenticated:
-            # 1. Check if user is an admin of a school (OneToOneField)
-            config = cls.objects.filter(admin=user).first()
-            if config:
-                # Auto-fix: If config name is Unassigned but user has a name (likely from signup), update it
-                if config.school_name == "Unassigned Account" and user.first_name:
-                    config.school_name = user.first_name
-                    config.save()
-                return config
-            
-            # 2. Check for profiles that link to a school
-            if hasattr(user, 'teacher') and user.teacher.school:
-                return user.teacher.school
-            if hasattr(user, 'staff_profile') and user.staff_profile.school:
-                return user.staff_profile.school
-            if hasattr(user, 'student_profile') and user.student_profile.school:
-                return user.student_profile.school
-            if hasattr(user, 'transport_driver_profile') and user.transport_driver_profile.school:
-                return user.transport_driver_profile.school
+            # 1. School admin first, then profiles that link to a school
+            school_ids = cls.get_user_school_ids(user)
+            if school_ids:
+                config = cls.objects.filter(pk=school_ids[0]).first()
+                if config:
+                    # Auto-fix: If config name is Unassigned but user has a name (likely from signup), update it
+                    if config.admin_id == user.pk and config.school_name == "Unassigned Account" and user.first_name:
+                        config.school_name = user.first_name
+                        config.save()
+                    return config
+                # Cached school no longer exists
+                cls.invalidate_user_school(user.pk)
 
             # 3. If no config found but user is authenticated
             # For Staff or Superusers, we fallback to the first available school instead of creating a new potentially empty one.
@@ -153,14 +182,30 @@ class SchoolConfig(models.Model):
         Generate the next admission number following the school's format.
         Generate a new admission number based on the configured format.
         """
+        # Increment for the new student
+        counter = self.reserve_admission_numbers(1)
+        return self.format_admission_number(counter, grade)
+
+    def reserve_admission_numbers(self, count):
+        """
+        Atomically advance admission_counter by `count` and return the first
+        counter value of the reserved block, so bulk imports can take many
+        numbers in one UPDATE without racing other admissions.
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            SchoolConfig.objects.filter(pk=self.pk).update(admission_counter=models.F('admission_counter') + count)
+            self.admission_counter = SchoolConfig.objects.filter(pk=self.pk).values_list(
+                'admission_counter', flat=True
+            ).get()
+        return self.admission_counter - count + 1
+
+    def format_admission_number(self, counter, grade=None):
+        """Render an admission number for a reserved counter value"""
         from schools.models import Grade
-        from django.utils import timezone
         import datetime
 
-        # Increment for the new student
-        self.admission_counter += 1
-        self.save(update_fields=['admission_counter'])
-
         # 2. Get Grade name if grade ID provided
         grade_name = ""
         if grade:
@@ -178,7 +223,7 @@ class SchoolConfig(models.Model):
         context = {
             'SCHOOL_CODE': self.school_code,
             'YEAR': self.current_year or datetime.datetime.now().year,
-            'COUNTER': self.admission_counter,
+            'COUNTER': counter,
             'GRADE': grade_name
         }
 
@@ -193,7 +238,7 @@ class SchoolConfig(models.Model):
         except Exception as e:
             # Fallback if format is invalid
             print(f"Admission Format Error: {e}")
-            fallback = f"{self.school_code}/{context['YEAR']}/{self.admission_counter:04d}"
+            fallback = f"{self.school_code}/{context['YEAR']}/{counter:04d}"
             return fallback[:50]
     
     def __str__(self):
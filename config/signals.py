@@ -0,0 +1,34 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from .models import SchoolConfig
+from schools.models import Teacher, NonTeachingStaff, Student
+from transport.models import TransportDriver
+
+# Models whose user link decides which school a user belongs to
+TENANT_LINK_MODELS = (Teacher, NonTeachingStaff, Student, TransportDriver)
+
+
+def _linked_user_id(instance):
+    if isinstance(instance, SchoolConfig):
+        return instance.admin_id
+    return instance.user_id
+
+
+def remember_previous_tenant_user(sender, instance, **kwargs):
+    """Remember the user previously linked, so re-assigning a profile clears both users"""
+    instance._tenant_previous_user_id = None
+    if instance.pk and not kwargs.get('raw'):
+        field = 'admin_id' if sender is SchoolConfig else 'user_id'
+        instance._tenant_previous_user_id = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+def invalidate_tenant_cache(sender, instance, **kwargs):
+    SchoolConfig.invalidate_user_school(_linked_user_id(instance))
+    previous = getattr(instance, '_tenant_previous_user_id', None)
+    if previous:
+        SchoolConfig.invalidate_user_school(previous)
+
+
+for model in (SchoolConfig,) + TENANT_LINK_MODELS:
+    pre_save.connect(remember_previous_tenant_user, sender=model, dispatch_uid=f'tenant_pre_save_{model.__name__}')
+    post_save.connect(invalidate_tenant_cache, sender=model, dispatch_uid=f'tenant_post_save_{model.__name__}')
+    post_delete.connect(invalidate_tenant_cache, sender=model, dispatch_uid=f'tenant_post_delete_{model.__name__}')
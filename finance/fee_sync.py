@@ -0,0 +1,111 @@
+"""
+Set-based sync of a grade's term fees after its fee structure changes.
+
+sync_grade_fees() replaces the old per-student loop (Student.save(),
+get_or_create of the finance account, an invoice lookup and an invoice
+save that re-summed the account, for every student) with a fixed number
+of statements however large the grade is:
+
+- the grade row is saved, and its post_save signal copies the term fees
+  onto the students and the fee ledger with QuerySet.update();
+- term_fees of the students currently in that term is one UPDATE;
+- missing finance accounts are created with one bulk INSERT;
+- the existing invoices for (term, year) are re-priced with one UPDATE,
+  and students without one get theirs from one bulk INSERT;
+- the account totals move by the per-account difference, one UPDATE per
+  distinct difference (see schools.account_balances).
+
+Finance invoices have no unique key per (account, term, year) (and MySQL
+cannot enforce a conditional one), so the upsert is an UPDATE of the
+invoices found plus a bulk INSERT of the rest rather than
+INSERT ... ON CONFLICT. As before, only the first invoice of an account
+is re-priced if it has several. Everything runs in one transaction.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+
+def mandatory_total(grade_id, term, year):
+    from .models import FeeStructure
+
+    return FeeStructure.objects.filter(
+        grade_id=grade_id,
+        term=term,
+        academic_year=year,
+        is_mandatory=True
+    ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+
+
+def sync_grade_fees(grade_id, term, year):
+    """
+    Bill every student of the grade the mandatory fees of (term, year).
+    Returns the number of students synced.
+    """
+    from schools import account_balances
+    from schools.dashboard import invalidate_dashboard
+    from schools.models import Grade, Student
+    from .models import StudentFinanceAccount, Transaction
+
+    term = int(term)
+    total = Decimal(mandatory_total(grade_id, term, year))
+
+    with transaction.atomic():
+        grade = Grade.objects.select_for_update().get(id=grade_id)
+        setattr(grade, f'term{term}_fees', total)
+        # post_save copies the term fees onto the students and the fee ledger
+        grade.save()
+
+        students = Student.objects.filter(grade_id=grade_id)
+        students.filter(current_term=term).update(term_fees=total)
+        student_schools = dict(students.values_list('id', 'school_id'))
+        if not student_schools:
+            return 0
+
+        accounts = dict(StudentFinanceAccount.objects.filter(
+            student_id__in=student_schools
+        ).values_list('student_id', 'id'))
+        missing = [student_id for student_id in student_schools if student_id not in accounts]
+        if missing:
+            StudentFinanceAccount.objects.bulk_create([
+                StudentFinanceAccount(student_id=student_id, school_id=student_schools[student_id])
+                for student_id in missing
+            ])
+            accounts.update(StudentFinanceAccount.objects.filter(
+                student_id__in=missing
+            ).values_list('student_id', 'id'))
+
+        # First (lowest id) invoice of each account for the term, the one the
+        # per-student .first() lookup picked; descending order lets it win
+        invoices = {}
+        for tx_id, account_id, amount in Transaction.objects.filter(
+            account_id__in=accounts.values(), type='INVOICE', term=term, academic_year=year
+        ).order_by('-id').values_list('id', 'account_id', 'amount'):
+            invoices[account_id] = (tx_id, amount)
+
+        Transaction.objects.filter(pk__in=[tx_id for tx_id, _ in invoices.values()]).update(
+            amount=total,
+            description=f"Term {term} {year} Fees (Synced)",
+        )
+        deltas = {
+            account_id: (total - amount, Decimal('0'))
+            for account_id, (_, amount) in invoices.items()
+        }
+        account_balances.apply_deltas(StudentFinanceAccount, deltas, 'last_updated')
+
+        account_balances.record_transactions(Transaction, [
+            Transaction(
+                account_id=account_id,
+                school_id=student_schools[student_id],
+                type='INVOICE',
+                amount=total,
+                description=f"Term {term} {year} Fees",
+                term=term,
+                academic_year=year
+            )
+            for student_id, account_id in accounts.items() if account_id not in invoices
+        ])
+
+    invalidate_dashboard(grade.school_id, *set(student_schools.values()))
+    return len(student_schools)
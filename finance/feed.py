@@ -0,0 +1,227 @@
+"""
+Unified transaction feed for api_finance_all_transactions.
+
+Every money movement of a school (fees, transport, food and expenses)
+lives in its own table. Instead of loading them all into Python, each
+table contributes one `.values()` query with a common column shape and
+the branches are combined with UNION ALL, so ordering, source filtering
+and slicing all happen in the database.
+
+Rows are ordered by (day desc, stream asc, id desc), where `stream`
+identifies the source table. That ordering is total, which makes it
+usable as a keyset cursor: the cursor of the last row on a page is
+pushed into every branch as a plain WHERE clause, so fetching the next
+page never scans or skips the rows already shown.
+"""
+import datetime
+
+from django.db import connection
+from django.db.models import Case, CharField, F, IntegerField, Value, When
+from django.db.models.functions import Concat, TruncDate
+from django.utils import timezone
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+FEED_COLUMNS = (
+    'feed_date', 'feed_stream', 'feed_id', 'feed_source', 'feed_type',
+    'feed_title', 'feed_amount', 'feed_method', 'feed_reference',
+)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _student_title(prefix, student_path):
+    return Concat(
+        Value(f'{prefix}: '), F(f'{student_path}__first_name'), Value(' '), F(f'{student_path}__last_name'),
+        output_field=CharField(),
+    )
+
+
+def _streams():
+    """
+    (stream, source, reference prefix, queryset factory, date field) for
+    every feed table, in the order rows of the same day are listed.
+    """
+    from schools.models import Expense, FoodFee, StudentMealPayment, TransportFee
+    from transport.models import TransportTransaction
+    from food.models import FoodTransaction
+    from .models import Transaction
+
+    return (
+        (0, 'FEES', 'FEE-', lambda school: Transaction.objects.filter(school=school).annotate(
+            feed_day=TruncDate('date'),
+            feed_type=Case(When(type='PAYMENT', then=Value('INCOME')), default=Value('BILL'), output_field=CharField()),
+            feed_title=_student_title('Fee Payment', 'account__student'),
+            feed_reference=F('reference'),
+        ), 'date'),
+        (1, 'TRANSPORT', 'TRNS-', lambda school: TransportTransaction.objects.filter(school=school, type='PAYMENT').annotate(
+            feed_day=TruncDate('date'),
+            feed_type=Value('INCOME', output_field=CharField()),
+            feed_title=_student_title('Transport', 'account__student'),
+            feed_reference=F('reference'),
+        ), 'date'),
+        (2, 'TRANSPORT', None, lambda school: TransportFee.objects.filter(school=school, status='COMPLETED').annotate(
+            feed_day=TruncDate('date'),
+            feed_type=Value('INCOME', output_field=CharField()),
+            feed_title=_student_title('Transport Fee', 'student'),
+            feed_reference=F('reference_number'),
+        ), 'date'),
+        (3, 'FOOD', None, lambda school: FoodFee.objects.filter(school=school, status='COMPLETED').annotate(
+            feed_day=TruncDate('date'),
+            feed_type=Value('INCOME', output_field=CharField()),
+            feed_title=_student_title('Food Fee', 'student'),
+            feed_reference=F('reference_number'),
+        ), 'date'),
+        (4, 'FOOD', None, lambda school: StudentMealPayment.objects.filter(school=school, status='COMPLETED').annotate(
+            feed_day=F('payment_date'),
+            feed_type=Value('INCOME', output_field=CharField()),
+            feed_title=_student_title('Meal Payment', 'student'),
+            feed_reference=F('reference_number'),
+        ), 'payment_date'),
+        (5, 'FOOD', 'FOOD-', lambda school: FoodTransaction.objects.filter(school=school, type='PAYMENT').annotate(
+            feed_day=TruncDate('date'),
+            feed_type=Value('INCOME', output_field=CharField()),
+            feed_title=_student_title('Food Payment', 'account__student'),
+            feed_reference=F('reference'),
+        ), 'date'),
+        (6, 'EXPENSE', 'EXP-', lambda school: Expense.objects.filter(school=school).annotate(
+            feed_day=F('date'),
+            feed_type=Value('OUTFLOW', output_field=CharField()),
+            feed_title=F('title'),
+            feed_reference=F('receipt_number'),
+        ), 'date'),
+    )
+
+
+def parse_cursor(raw):
+    """'YYYY-MM-DD.stream.id' -> (date, stream, id)"""
+    try:
+        day, stream, pk = raw.split('.')
+        return datetime.date.fromisoformat(day), int(stream), int(pk)
+    except (AttributeError, TypeError, ValueError):
+        raise InvalidCursor(f'Invalid cursor: {raw!r}')
+
+
+def format_cursor(day, stream, pk):
+    return f'{day.isoformat()}.{stream}.{pk}'
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def _day_filter(queryset, date_field, is_datetime, lookup, day):
+    """
+    Filter on the calendar day of date_field without wrapping the column
+    in a function, so an index on the date column stays usable.
+    """
+    if not is_datetime:
+        return queryset.filter(**{f'{date_field}__{lookup}': day})
+    if lookup == 'lt':
+        return queryset.filter(**{f'{date_field}__lt': _day_start(day)})
+    if lookup == 'lte':
+        return queryset.filter(**{f'{date_field}__lt': _day_start(day + datetime.timedelta(days=1))})
+    # exact
+    return queryset.filter(**{
+        f'{date_field}__gte': _day_start(day),
+        f'{date_field}__lt': _day_start(day + datetime.timedelta(days=1)),
+    })
+
+
+def _after_cursor(queryset, stream, date_field, cursor):
+    """Restrict one branch to the rows that sort after the cursor"""
+    day, cursor_stream, cursor_id = cursor
+    is_datetime = queryset.model._meta.get_field(date_field).get_internal_type() == 'DateTimeField'
+    if stream > cursor_stream:
+        return _day_filter(queryset, date_field, is_datetime, 'lte', day)
+    if stream < cursor_stream:
+        return _day_filter(queryset, date_field, is_datetime, 'lt', day)
+    earlier = _day_filter(queryset, date_field, is_datetime, 'lt', day)
+    same_day = _day_filter(queryset, date_field, is_datetime, 'exact', day).filter(pk__lt=cursor_id)
+    return earlier | same_day
+
+
+def _branches(school, source):
+    return [
+        (stream, prefix, factory(school), date_field)
+        for stream, stream_source, prefix, factory, date_field in _streams()
+        if not source or stream_source == source
+    ]
+
+
+def _feed_values(queryset, stream, source):
+    return queryset.annotate(
+        feed_date=F('feed_day'),
+        feed_stream=Value(stream, output_field=IntegerField()),
+        feed_id=F('pk'),
+        feed_source=Value(source, output_field=CharField()),
+        feed_amount=F('amount'),
+        feed_method=F('payment_method'),
+    ).order_by().values(*FEED_COLUMNS)
+
+
+def count_feed(school, source=None):
+    """Total number of feed rows, independent of the cursor (one query)"""
+    branches = [queryset.order_by().values_list('pk') for _, _, queryset, _ in _branches(school, source)]
+    if not branches:
+        return 0
+    if len(branches) == 1:
+        return branches[0].count()
+    return branches[0].union(*branches[1:], all=True).count()
+
+
+def fetch_feed_page(school, source=None, cursor=None, offset=0, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of the feed: (rows, has_next, next_cursor).
+    Either pass `cursor` (from a previous page's next_cursor) or a plain
+    `offset` for old page-number clients; the cursor is the cheap one.
+    """
+    sources = {stream: stream_source for stream, stream_source, _, _, _ in _streams()}
+    branches = []
+    for stream, prefix, queryset, date_field in _branches(school, source):
+        if cursor is not None:
+            queryset = _after_cursor(queryset, stream, date_field, cursor)
+        branches.append((stream, prefix, _feed_values(queryset, stream, sources[stream])))
+    if not branches:
+        return [], False, None
+
+    ordering = ('-feed_date', 'feed_stream', '-feed_id')
+    window = offset + limit + 1
+    querysets = [queryset for _, _, queryset in branches]
+    if len(branches) > 1 and connection.features.supports_slicing_ordering_in_compound:
+        # No branch can contribute more than `window` rows to the page
+        querysets = [queryset.order_by('-feed_date', '-feed_id')[:window] for queryset in querysets]
+    if len(branches) == 1:
+        combined = branches[0][2]
+    else:
+        combined = querysets[0].union(*querysets[1:], all=True)
+    rows = list(combined.order_by(*ordering)[offset:window])
+
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    prefixes = {stream: prefix for stream, prefix, _ in branches}
+    items = []
+    for row in rows:
+        day = row['feed_date']
+        if isinstance(day, datetime.datetime):
+            day = day.date()
+        reference = row['feed_reference']
+        prefix = prefixes[row['feed_stream']]
+        if not reference and prefix:
+            reference = f"{prefix}{row['feed_id']}"
+        items.append({
+            'id': row['feed_id'],
+            'source': row['feed_source'],
+            'type': row['feed_type'],
+            'title': row['feed_title'],
+            'amount': float(row['feed_amount']),
+            'date': day.strftime('%Y-%m-%d') if day else None,
+            'method': row['feed_method'],
+            'reference': reference,
+            'cursor': format_cursor(day, row['feed_stream'], row['feed_id']) if day else None,
+        })
+    next_cursor = items[-1]['cursor'] if has_next and items else None
+    return items, has_next, next_cursor
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from finance.payroll import current_month
+from finance.payslips import DEFAULT_WORKERS, parse_month, payslip_data, write_payslips
+from config.models import SchoolConfig
+
+
+class Command(BaseCommand):
+    help = 'Renders the payslips of a payroll month into a ZIP, re-rendering only the changed ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, required=True, help='SchoolConfig id')
+        parser.add_argument('--month', default=None, help='Payroll month as YYYY-MM (default: current month)')
+        parser.add_argument('--output', default=None, help='Output file (default: payslips-<YYYY-MM>.zip)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help=f'Rendering processes (default: {DEFAULT_WORKERS})',
+        )
+
+    def handle(self, *args, **options):
+        school = SchoolConfig.objects.filter(pk=options['school']).first()
+        if school is None:
+            raise CommandError(f"School {options['school']} does not exist")
+        try:
+            month = parse_month(options['month']) if options['month'] else current_month()
+        except ValueError:
+            raise CommandError(f"Invalid month {options['month']}, expected YYYY-MM")
+
+        output = options['output'] or f"payslips-{month.strftime('%Y-%m')}.zip"
+        started = time.monotonic()
+        items = payslip_data(school, month)
+        if not items:
+            self.stdout.write(self.style.WARNING(f"No payroll records for {month.strftime('%B %Y')}."))
+            return
+        self.stdout.write(f"Writing {len(items)} payslips with {options['workers']} workers...")
+
+        result = write_payslips(items, output, options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {result['written']} payslips to {output} ({result['rendered']} rendered, "
+            f"{result['cached']} from cache) in {time.monotonic() - started:.1f}s."
+        ))
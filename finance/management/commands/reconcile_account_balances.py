@@ -0,0 +1,64 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from schools.account_balances import LEDGERS, find_balance_drift, rebuild_balances
+from config.models import SchoolConfig
+
+LEDGER_NAMES = {label.split('.')[0]: label for label in LEDGERS}
+
+
+class Command(BaseCommand):
+    help = 'Verifies the cached totals of the finance, transport and food accounts against their transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ledger',
+            choices=sorted(LEDGER_NAMES),
+            action='append',
+            help='Only check this ledger (repeatable; default: all)',
+        )
+        parser.add_argument(
+            '--school',
+            type=int,
+            default=None,
+            help='Only check accounts of this SchoolConfig id',
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Recompute the totals of every account with drift',
+        )
+
+    def handle(self, *args, **options):
+        school_id = options['school']
+        if school_id is not None and not SchoolConfig.objects.filter(pk=school_id).exists():
+            raise CommandError(f"School {school_id} does not exist")
+
+        total_drift = 0
+        for name in options['ledger'] or sorted(LEDGER_NAMES):
+            model = apps.get_model(LEDGER_NAMES[name])
+            account_model = apps.get_model(LEDGERS[LEDGER_NAMES[name]][0])
+            accounts = account_model.objects.all()
+            if school_id is not None:
+                accounts = accounts.filter(school_id=school_id)
+
+            drift = find_balance_drift(model, accounts)
+            if not drift:
+                self.stdout.write(self.style.SUCCESS(f"{name}: account totals are consistent."))
+                continue
+
+            for item in drift:
+                self.stdout.write(
+                    f"{name} account {item['account_id']}: {item['field']} "
+                    f"expected {item['expected']}, cached {item['actual']}"
+                )
+            drifted_ids = {item['account_id'] for item in drift}
+            total_drift += len(drifted_ids)
+            self.stdout.write(self.style.WARNING(
+                f"{name}: {len(drift)} mismatches across {len(drifted_ids)} accounts."
+            ))
+            if options['fix']:
+                fixed = rebuild_balances(model, drifted_ids)
+                self.stdout.write(self.style.SUCCESS(f"{name}: recomputed totals for {fixed} accounts."))
+
+        if total_drift and not options['fix']:
+            self.stdout.write("Run with --fix to recompute the drifted accounts.")
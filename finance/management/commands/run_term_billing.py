@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from finance.term_billing import LEDGERS, run_term_billing
+from config.models import SchoolConfig
+
+
+class Command(BaseCommand):
+    help = 'Bills the tuition, transport and food charges of a school for one term'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, required=True, help='SchoolConfig id')
+        parser.add_argument('--term', type=int, choices=[1, 2, 3], required=True)
+        parser.add_argument('--year', required=True, help='Academic year, e.g. 2024-2025')
+        parser.add_argument(
+            '--ledger',
+            choices=LEDGERS,
+            action='append',
+            help='Only bill this ledger (repeatable; default: all)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be billed without writing anything',
+        )
+
+    def handle(self, *args, **options):
+        school = SchoolConfig.objects.filter(pk=options['school']).first()
+        if school is None:
+            raise CommandError(f"School {options['school']} does not exist")
+
+        dry_run = options['dry_run']
+        result = run_term_billing(
+            school,
+            options['term'],
+            options['year'],
+            ledgers=options['ledger'] or LEDGERS,
+            dry_run=dry_run,
+        )
+
+        if options['verbosity'] >= 2:
+            for change in result['changes']:
+                current = '-' if change['current'] is None else change['current']
+                self.stdout.write(
+                    f"{change['ledger']} {change['action']} {change['admission_number']}: "
+                    f"{current} -> {change['amount']} (term billed so far {change['billed']})"
+                )
+            for account in result['overbilled']:
+                self.stdout.write(
+                    f"{account['ledger']} overbilled {account['admission_number']}: "
+                    f"billed {account['billed']}, expected {account['expected']}"
+                )
+
+        prefix = 'Would bill' if dry_run else 'Billed'
+        for name, summary in result['ledgers'].items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{prefix} {name}: {summary['created']} new, {summary['updated']} re-priced, "
+                f"{summary['unchanged']} unchanged, net {summary['billed']}"
+            ))
+            if summary['overbilled']:
+                self.stdout.write(self.style.WARNING(
+                    f"  {summary['overbilled']} {name} accounts were billed more than expected "
+                    f"and were left alone (-v 2 lists them)"
+                ))
+        if dry_run and result['changes']:
+            self.stdout.write("Run without --dry-run to apply (-v 2 lists every change).")
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('config', '0011_systemsettings'),
+        ('finance', '0005_feecategory_school_feestructure_school_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('action', models.CharField(choices=[('REFRESH', 'Refresh'), ('GENERATE', 'Generate'), ('PAY', 'Pay')], default='REFRESH', max_length=20)),
+                ('employees', models.PositiveIntegerField(default=0)),
+                ('created', models.PositiveIntegerField(default=0)),
+                ('updated', models.PositiveIntegerField(default=0)),
+                ('paid', models.PositiveIntegerField(default=0)),
+                ('unchanged', models.PositiveIntegerField(default=0)),
+                ('total_net', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('run_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payroll_runs', to=settings.AUTH_USER_MODEL)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='payroll_runs', to='config.schoolconfig')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='payrollrecord',
+            name='run',
+            field=models.ForeignKey(blank=True, help_text='Last payroll run that wrote this record', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='records', to='finance.payrollrun'),
+        ),
+        migrations.AddIndex(
+            model_name='payrollrun',
+            index=models.Index(fields=['school', 'month'], name='finance_pay_school__68c120_idx'),
+        ),
+    ]
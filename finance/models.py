@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from schools.models import Student, Grade
+from schools import account_balances
 
 class FeeCategory(models.Model):
     school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='fee_categories', null=True, blank=True)
@@ -102,9 +103,11 @@ class Transaction(models.Model):
     def save(self, *args, **kwargs):
         if not self.school and self.account and self.account.school:
             self.school = self.account.school
-        super().save(*args, **kwargs)
-        # Update account balance automatically
-        self.account.update_balance()
+        # Apply this write's change to the account totals (reversing the stored version on edits)
+        with transaction.atomic():
+            previous = account_balances.stored_state(self)
+            super().save(*args, **kwargs)
+            account_balances.transaction_saved(self, previous)
 
     def __str__(self):
         return f"{self.type} - {self.amount} ({self.date.strftime('%Y-%m-%d')})"
@@ -144,9 +147,10 @@ class SalaryStructure(models.Model):
         except Exception:
             return 0
 
-    def net_salary(self):
+    def net_salary(self, advances=None):
+        """Pass `advances` when get_advances() was already called, to skip its queries"""
         base_net = float(self.base_salary) + float(self.allowances) - float(self.deductions) - float(self.nssf) - float(self.loans)
-        return base_net - self.get_advances()
+        return base_net - (self.get_advances() if advances is None else float(advances))
     
     def __str__(self):
         return f"Salary: {self.user.username}"
@@ -177,9 +181,43 @@ class PayrollRecord(models.Model):
     
     generated_at = models.DateTimeField(auto_now_add=True)
     paid_at = models.DateTimeField(blank=True, null=True)
+    run = models.ForeignKey('PayrollRun', on_delete=models.SET_NULL, null=True, blank=True, related_name='records', help_text="Last payroll run that wrote this record")
 
     class Meta:
         unique_together = ['user', 'month'] # One slip per user per month
     
     def __str__(self):
         return f"Payroll {self.user.username} - {self.month.strftime('%B %Y')}"
+
+
+class PayrollRun(models.Model):
+    """
+    One pass of the payroll engine (finance.payroll) over a school's month.
+    Records only change when their computed pay or status does, so the
+    counts show what each re-run actually did.
+    """
+    ACTION_CHOICES = [
+        ('REFRESH', 'Refresh'),
+        ('GENERATE', 'Generate'),
+        ('PAY', 'Pay'),
+    ]
+
+    school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='payroll_runs', null=True, blank=True)
+    month = models.DateField(help_text="First day of the month")
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES, default='REFRESH')
+    employees = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    paid = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    total_net = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    run_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='payroll_runs')
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [models.Index(fields=['school', 'month'])]
+
+    def __str__(self):
+        return f"Payroll run {self.month.strftime('%B %Y')} ({self.action})"
@@ -0,0 +1,291 @@
+"""
+Batch payroll engine behind api_finance_salaries and
+api_finance_payroll_process.
+
+Both views used to walk the employees one by one: a SalaryStructure
+get_or_create, a PayrollRecord lookup and get_advances() (two aggregates)
+per employee, with net_salary() running those aggregates again, and one
+Expense get_or_create per payment. Here a month is loaded in a fixed
+number of grouped queries (the school's employees, their structures,
+their approved advances and the month's records) and computed in one
+pass. Records, structures and expenses are then written with bulk
+INSERTs and UPDATEs.
+
+Each run_payroll() call is stored as a PayrollRun. A record is only
+written when its computed pay or its status changes, and paid records are
+never touched again, so re-running a month is incremental. The records a
+run wrote point back to it.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+ZERO = Decimal('0')
+# Base salary given to employees whose structure has none yet
+DEFAULT_BASE_SALARY = {
+    'Driver': Decimal('25000'),
+    'Teacher': Decimal('35000'),
+}
+DEFAULT_STAFF_BASE_SALARY = Decimal('20000')
+PAY_FIELDS = ('base_salary', 'allowances', 'deductions', 'nssf', 'loans', 'advances', 'net_salary')
+
+
+def current_month():
+    return timezone.now().date().replace(day=1)
+
+
+def employees(school):
+    """
+    {user_id: {'name', 'role', 'username'}} of every user linked to one
+    of the school's teachers, non-teaching staff or drivers.
+    """
+    from django.contrib.auth.models import User
+    from schools.models import NonTeachingStaff, Teacher
+    from transport.models import TransportDriver
+
+    teachers = set(Teacher.objects.filter(school=school, user__isnull=False).values_list('user_id', flat=True))
+    staff = set(NonTeachingStaff.objects.filter(school=school, user__isnull=False).values_list('user_id', flat=True))
+    drivers = set(TransportDriver.objects.filter(school=school, user__isnull=False).values_list('user_id', flat=True))
+    # A driver or teacher profile anywhere decides the role, as hasattr() did
+    user_ids = teachers | staff | drivers
+    drivers |= set(TransportDriver.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    teachers |= set(Teacher.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+
+    result = {}
+    for user_id, username, first_name, last_name, is_staff in User.objects.filter(
+        id__in=user_ids
+    ).values_list('id', 'username', 'first_name', 'last_name', 'is_staff'):
+        if user_id in drivers:
+            role = 'Driver'
+        elif user_id in teachers:
+            role = 'Teacher'
+        elif is_staff:
+            role = 'Admin'
+        else:
+            role = 'Staff'
+        result[user_id] = {
+            'name': f"{first_name} {last_name}".strip() or username,
+            'username': username,
+            'role': role,
+        }
+    return result
+
+
+def load_structures(user_ids, school):
+    """{user_id: SalaryStructure}, creating the missing ones for the school in bulk"""
+    from .models import SalaryStructure
+
+    structures = {s.user_id: s for s in SalaryStructure.objects.filter(user_id__in=user_ids)}
+    missing = [user_id for user_id in user_ids if user_id not in structures]
+    if missing:
+        SalaryStructure.objects.bulk_create(
+            [SalaryStructure(user_id=user_id, school=school) for user_id in missing],
+            ignore_conflicts=True,
+        )
+        structures.update({s.user_id: s for s in SalaryStructure.objects.filter(user_id__in=missing)})
+    return structures
+
+
+def approved_advances(user_ids):
+    """
+    {user_id: (total, salary_advance_ids)} of the approved, not yet
+    deducted advances: SalaryAdvance for teachers and staff,
+    TransportAdvanceRequest for drivers.
+    """
+    from schools.models import SalaryAdvance
+    from transport.models import TransportAdvanceRequest
+
+    user_ids = set(user_ids)
+    totals = defaultdict(lambda: ZERO)
+    advance_ids = defaultdict(list)
+    for advance_id, amount, teacher_user, staff_user in SalaryAdvance.objects.filter(
+        Q(employee__teacher__user__in=user_ids) | Q(employee__nonteachingstaff__user__in=user_ids),
+        status='APPROVED'
+    ).values_list('id', 'amount', 'employee__teacher__user', 'employee__nonteachingstaff__user'):
+        user_id = teacher_user if teacher_user in user_ids else staff_user
+        totals[user_id] += amount
+        advance_ids[user_id].append(advance_id)
+    for user_id, amount in TransportAdvanceRequest.objects.filter(
+        driver__user__in=user_ids, status='APPROVED'
+    ).values_list('driver__user', 'amount'):
+        totals[user_id] += amount
+    return {user_id: (totals[user_id], advance_ids[user_id]) for user_id in totals}
+
+
+def compute_pay(structure, advances=ZERO):
+    """The PayrollRecord pay fields for a structure and its pending advances"""
+    pay = {
+        'base_salary': Decimal(structure.base_salary),
+        'allowances': Decimal(structure.allowances),
+        'deductions': Decimal(structure.deductions),
+        'nssf': Decimal(structure.nssf),
+        'loans': Decimal(structure.loans),
+        'advances': Decimal(advances),
+    }
+    pay['net_salary'] = (
+        pay['base_salary'] + pay['allowances'] - pay['deductions'] - pay['nssf'] - pay['loans'] - pay['advances']
+    )
+    return pay
+
+
+def _month_records(user_ids, month, lock=False):
+    from .models import PayrollRecord
+
+    records = PayrollRecord.objects.filter(user_id__in=user_ids, month=month)
+    if lock:
+        records = records.select_for_update()
+    return {record.user_id: record for record in records}
+
+
+def payroll_sheet(school, month=None):
+    """
+    One row per employee of the school with the pay they would get this
+    month and the status of their record, for api_finance_salaries.
+    """
+    month = month or current_month()
+    staff = employees(school)
+    structures = load_structures(list(staff), school)
+    advances = approved_advances(staff)
+    records = _month_records(staff, month)
+
+    rows = []
+    for user_id, employee in staff.items():
+        pay = compute_pay(structures[user_id], advances.get(user_id, (ZERO, []))[0])
+        record = records.get(user_id)
+        rows.append({
+            'id': user_id,
+            'name': employee['name'],
+            'role': employee['role'],
+            **pay,
+            'status': record.status if record else 'UNPROCESSED',
+            'slip_id': record.id if record else None,
+        })
+    return rows
+
+
+def last_run(school, month=None):
+    from .models import PayrollRun
+
+    return PayrollRun.objects.filter(
+        school=school, month=month or current_month(), finished_at__isnull=False
+    ).order_by('-started_at').first()
+
+
+def run_payroll(school, user_ids=None, action='REFRESH', month=None, run_by=None):
+    """
+    Bring the month's payroll records of the given employees (all of the
+    school's by default) in line with their salary structures, then
+    GENERATE (pending -> processed) or PAY them. Paying marks the advances
+    that were deducted and records one salary Expense per employee.
+    Users that are not employees of the school are ignored.
+    Returns the finished PayrollRun.
+    """
+    from schools.models import SalaryAdvance
+    from config.models import SchoolConfig
+    from .models import PayrollRecord, PayrollRun, SalaryStructure
+
+    month = month or current_month()
+    if action not in dict(PayrollRun.ACTION_CHOICES):
+        raise ValueError(f"Invalid payroll action {action}")
+
+    with transaction.atomic():
+        # One run per school at a time, so an employee is never paid twice
+        SchoolConfig.objects.select_for_update().filter(pk=school.pk).first()
+        staff = employees(school)
+        if user_ids is not None:
+            wanted = {int(user_id) for user_id in user_ids}
+            staff = {user_id: employee for user_id, employee in staff.items() if user_id in wanted}
+        run = PayrollRun.objects.create(school=school, month=month, action=action, run_by=run_by, employees=len(staff))
+
+        structures = load_structures(list(staff), school)
+        defaulted = []
+        now = timezone.now()
+        for user_id, structure in structures.items():
+            if not structure.base_salary:
+                role = staff[user_id]['role']
+                structure.base_salary = DEFAULT_BASE_SALARY.get(role, DEFAULT_STAFF_BASE_SALARY)
+                structure.updated_at = now
+                defaulted.append(structure)
+        SalaryStructure.objects.bulk_update(defaulted, ['base_salary', 'updated_at'], batch_size=500)
+
+        advances = approved_advances(staff)
+        records = _month_records(staff, month, lock=True)
+
+        new_records, changed, paid = [], [], []
+        for user_id in staff:
+            advance_total, _ = advances.get(user_id, (ZERO, []))
+            pay = compute_pay(structures[user_id], advance_total)
+            record = records.get(user_id)
+            if record is None:
+                record = PayrollRecord(school=school, user_id=user_id, month=month, **pay)
+                new_records.append(record)
+                before = None
+            elif record.status == 'PAID':
+                continue
+            else:
+                before = [record.status] + [Decimal(getattr(record, field)) for field in PAY_FIELDS]
+                for field, value in pay.items():
+                    setattr(record, field, value)
+
+            if action == 'PAY':
+                record.status = 'PAID'
+                record.paid_at = now
+                paid.append(record)
+            elif action == 'GENERATE' and record.status == 'PENDING':
+                record.status = 'PROCESSED'
+            if before is not None and before != [record.status] + [pay[field] for field in PAY_FIELDS]:
+                changed.append(record)
+
+        for record in new_records + changed:
+            record.run = run
+        PayrollRecord.objects.bulk_create(new_records, batch_size=500)
+        PayrollRecord.objects.bulk_update(
+            changed, list(PAY_FIELDS) + ['status', 'paid_at', 'run', 'school'], batch_size=500
+        )
+
+        if paid:
+            paid_ids = {record.user_id for record in paid}
+            deducted = [
+                advance_id for user_id in paid_ids
+                for advance_id in advances.get(user_id, (ZERO, []))[1]
+            ]
+            SalaryAdvance.objects.filter(pk__in=deducted, status='APPROVED').update(status='DEDUCTED')
+            _record_expenses(school, month, paid, staff, run_by)
+
+        run.created = len(new_records)
+        run.updated = len(changed)
+        run.paid = len(paid)
+        run.unchanged = len(staff) - run.created - run.updated
+        run.total_net = sum((record.net_salary for record in new_records + changed), ZERO)
+        run.finished_at = timezone.now()
+        run.save()
+    return run
+
+
+def _record_expenses(school, month, paid, staff, run_by):
+    """One 'salaries' Expense per paid record, skipping those already recorded"""
+    from schools.models import Expense
+
+    label = month.strftime('%B %Y')
+    titles = {
+        record.user_id: f"Salary Payment: {staff[record.user_id]['name']} ({label})"
+        for record in paid
+    }
+    existing = set(Expense.objects.filter(title__in=set(titles.values())).values_list('title', flat=True))
+    today = timezone.now().date()
+    Expense.objects.bulk_create([
+        Expense(
+            school=school,
+            title=titles[record.user_id],
+            amount=record.net_salary,
+            category='salaries',
+            date=today,
+            payment_method='bank_transfer',
+            description=f"Payroll disbursement for {staff[record.user_id]['username']} for {label}",
+            created_by=run_by,
+        )
+        for record in paid if titles[record.user_id] not in existing
+    ], batch_size=500)
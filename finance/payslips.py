@@ -0,0 +1,324 @@
+"""
+Batch payslips for a payroll month.
+
+payslip_data() loads the month's PayrollRecords of a school's employees
+together with the user and their teacher, staff or driver profile in a
+few queries and turns each into a plain dict, so render_payslip() needs
+no database and runs on a process pool (schools.pdf_batch), as the term
+statements do.
+
+Rendered payslips are kept in the receipt PDF cache (schools.receipt_cache)
+under the record's id and a digest of everything the payslip prints. A
+batch only renders the payslips whose record, profile or school header
+changed since they were last rendered; the rest are read back from disk.
+write_payslips() puts them, in employee order, into one ZIP.
+"""
+import datetime
+import functools
+import hashlib
+import json
+import os
+import re
+from io import BytesIO
+
+from schools import receipt_cache
+from schools.pdf_batch import DEFAULT_WORKERS, render_batch, write_zip
+
+CACHE_KIND = 'payslip'
+# Bump when the payslip layout changes so every cached PDF is re-rendered
+RENDER_VERSION = 1
+
+
+def parse_month(value):
+    """First day of a 'YYYY-MM' month; ValueError if malformed"""
+    year, month = str(value).split('-')[:2]
+    return datetime.date(int(year), int(month), 1)
+
+
+# Data
+
+def _school_info(school):
+    logo, logo_version = None, None
+    if school is not None and getattr(school, 'school_logo', None):
+        try:
+            path = school.school_logo.path
+            if os.path.exists(path):
+                logo, logo_version = path, os.path.getmtime(path)
+        except Exception:
+            pass
+    return {
+        'name': school.school_name if school else '',
+        'address': getattr(school, 'school_address', '') or '',
+        'phone': getattr(school, 'school_phone', '') or '',
+        'email': getattr(school, 'school_email', '') or '',
+        'logo': logo,
+        'logo_version': logo_version,
+    }
+
+
+def _profile(user, role):
+    """(staff number, position, department, phone) from the user's employee or driver profile"""
+    from django.core.exceptions import ObjectDoesNotExist
+
+    for name in ('teacher', 'staff_profile'):
+        try:
+            employee = getattr(user, name)
+        except ObjectDoesNotExist:
+            continue
+        return (
+            employee.national_id,
+            employee.get_position_display(),
+            employee.department.name if employee.department else '',
+            employee.phone,
+        )
+    try:
+        driver = user.transport_driver_profile
+    except ObjectDoesNotExist:
+        return '', role, '', ''
+    return driver.license_number, 'Driver', 'Transport', driver.phone_number
+
+
+def payslip_data(school, month, user_ids=None):
+    """One dict per payroll record of `school`'s employees for `month`"""
+    from .models import PayrollRecord
+    from .payroll import employees
+
+    staff = employees(school)
+    if user_ids is not None:
+        wanted = {int(user_id) for user_id in user_ids}
+        staff = {user_id: employee for user_id, employee in staff.items() if user_id in wanted}
+    records = PayrollRecord.objects.filter(user_id__in=staff, month=month).select_related(
+        'user',
+        'user__teacher__department',
+        'user__staff_profile__department',
+        'user__transport_driver_profile',
+    )
+    school_info = _school_info(school)
+
+    items = []
+    for record in records:
+        employee = staff[record.user_id]
+        number, position, department, phone = _profile(record.user, employee['role'])
+        earnings = [('Basic salary', record.base_salary), ('Allowances', record.allowances)]
+        if record.bonus:
+            earnings.append(('Bonus', record.bonus))
+        deductions = [
+            ('Tax, NHIF & other deductions', record.deductions),
+            ('NSSF', record.nssf),
+            ('Loan repayments', record.loans),
+            ('Salary advances', record.advances),
+        ]
+        items.append({
+            'school': school_info,
+            'record_id': record.id,
+            'month': record.month,
+            'status': record.status,
+            'paid_at': record.paid_at,
+            'payment_method': record.payment_method or '',
+            'transaction_ref': record.transaction_ref or '',
+            'employee': {
+                'id': record.user_id,
+                'name': employee['name'],
+                'role': employee['role'],
+                'number': number or '',
+                'position': position or employee['role'],
+                'department': department or '',
+                'phone': phone or '',
+            },
+            'earnings': earnings,
+            'deductions': [row for row in deductions if row[1]],
+            'gross': sum(amount for _, amount in earnings),
+            'total_deductions': sum(amount for _, amount in deductions),
+            'net_salary': record.net_salary,
+        })
+    items.sort(key=lambda item: (item['employee']['name'].lower(), item['record_id']))
+    return items
+
+
+def payslip_digest(item):
+    """Digest of everything a payslip prints, the key of its cached PDF"""
+    payload = json.dumps({'version': RENDER_VERSION, 'item': item}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+# Rendering (runs in worker processes: no database access below)
+
+@functools.lru_cache(maxsize=None)
+def _styles():
+    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle
+
+    ink = colors.HexColor('#0f172a')
+    muted = colors.HexColor('#64748b')
+    accent = colors.HexColor('#4f46e5')
+    return {
+        'school': ParagraphStyle('SlipSchool', fontSize=16, fontName='Helvetica-Bold', textColor=ink, leading=19),
+        'contact': ParagraphStyle('SlipContact', fontSize=8, textColor=muted, leading=10),
+        'title': ParagraphStyle('SlipTitle', fontSize=12, fontName='Helvetica-Bold', textColor=accent, alignment=2),
+        'label': ParagraphStyle('SlipLabel', fontSize=8, textColor=muted),
+        'value': ParagraphStyle('SlipValue', fontSize=9, fontName='Helvetica-Bold', textColor=ink),
+        'section': ParagraphStyle('SlipSection', fontSize=9, fontName='Helvetica-Bold', textColor=accent, spaceBefore=6, spaceAfter=4),
+        'footer': ParagraphStyle('SlipFooter', fontSize=7, textColor=muted, alignment=1),
+        'ink': ink,
+        'light': colors.HexColor('#f1f5f9'),
+        'accent': accent,
+    }
+
+
+@functools.lru_cache(maxsize=4)
+def _logo_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def payslip_filename(item):
+    employee = item['employee']
+    name = re.sub(r'[^A-Za-z0-9]+', '_', f"{employee['name']}_{employee['id']}").strip('_')
+    return f"payslip_{item['month'].strftime('%Y-%m')}_{name}.pdf"
+
+
+def _amounts_table(title, rows, total_label, total, st):
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Table, TableStyle
+
+    data = [[title, 'Amount (KES)']]
+    data += [[label, _money(amount)] for label, amount in rows] or [['None', _money(0)]]
+    data.append([total_label, _money(total)])
+    table = Table(data, colWidths=[60*mm, 29*mm])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), st['ink']),
+        ('TEXTCOLOR', (0, 0), (-1, 0), st['light']),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('LINEABOVE', (0, -1), (-1, -1), 1, st['ink']),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [None, st['light']]),
+    ]))
+    return table
+
+
+def render_payslip(item):
+    """(filename, PDF bytes) of one payslip dict from payslip_data()"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    st = _styles()
+    employee = item['employee']
+    school = item['school']
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=14*mm, rightMargin=14*mm, topMargin=12*mm, bottomMargin=12*mm)
+    elements = []
+
+    # Header
+    logo = ''
+    if school['logo']:
+        try:
+            logo = Image(BytesIO(_logo_bytes(school['logo'])), width=16*mm, height=16*mm)
+        except Exception:
+            logo = ''
+    school_block = [
+        [Paragraph(school['name'].upper(), st['school'])],
+        [Paragraph(school['address'], st['contact'])],
+        [Paragraph(f"T: {school['phone']}  |  E: {school['email']}", st['contact'])],
+    ]
+    header = Table([[
+        logo,
+        Table(school_block, colWidths=[105*mm]),
+        Paragraph(f"PAYSLIP<br/>{item['month'].strftime('%B %Y').upper()}", st['title']),
+    ]], colWidths=[20*mm, 107*mm, 55*mm])
+    header.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LINEBELOW', (0, 0), (-1, -1), 1, st['accent']),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4*mm),
+    ]))
+    elements += [header, Spacer(1, 4*mm)]
+
+    # Employee
+    info = Table([
+        [Paragraph("Employee", st['label']), Paragraph(employee['name'].upper(), st['value']),
+         Paragraph("ID / Licence No.", st['label']), Paragraph(employee['number'] or '-', st['value'])],
+        [Paragraph("Position", st['label']), Paragraph(employee['position'], st['value']),
+         Paragraph("Department", st['label']), Paragraph(employee['department'] or '-', st['value'])],
+    ], colWidths=[25*mm, 66*mm, 30*mm, 61*mm])
+    info.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), st['light']),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 2*mm),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2*mm),
+    ]))
+    elements += [info, Spacer(1, 4*mm)]
+
+    # Earnings and deductions side by side
+    columns = Table([[
+        _amounts_table('Earnings', item['earnings'], 'Gross pay', item['gross'], st),
+        _amounts_table('Deductions', item['deductions'], 'Total deductions', item['total_deductions'], st),
+    ]], colWidths=[91*mm, 91*mm])
+    columns.setStyle(TableStyle([('VALIGN', (0, 0), (-1, -1), 'TOP')]))
+    elements += [Paragraph("PAY SUMMARY", st['section']), columns]
+
+    # Net pay
+    net = Table([["NET PAY", f"KES {_money(item['net_salary'])}"]], colWidths=[130*mm, 52*mm])
+    net.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('TEXTCOLOR', (0, 0), (-1, -1), st['ink']),
+        ('TOPPADDING', (0, 0), (-1, -1), 4*mm),
+    ]))
+    elements += [Spacer(1, 2*mm), net, Spacer(1, 4*mm)]
+
+    if item['status'] == 'PAID':
+        paid_on = item['paid_at'].strftime('%Y-%m-%d') if item['paid_at'] else ''
+        details = ', '.join(part for part in (item['payment_method'], item['transaction_ref']) if part)
+        status = f"Paid {paid_on}" + (f" ({details})" if details else '')
+    else:
+        status = f"{item['status'].title()} - not yet paid"
+    elements += [Paragraph(status, st['label']), Spacer(1, 8*mm)]
+    elements.append(Paragraph(f"Computer-generated payslip - record #{item['record_id']}", st['footer']))
+
+    doc.build(elements)
+    return payslip_filename(item), buffer.getvalue()
+
+
+# Batches
+
+def _cached_payslip(item):
+    content = receipt_cache.cached(CACHE_KIND, item['record_id'], payslip_digest(item))
+    return (payslip_filename(item), content) if content is not None else None
+
+
+def _store_payslip(item, content):
+    receipt_cache.store(CACHE_KIND, item['record_id'], payslip_digest(item), content)
+
+
+def render_payslips(items, workers=DEFAULT_WORKERS, stats=None):
+    """
+    Yield (filename, PDF bytes) for every item, in order. Cached payslips
+    are read from disk; the rest are rendered on `workers` processes and
+    cached. `stats`, if given, gets the 'cached' and 'rendered' counts.
+    """
+    return render_batch(render_payslip, items, workers, lookup=_cached_payslip, store=_store_payslip, stats=stats)
+
+
+def write_payslips(items, output, workers=DEFAULT_WORKERS):
+    """
+    Write every payslip into a ZIP at `output`, a path (written
+    atomically) or a binary file object. Returns {'written', 'cached',
+    'rendered'}.
+    """
+    stats = {}
+    written = write_zip(render_payslips(items, workers, stats), output)
+    return {'written': written, **stats}
+
+
+def payslip_pdf(item):
+    """(filename, PDF bytes) of a single payslip, served from the cache when unchanged"""
+    digest = payslip_digest(item)
+    content = receipt_cache.get_or_render(CACHE_KIND, item['record_id'], digest, lambda: render_payslip(item)[1])
+    return payslip_filename(item), content
@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from schools.models import Payment, Student
 from finance.models import Transaction, StudentFinanceAccount
+from schools import account_balances
 
 @receiver(post_save, sender=Payment)
 def sync_payment_to_finance(sender, instance, created, **kwargs):
@@ -26,3 +27,7 @@ def sync_payment_to_finance(sender, instance, created, **kwargs):
 def create_student_finance_account(sender, instance, created, **kwargs):
     if created:
         StudentFinanceAccount.objects.get_or_create(student=instance)
+
+@receiver(post_delete, sender=Transaction)
+def reverse_deleted_transaction(sender, instance, **kwargs):
+    account_balances.transaction_deleted(instance)
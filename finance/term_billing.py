@@ -0,0 +1,347 @@
+"""
+Term-opening billing run: bills a school's tuition, transport and food
+charges for one (term, academic year) in bulk.
+
+What each account owes for the term is worked out with one grouped query
+per ledger:
+
+- finance: the mandatory FeeStructure total of the student's grade;
+- transport: route.cost_per_term summed over the active TransportAssignments;
+- food: the active FoodSubscriptions to active meal items, TERMLY items at
+  their cost and MONTHLY items at three times it. DAILY and ONE_OFF items
+  are charged per serving or at sign-up and are left out of the run.
+
+That is compared with everything each account was already charged for
+the same term and year, so a run is idempotent per (account, term, year):
+an account with no charge is billed the amount, one billed less gets the
+shortfall, either by re-pricing the run's own charge of the term upward
+or, when the charges are not the run's (sync_grade_fees(), a route
+assignment, a meal sign-up), with a top-up charge. Assigning a route or
+subscribing to a termly or monthly meal charges the account straight
+away; those charges are tagged with current_period() and count as
+billed, so the run for the current term does not charge them twice.
+Charges the run did not create are never changed and no charge is
+lowered or removed: an account billed more than it is expected to owe
+(moved to a cheaper route mid-term, say) is reported as overbilled and
+left for the bursar. A dry run stops after the comparison and reports
+the diff.
+
+Applying writes one bulk INSERT per ledger for new charges, one UPDATE per
+distinct amount for re-priced ones and moves the account totals through
+schools.account_balances, all in one transaction. The school's config row
+is locked for the duration so two runs cannot bill the same term twice.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+ZERO = Decimal('0')
+LEDGERS = ('finance', 'transport', 'food')
+# Meal billing cycle -> charges per term
+FOOD_CYCLE_MULTIPLIERS = {'TERMLY': 1, 'MONTHLY': 3}
+
+
+def _descriptions(term, year):
+    return {
+        'finance': f"Term {term} {year} Fees",
+        'transport': f"Term {term} {year} Transport",
+        'food': f"Term {term} {year} Meals",
+    }
+
+
+def _ledger_models(name):
+    """(transaction model, account model, debit type) of a ledger"""
+    from food.models import FoodStudentAccount, FoodTransaction
+    from transport.models import TransportStudentAccount, TransportTransaction
+    from .models import StudentFinanceAccount, Transaction
+
+    return {
+        'finance': (Transaction, StudentFinanceAccount, 'INVOICE'),
+        'transport': (TransportTransaction, TransportStudentAccount, 'CHARGE'),
+        'food': (FoodTransaction, FoodStudentAccount, 'CHARGE'),
+    }[name]
+
+
+def _expected_finance(school, term, year):
+    """{student_id: amount} of every student of the school whose grade has mandatory fees"""
+    from schools.models import Student
+    from .models import FeeStructure
+
+    student_grades = dict(Student.objects.filter(
+        school=school, grade__isnull=False
+    ).values_list('id', 'grade_id'))
+    totals = dict(FeeStructure.objects.filter(
+        grade_id__in=set(student_grades.values()),
+        term=term,
+        academic_year=year,
+        is_mandatory=True
+    ).order_by().values('grade_id').annotate(total=Sum('amount')).values_list('grade_id', 'total'))
+    return {
+        student_id: totals[grade_id]
+        for student_id, grade_id in student_grades.items()
+        if totals.get(grade_id)
+    }
+
+
+def _expected_transport(school):
+    """{account_id: amount} from the active route assignments"""
+    from transport.models import TransportAssignment
+
+    return dict(TransportAssignment.objects.filter(
+        account__student__school=school, active=True
+    ).order_by().values('account_id').annotate(
+        total=Sum('route__cost_per_term')
+    ).values_list('account_id', 'total'))
+
+
+def _expected_food(school):
+    """{account_id: amount} from the active subscriptions to termly and monthly meals"""
+    from food.models import FoodSubscription
+
+    expected = defaultdict(lambda: ZERO)
+    rows = FoodSubscription.objects.filter(
+        account__student__school=school,
+        active=True,
+        meal_item__active=True,
+        meal_item__billing_cycle__in=FOOD_CYCLE_MULTIPLIERS
+    ).order_by().values('account_id', 'meal_item__billing_cycle').annotate(total=Sum('meal_item__cost'))
+    for row in rows:
+        expected[row['account_id']] += row['total'] * FOOD_CYCLE_MULTIPLIERS[row['meal_item__billing_cycle']]
+    return dict(expected)
+
+
+def _accounts(name, school, create_missing_for=()):
+    """
+    {account_id: (student_id, admission_number)} of the school's accounts in
+    a ledger. For finance, accounts are created first for the students in
+    `create_missing_for` that have none.
+    """
+    _, account_model, _ = _ledger_models(name)
+    if create_missing_for:
+        existing = set(account_model.objects.filter(
+            student_id__in=create_missing_for
+        ).values_list('student_id', flat=True))
+        account_model.objects.bulk_create([
+            account_model(student_id=student_id, school=school)
+            for student_id in create_missing_for if student_id not in existing
+        ], batch_size=500)
+    return {
+        account_id: (student_id, admission_number)
+        for account_id, student_id, admission_number in account_model.objects.filter(
+            student__school=school
+        ).values_list('id', 'student_id', 'student__admission_number')
+    }
+
+
+def _existing_charges(name, school, term, year):
+    """
+    {account_id: (transaction_id, amount, billed)}: the first charge of the
+    term the run itself created on each account (None, None without one)
+    and the total of all the account's charges of the term, which includes
+    the charges taken when a route is assigned or a meal subscribed to.
+    """
+    model, _, debit = _ledger_models(name)
+    own_description = _descriptions(term, year)[name]
+    charges = {}
+    # Descending so the lowest id of the run's own charges wins
+    for tx_id, account_id, amount, description in model.objects.filter(
+        account__student__school=school, type=debit, term=term, academic_year=year
+    ).order_by('-id').values_list('id', 'account_id', 'amount', 'description'):
+        own_id, own_amount, billed = charges.get(account_id, (None, None, ZERO))
+        if description == own_description:
+            own_id, own_amount = tx_id, amount
+        charges[account_id] = (own_id, own_amount, billed + amount)
+    return charges
+
+
+def current_period(school):
+    """
+    (term, academic_year) that charges taken outside a billing run belong
+    to: the school's current term and the latest academic year it has fee
+    structures for in that term (its current year otherwise), so that the
+    run for that term counts them as already billed. (None, None) if the
+    school has no current term.
+    """
+    from .models import FeeStructure
+
+    if school is None:
+        return None, None
+    digits = ''.join(ch for ch in str(school.current_term or '') if ch.isdigit())
+    if not digits or int(digits) not in (1, 2, 3):
+        return None, None
+    term = int(digits)
+    year = FeeStructure.objects.filter(
+        grade__school=school, term=term
+    ).order_by('-academic_year').values_list('academic_year', flat=True).first()
+    return term, year or str(school.current_year)
+
+
+def plan_ledger(name, school, term, year, create_accounts=False):
+    """
+    Compare what every account should be billed for (term, year) with the
+    charges it has. Returns (changes, unchanged, overbilled):
+
+    - changes: one dict per charge to write, with ledger, action ('create'
+      or 'update'), account_id, student_id, admission_number,
+      transaction_id, current and amount (of the charge written), expected
+      (the account's total for the term) and billed (its charges of the
+      term before the run);
+    - unchanged: the number of accounts already billed correctly;
+    - overbilled: the same dicts, with action 'overbilled' and no
+      transaction or amount, for accounts billed more than expected.
+
+    Finance accounts are keyed by student, so students without one show up
+    with account_id None unless `create_accounts` creates them.
+    """
+    if name == 'finance':
+        by_student = _expected_finance(school, term, year)
+        accounts = _accounts(name, school, create_missing_for=by_student if create_accounts else ())
+        account_of = {student_id: account_id for account_id, (student_id, _) in accounts.items()}
+        expected = {}
+        unaccounted = []
+        for student_id, amount in by_student.items():
+            if student_id in account_of:
+                expected[account_of[student_id]] = amount
+            else:
+                unaccounted.append((student_id, amount))
+    else:
+        expected = _expected_transport(school) if name == 'transport' else _expected_food(school)
+        accounts = _accounts(name, school)
+        unaccounted = []
+
+    charges = _existing_charges(name, school, term, year)
+    changes = []
+    overbilled = []
+    unchanged = 0
+    for account_id, amount in sorted(expected.items()):
+        if not amount or account_id not in accounts:
+            continue
+        student_id, admission_number = accounts[account_id]
+        tx_id, current, billed = charges.get(account_id, (None, None, ZERO))
+        change = {
+            'ledger': name,
+            'account_id': account_id,
+            'student_id': student_id,
+            'admission_number': admission_number,
+            'expected': amount,
+            'billed': billed,
+        }
+        shortfall = amount - billed
+        if not shortfall:
+            unchanged += 1
+        elif shortfall < 0:
+            overbilled.append({**change, 'action': 'overbilled', 'transaction_id': None, 'current': None, 'amount': None})
+        elif tx_id is not None:
+            # Raise the run's own charge so the term's charges add up to the amount
+            changes.append({**change, 'action': 'update', 'transaction_id': tx_id, 'current': current,
+                            'amount': current + shortfall})
+        else:
+            changes.append({**change, 'action': 'create', 'transaction_id': None, 'current': None,
+                            'amount': shortfall})
+
+    if unaccounted:
+        from schools.models import Student
+
+        admission_numbers = dict(Student.objects.filter(
+            id__in=[student_id for student_id, _ in unaccounted]
+        ).values_list('id', 'admission_number'))
+        for student_id, amount in unaccounted:
+            changes.append({
+                'ledger': name,
+                'action': 'create',
+                'account_id': None,
+                'student_id': student_id,
+                'admission_number': admission_numbers.get(student_id),
+                'transaction_id': None,
+                'current': None,
+                'amount': amount,
+                'expected': amount,
+                'billed': ZERO,
+            })
+    return changes, unchanged, overbilled
+
+
+def _apply(name, changes, school, term, year):
+    from schools import account_balances
+
+    model, account_model, debit = _ledger_models(name)
+    description = _descriptions(term, year)[name]
+    account_balances.record_transactions(model, [
+        model(
+            account_id=change['account_id'],
+            school=school,
+            type=debit,
+            amount=change['amount'],
+            description=description,
+            term=term,
+            academic_year=year
+        )
+        for change in changes if change['action'] == 'create'
+    ])
+
+    repriced = defaultdict(list)
+    deltas = {}
+    for change in changes:
+        if change['action'] == 'update':
+            repriced[change['amount']].append(change['transaction_id'])
+            deltas[change['account_id']] = (change['amount'] - change['current'], ZERO)
+    for amount, tx_ids in repriced.items():
+        model.objects.filter(pk__in=tx_ids).update(amount=amount)
+    stamp = account_balances.LEDGERS[model._meta.label][3]
+    account_balances.apply_deltas(account_model, deltas, stamp)
+
+
+def _summary(changes, unchanged, overbilled):
+    created = [c for c in changes if c['action'] == 'create']
+    updated = [c for c in changes if c['action'] == 'update']
+    return {
+        'created': len(created),
+        'updated': len(updated),
+        'unchanged': unchanged,
+        'overbilled': len(overbilled),
+        'billed': sum((c['amount'] for c in created), ZERO)
+        + sum((c['amount'] - c['current'] for c in updated), ZERO),
+    }
+
+
+def run_term_billing(school, term, year, ledgers=LEDGERS, dry_run=False):
+    """
+    Bill `school` for (term, year) on the given ledgers. Returns
+    {'ledgers': {name: summary}, 'changes': [...], 'overbilled': [...]},
+    where each summary has the number of charges created and updated, of
+    accounts unchanged and overbilled, and the net amount billed; with
+    dry_run nothing is written.
+    """
+    from config.models import SchoolConfig
+    from schools.dashboard import invalidate_dashboard
+
+    term = int(term)
+    if term not in (1, 2, 3):
+        raise ValueError(f"Invalid term {term}")
+    unknown = set(ledgers) - set(LEDGERS)
+    if unknown:
+        raise ValueError(f"Unknown ledger(s): {', '.join(sorted(unknown))}")
+    ledgers = [name for name in LEDGERS if name in ledgers]
+
+    result = {'ledgers': {}, 'changes': [], 'overbilled': []}
+    if dry_run:
+        for name in ledgers:
+            changes, unchanged, overbilled = plan_ledger(name, school, term, year)
+            result['ledgers'][name] = _summary(changes, unchanged, overbilled)
+            result['changes'].extend(changes)
+            result['overbilled'].extend(overbilled)
+        return result
+
+    with transaction.atomic():
+        # Serializes runs for the school, so a charge is never created twice
+        SchoolConfig.objects.select_for_update().filter(pk=school.pk).first()
+        for name in ledgers:
+            changes, unchanged, overbilled = plan_ledger(name, school, term, year, create_accounts=True)
+            _apply(name, changes, school, term, year)
+            result['ledgers'][name] = _summary(changes, unchanged, overbilled)
+            result['changes'].extend(changes)
+            result['overbilled'].extend(overbilled)
+    invalidate_dashboard(school.pk)
+    return result
@@ -14,11 +14,14 @@ urlpatterns = [
     # Add simpler path for API consistency if needed
     path('salaries/', views.api_finance_salaries, name='api_finance_salaries'),
     path('salaries/process/', views.api_finance_payroll_process, name='api_finance_payroll_process'),
+    path('salaries/payslips/', views.api_finance_payslips, name='api_finance_payslips'),
+    path('salaries/payslips/<int:record_id>/', views.api_finance_payslip_pdf, name='api_finance_payslip_pdf'),
     path('salaries/<int:user_id>/update/', views.api_finance_salary_update, name='api_finance_salary_update'),
     path('fee-structures/', views.api_fee_structures, name='api_fee_structures'),
     path('fee-structures/create/', views.api_create_fee_structure, name='api_create_fee_structure'),
     path('fee-structures/<int:fee_id>/', views.api_delete_fee_structure, name='api_delete_fee_structure'),
     path('fee-structures/update/', views.api_update_fee_structure, name='api_update_fee_structure'),
+    path('term-billing/', views.api_finance_term_billing, name='api_finance_term_billing'),
     path('fee-categories/', views.api_fee_categories, name='api_fee_categories'),
     path('student-fee-summary/', views.api_student_fee_summary, name='api_student_fee_summary'),
     path('transport-summary/', views.api_transport_finance_summary, name='api_transport_finance_summary'),
@@ -353,72 +353,64 @@ def api_delete_fee_structure(request, fee_id):
 
 def sync_student_fees(grade_id, term, year, school):
     """Helper to synchronize student invoices/balances when fee structure changes"""
-    from django.db.models import Sum
-    from schools.models import Grade, Student
-    from .models import Transaction, StudentFinanceAccount, FeeStructure
-    
-    # Ensure term is an integer for comparisons
-    term = int(term)
-    
-    # 1. Calculate mandatory total
-    mandatory_total = FeeStructure.objects.filter(
-        grade_id=grade_id, 
-        term=term, 
-        academic_year=year,
-        is_mandatory=True
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # 2. Update Grade
-    grade = Grade.objects.get(id=grade_id)
-    if term == 1: 
-        grade.term1_fees = mandatory_total
-        grade.term_fees = mandatory_total
-    elif term == 2: grade.term2_fees = mandatory_total
-    elif term == 3: grade.term3_fees = mandatory_total
-    grade.save()
-
-    # 3. Update Students & Invoices
-    students = Student.objects.filter(grade_id=grade_id)
-    for student in students:
-        if term == 1: 
-            student.term1_fees = mandatory_total
-            if student.current_term == 1: student.term_fees = mandatory_total
-        elif term == 2: 
-            student.term2_fees = mandatory_total
-            if student.current_term == 2: student.term_fees = mandatory_total
-        elif term == 3: 
-            student.term3_fees = mandatory_total
-            if student.current_term == 3: student.term_fees = mandatory_total
-        student.save()
-
-        # Update/Create Invoice
-        account, _ = StudentFinanceAccount.objects.get_or_create(
-            student=student, 
-            defaults={'school': student.school}
-        )
-        
-        tx = Transaction.objects.filter(
-            account=account,
-            type='INVOICE',
-            term=term,
-            academic_year=year
-        ).first()
-        
-        if tx:
-            tx.amount = mandatory_total
-            tx.description = f"Term {term} {year} Fees (Synced)"
-            tx.save()
-        else:
-            Transaction.objects.create(
-                account=account,
-                school=student.school,
-                type='INVOICE',
-                amount=mandatory_total,
-                description=f"Term {term} {year} Fees",
-                term=term,
-                academic_year=year
+    from .fee_sync import sync_grade_fees
+    return sync_grade_fees(grade_id, term, year)
+
+@csrf_exempt
+@login_required
+def api_finance_term_billing(request):
+    """
+    Term-opening billing run. POST {term, academic_year, dry_run, ledgers}
+    returns per-ledger counts, the list of charges created or re-priced
+    (or that would be, with dry_run) and the accounts billed more than
+    expected, which are left alone.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    try:
+        from config.models import SchoolConfig
+        from .term_billing import LEDGERS, run_term_billing
+        school = SchoolConfig.get_config(user=request.user, request=request)
+
+        data = json.loads(request.body or '{}')
+        year = (data.get('academic_year') or '').strip()
+        if not data.get('term') or not year:
+            return JsonResponse({'error': 'term and academic_year are required'}, status=400)
+        try:
+            result = run_term_billing(
+                school,
+                data['term'],
+                year,
+                ledgers=data.get('ledgers') or LEDGERS,
+                dry_run=bool(data.get('dry_run')),
             )
-    return len(students)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        def amounts(change):
+            return {
+                **change,
+                'current': float(change['current']) if change['current'] is not None else None,
+                'amount': float(change['amount']) if change['amount'] is not None else None,
+                'expected': float(change['expected']),
+                'billed': float(change['billed']),
+            }
+        return JsonResponse({
+            'success': True,
+            'dry_run': bool(data.get('dry_run')),
+            'term': int(data['term']),
+            'academic_year': year,
+            'ledgers': {
+                name: {**summary, 'billed': float(summary['billed'])}
+                for name, summary in result['ledgers'].items()
+            },
+            'changes': [amounts(change) for change in result['changes']],
+            'overbilled': [amounts(account) for account in result['overbilled']],
+        })
+    except Exception as e:
+        import traceback
+        print(traceback.format_exc())
+        return JsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
 @login_required
@@ -462,65 +454,52 @@ def api_update_fee_structure(request):
             return JsonResponse({'error': str(e)}, status=500)
     return JsonResponse({'error': 'Invalid method'}, status=405)
 
+def _payroll_run_data(run):
+    if run is None:
+        return None
+    return {
+        'id': run.id,
+        'action': run.action,
+        'employees': run.employees,
+        'created': run.created,
+        'updated': run.updated,
+        'paid': run.paid,
+        'unchanged': run.unchanged,
+        'total_net': float(run.total_net),
+        'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+    }
+
 @login_required
 def api_finance_salaries(request):
     try:
         from config.models import SchoolConfig
-        from schools.models import Teacher, NonTeachingStaff
-        from transport.models import TransportDriver
-        
+        from .payroll import current_month, last_run, payroll_sheet
+
         school = SchoolConfig.get_config(user=request.user, request=request)
-        today = timezone.now().date()
-        current_month = today.replace(day=1)
-        
-        # 1. Collect all users belonging to this school's employees
-        teacher_users = Teacher.objects.filter(school=school, user__isnull=False).values_list('user_id', flat=True)
-        staff_users = NonTeachingStaff.objects.filter(school=school, user__isnull=False).values_list('user_id', flat=True)
-        driver_users = TransportDriver.objects.filter(school=school, user__isnull=False).values_list('user_id', flat=True)
-        
-        target_user_ids = set(list(teacher_users) + list(staff_users) + list(driver_users))
-        users = User.objects.filter(id__in=target_user_ids).distinct()
-        
-        data = []
-        for u in users:
-            # Get or create salary structure safely linked to school
-            ss, _ = SalaryStructure.objects.get_or_create(
-                user=u, 
-                school=school # CRITICAL: Link to school
-            )
-            
-            base = float(ss.base_salary)
-            allowances = float(ss.allowances)
-            deductions = float(ss.deductions)
-            nssf = float(ss.nssf)
-            loans = float(ss.loans)
-            net = float(ss.net_salary())
-            
-            role = 'Staff'
-            if hasattr(u, 'transport_driver_profile'): role = 'Driver'
-            elif hasattr(u, 'teacher'): role = 'Teacher'
-            elif u.is_staff: role = 'Admin'
+        month = current_month()
 
-            payroll = PayrollRecord.objects.filter(school=school, user=u, month=current_month).first()
-            status = payroll.status if payroll else 'UNPROCESSED'
-            
-            advances = float(ss.get_advances())
+        data = []
+        for row in payroll_sheet(school, month):
             data.append({
-                'id': u.id,
-                'name': u.get_full_name() or u.username,
-                'role': role,
-                'base_salary': base,
-                'allowances': allowances,
-                'deductions': deductions,
-                'nssf': nssf,
-                'loans': loans,
-                'advances': advances,
-                'net_salary': net,
-                'status': status,
-                'slip_id': payroll.id if payroll else None
+                'id': row['id'],
+                'name': row['name'],
+                'role': row['role'],
+                'base_salary': float(row['base_salary']),
+                'allowances': float(row['allowances']),
+                'deductions': float(row['deductions']),
+                'nssf': float(row['nssf']),
+                'loans': float(row['loans']),
+                'advances': float(row['advances']),
+                'net_salary': float(row['net_salary']),
+                'status': row['status'],
+                'slip_id': row['slip_id']
             })
-            
-        return JsonResponse({'employees': data, 'current_month': current_month.strftime('%B %Y')})
+
+        return JsonResponse({
+            'employees': data,
+            'current_month': month.strftime('%B %Y'),
+            'last_run': _payroll_run_data(last_run(school, month)),
+        })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -529,80 +508,71 @@ def api_finance_salaries(request):
 def api_finance_payroll_process(request):
     if request.method == 'POST':
         try:
+            from config.models import SchoolConfig
+            from .payroll import run_payroll
+
+            school = SchoolConfig.get_config(user=request.user, request=request)
             data = json.loads(request.body)
             user_ids = data.get('user_ids', [])
-            action = data.get('action') # 'GENERATE', 'PAY'
-            
-            today = timezone.now().date()
-            current_month = today.replace(day=1)
-            
-            processed = 0
-            for uid in user_ids:
-                u = User.objects.get(pk=uid)
-                ss, _ = SalaryStructure.objects.get_or_create(user=u) 
-                
-                # Defaults
-                if ss.base_salary == 0:
-                     if hasattr(u, 'transport_driver_profile'): ss.base_salary = 25000
-                     elif hasattr(u, 'teacher'): ss.base_salary = 35000
-                     else: ss.base_salary = 20000
-                     ss.save()
-                
-                advances_amt = ss.get_advances()
-                payroll, created = PayrollRecord.objects.get_or_create(
-                    user=u, month=current_month,
-                    defaults={
-                        'base_salary': ss.base_salary,
-                        'allowances': ss.allowances,
-                        'deductions': ss.deductions,
-                        'nssf': ss.nssf,
-                        'loans': ss.loans,
-                        'advances': advances_amt,
-                        'net_salary': ss.net_salary()
-                    }
-                )
+            action = data.get('action') or 'REFRESH' # 'GENERATE', 'PAY'
+            if action not in ('REFRESH', 'GENERATE', 'PAY'):
+                return JsonResponse({'error': f'Invalid action {action}'}, status=400)
 
-                if not created and payroll.status != 'PAID':
-                    # Update advances if they changed before processing
-                    payroll.advances = advances_amt
-                    payroll.net_salary = ss.net_salary()
-                    payroll.save()
-                
-                if action == 'PAY' and payroll.status != 'PAID':
-                    payroll.status = 'PAID'
-                    payroll.paid_at = timezone.now()
-                    payroll.save()
-
-                    # Mark approved advances as DEDUCTED
-                    from schools.models import SalaryAdvance
-                    from django.db.models import Q
-                    SalaryAdvance.objects.filter(
-                        Q(employee__teacher__user=u) | Q(employee__nonteachingstaff__user=u),
-                        status='APPROVED'
-                    ).update(status='DEDUCTED')
-                    
-                    # Create Expense record
-                    Expense.objects.get_or_create(
-                        title=f"Salary Payment: {u.get_full_name()} ({current_month.strftime('%B %Y')})",
-                        defaults={
-                            'amount': payroll.net_salary,
-                            'category': 'salaries',
-                            'date': timezone.now().date(),
-                            'payment_method': 'bank_transfer',
-                            'description': f"Payroll disbursement for {u.username} for {current_month.strftime('%B %Y')}",
-                            'created_by': request.user
-                        }
-                    )
-                elif action == 'GENERATE':
-                    if payroll.status == 'PENDING':
-                         payroll.status = 'PROCESSED'
-                         payroll.save()
-                
-                processed += 1
-                
-            return JsonResponse({'success': True, 'processed': processed})
+            run = run_payroll(school, user_ids=user_ids, action=action, run_by=request.user)
+            return JsonResponse({'success': True, 'processed': run.employees, 'run': _payroll_run_data(run)})
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+@login_required
+def api_finance_payslips(request):
+    """ZIP of every payslip of a payroll month (?month=YYYY-MM, default: current month)"""
+    try:
+        from io import BytesIO
+        from config.models import SchoolConfig
+        from .payroll import current_month
+        from .payslips import parse_month, payslip_data, write_payslips
+
+        school = SchoolConfig.get_config(user=request.user, request=request)
+        try:
+            month = parse_month(request.GET['month']) if request.GET.get('month') else current_month()
+        except ValueError:
+            return JsonResponse({'error': 'month must be YYYY-MM'}, status=400)
+
+        items = payslip_data(school, month)
+        if not items:
+            return JsonResponse({'error': f"No payroll records for {month.strftime('%B %Y')}"}, status=404)
+
+        buffer = BytesIO()
+        # Rendered in this process: forking a pool from a request thread is unsafe
+        write_payslips(items, buffer, workers=1)
+        response = HttpResponse(buffer.getvalue(), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="payslips-{month.strftime("%Y-%m")}.zip"'
+        return response
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@login_required
+def api_finance_payslip_pdf(request, record_id):
+    """Payslip PDF of one payroll record"""
+    try:
+        from config.models import SchoolConfig
+        from .payslips import payslip_data, payslip_pdf
+
+        school = SchoolConfig.get_config(user=request.user, request=request)
+        record = PayrollRecord.objects.filter(pk=record_id).first()
+        items = []
+        if record is not None:
+            items = [item for item in payslip_data(school, record.month, user_ids=[record.user_id]) if item['record_id'] == record.id]
+        if not items:
+            return JsonResponse({'error': 'Payroll record not found'}, status=404)
+
+        filename, content = payslip_pdf(items[0])
+        response = HttpResponse(content, content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
 @login_required
@@ -932,125 +902,47 @@ def api_finance_reports(request):
 @login_required
 def api_finance_all_transactions(request):
     """
-    Combined view for all platform transactions (Fees, Food, Transport, Expenses)
+    Combined view for all platform transactions (Fees, Food, Transport, Expenses).
+    Pass `cursor` (the previous response's `next_cursor`) for keyset paging;
+    `page` is still honoured for older clients.
     """
     try:
         from config.models import SchoolConfig
+        from . import feed
         school = SchoolConfig.get_config(user=request.user, request=request)
-        
-        from schools.models import TransportFee, FoodFee, StudentMealPayment
-        from transport.models import TransportTransaction
-        
-        # 1. Fetch from different sources (Filtered by School)
-        # ------------------------------
-        # Fees
-        fees = Transaction.objects.filter(school=school).select_related('account__student').all()
-        
-        # Transport (Only PAYMENT/COMPLETED transactions)
-        trans_tx = TransportTransaction.objects.filter(school=school, type='PAYMENT').select_related('account__student').all()
-        trans_fee = TransportFee.objects.filter(school=school, status='COMPLETED').select_related('student').all()
-        
-        # Food
-        from food.models import FoodTransaction
-        food_fee = FoodFee.objects.filter(school=school, status='COMPLETED').select_related('student').all()
-        meal_pay = StudentMealPayment.objects.filter(school=school, status='COMPLETED').select_related('student').all()
-        modern_food_tx = FoodTransaction.objects.filter(school=school, type='PAYMENT').select_related('account__student').all()
-        
-        # Expenses
-        expenses = Expense.objects.filter(school=school).all()
 
-        unified = []
-        
-        for f in fees:
-            date_val = f.date.date() if hasattr(f.date, 'date') else f.date
-            unified.append({
-                'id': f.id, 'source': 'FEES', 'type': 'INCOME' if f.type == 'PAYMENT' else 'BILL',
-                'title': f"Fee Payment: {f.account.student.get_full_name()}",
-                'amount': float(f.amount), 'date': date_val, 'method': f.payment_method,
-                'reference': f.reference or f"FEE-{f.id}"
-            })
-            
-        for t in trans_tx:
-            date_val = t.date.date() if hasattr(t.date, 'date') else t.date
-            unified.append({
-                'id': t.id, 'source': 'TRANSPORT', 'type': 'INCOME' if t.type == 'PAYMENT' else 'CHARGE',
-                'title': f"Transport: {t.account.student.get_full_name()}",
-                'amount': float(t.amount), 'date': date_val, 'method': t.payment_method,
-                'reference': t.reference or f"TRNS-{t.id}"
-            })
-            
-        for tf in trans_fee:
-            date_val = tf.date.date() if hasattr(tf.date, 'date') else tf.date
-            unified.append({
-                'id': tf.id, 'source': 'TRANSPORT', 'type': 'INCOME',
-                'title': f"Transport Fee: {tf.student.get_full_name()}",
-                'amount': float(tf.amount), 'date': date_val, 'method': tf.payment_method,
-                'reference': tf.reference_number
-            })
-            
-        for ff in food_fee:
-            date_val = ff.date.date() if hasattr(ff.date, 'date') else ff.date
-            unified.append({
-                'id': ff.id, 'source': 'FOOD', 'type': 'INCOME',
-                'title': f"Food Fee: {ff.student.get_full_name()}",
-                'amount': float(ff.amount), 'date': date_val, 'method': ff.payment_method,
-                'reference': ff.reference_number
-            })
-            
-        for mp in meal_pay:
-            date_val = mp.payment_date.date() if hasattr(mp.payment_date, 'date') else mp.payment_date
-            unified.append({
-                'id': mp.id, 'source': 'FOOD', 'type': 'INCOME',
-                'title': f"Meal Payment: {mp.student.get_full_name()}",
-                'amount': float(mp.amount), 'date': date_val, 'method': mp.payment_method,
-                'reference': mp.reference_number
-            })
-            
-        for mft in modern_food_tx:
-            date_val = mft.date.date() if hasattr(mft.date, 'date') else mft.date
-            unified.append({
-                'id': mft.id, 'source': 'FOOD', 'type': 'INCOME',
-                'title': f"Food Payment: {mft.account.student.get_full_name()}",
-                'amount': float(mft.amount), 'date': date_val, 'method': mft.payment_method,
-                'reference': mft.reference or f"FOOD-{mft.id}"
-            })
-            
-        for e in expenses:
-            date_val = e.date.date() if hasattr(e.date, 'date') else e.date
-            unified.append({
-                'id': e.id, 'source': 'EXPENSE', 'type': 'OUTFLOW', 'title': e.title,
-                'amount': float(e.amount), 'date': date_val, 'method': e.payment_method,
-                'reference': e.receipt_number or f"EXP-{e.id}"
-            })
-
-        # Sort by date (descending)
-        unified.sort(key=lambda x: str(x['date']), reverse=True)
-        
-        # Filter by source if requested
         source_filter = request.GET.get('source')
-        if source_filter and source_filter != 'ALL':
-            unified = [x for x in unified if x['source'] == source_filter]
-
-        # Simple manual pagination
-        page = int(request.GET.get('page', 1))
-        page_size = 30
-        start = (page - 1) * page_size
-        end = start + page_size
-        
-        serialized = []
-        for x in unified[start:end]:
-            d = x.copy()
-            if hasattr(d['date'], 'strftime'):
-                d['date'] = d['date'].strftime('%Y-%m-%d')
-            else:
-                d['date'] = str(d['date'])
-            serialized.append(d)
+        if source_filter == 'ALL':
+            source_filter = None
+
+        try:
+            page_size = min(int(request.GET.get('page_size', feed.DEFAULT_PAGE_SIZE)), feed.MAX_PAGE_SIZE)
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid page or page_size'}, status=400)
+        page_size = max(page_size, 1)
+
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                cursor = feed.parse_cursor(cursor)
+            except feed.InvalidCursor as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            offset = 0
+        else:
+            cursor = None
+            offset = (page - 1) * page_size
+
+        transactions, has_next, next_cursor = feed.fetch_feed_page(
+            school, source=source_filter, cursor=cursor, offset=offset, limit=page_size
+        )
 
         return JsonResponse({
-            'transactions': serialized,
-            'total': len(unified),
+            'transactions': transactions,
+            'total': feed.count_feed(school, source=source_filter),
             'current_page': page,
-            'has_next': end < len(unified)
+            'has_next': has_next,
+            'next_cursor': next_cursor,
         })
     except Exception as e:
         import traceback
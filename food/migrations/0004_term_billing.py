@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0003_foodstudentaccount_school_foodsubscription_school_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodtransaction',
+            name='academic_year',
+            field=models.CharField(blank=True, max_length=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='foodtransaction',
+            name='term',
+            field=models.IntegerField(blank=True, choices=[(1, 'Term 1'), (2, 'Term 2'), (3, 'Term 3')], null=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
-from schools.models import Student
+from schools.models import Student, TERM_CHOICES
+from schools import account_balances
 
 class MealItem(models.Model):
     school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='meal_items', null=True, blank=True)
@@ -92,11 +93,18 @@ class FoodTransaction(models.Model):
     date = models.DateTimeField(default=timezone.now)
     recorded_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True)
 
+    # Set on the termly charges of a billing run (finance.term_billing)
+    term = models.IntegerField(choices=TERM_CHOICES, null=True, blank=True)
+    academic_year = models.CharField(max_length=9, null=True, blank=True)
+
     def save(self, *args, **kwargs):
         if not self.school and self.account and self.account.school:
             self.school = self.account.school
-        super().save(*args, **kwargs)
-        self.account.update_balance()
+        # Apply this write's change to the account totals (reversing the stored version on edits)
+        with transaction.atomic():
+            previous = account_balances.stored_state(self)
+            super().save(*args, **kwargs)
+            account_balances.transaction_saved(self, previous)
 
     def __str__(self):
         return f"{self.type} - {self.amount} ({self.account.student.last_name})"
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from schools import account_balances
+
+from .models import FoodTransaction
+
+
+@receiver(post_delete, sender=FoodTransaction)
+def reverse_deleted_food_transaction(sender, instance, **kwargs):
+    account_balances.transaction_deleted(instance)
@@ -5,6 +5,7 @@ from django.contrib.auth.decorators import login_required
 from django.db.models import Sum, Count, Q
 from .models import FoodStudentAccount, FoodTransaction, MealItem, FoodSubscription
 from schools.models import Student
+from finance.term_billing import FOOD_CYCLE_MULTIPLIERS, current_period
 import json
 
 @login_required
@@ -145,12 +146,19 @@ def api_food_student_detail(request, student_id):
                 # Auto-charge for the subscription (simplified logic: charge immediately on sub)
                 # In a real app, you might want to check billing cycles (e.g. daily/monthly jobs)
                 # But for immediate "Billing Accuracy", let's charge now.
+                # Termly and monthly meals count towards the term's billing run;
+                # daily and one-off charges stay outside it
+                term, academic_year = None, None
+                if item.billing_cycle in FOOD_CYCLE_MULTIPLIERS:
+                    term, academic_year = current_period(account.school or account.student.school)
                 FoodTransaction.objects.create(
                     account=account,
                     type='CHARGE',
                     amount=item.cost,
                     description=f"Subscription Charge: {item.name}",
-                    recorded_by=request.user
+                    recorded_by=request.user,
+                    term=term,
+                    academic_year=academic_year
                 )
 
                 return JsonResponse({'success': True})
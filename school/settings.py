@@ -81,6 +81,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'schools.middleware.SchoolTenantMiddleware',  # Resolves request.school once per request
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # 'schools.middleware.OfflineDetectionMiddleware',  # Offline detection - Disabled for performance
@@ -109,6 +110,22 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'school.wsgi.application'
+ASGI_APPLICATION = 'asgi.application'
+
+# Channel layer for WebSocket fan-out (live bus positions). The in-memory
+# layer only reaches consumers in the same process; point CHANNEL_REDIS_URL
+# at Redis when running more than one ASGI worker.
+if os.environ.get('CHANNEL_REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['CHANNEL_REDIS_URL']]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+    }
 
 
 # Database
@@ -147,6 +164,16 @@ CACHES = {
     }
 }
 
+# Rendered receipt PDFs (schools.receipt_cache). With RECEIPT_PRERENDER on, a
+# receipt is rendered as soon as its payment is committed.
+RECEIPT_CACHE_DIR = os.path.join(BASE_DIR, 'receipt_cache')
+RECEIPT_PRERENDER = os.environ.get('RECEIPT_PRERENDER', 'False').lower() == 'true'
+
+# Geocoding answers (schools.utils.geocache) are kept in the database for
+# GEOCODE_CACHE_TTL seconds; "no result" answers for GEOCODE_NEGATIVE_TTL.
+GEOCODE_CACHE_TTL = int(os.environ.get('GEOCODE_CACHE_TTL', 30 * 24 * 60 * 60))
+GEOCODE_NEGATIVE_TTL = int(os.environ.get('GEOCODE_NEGATIVE_TTL', 24 * 60 * 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -0,0 +1,129 @@
+"""
+Grade analytics (subject performance, level distribution and merit list)
+for api_academic_analytics.
+
+The merit list is one grouped query over the grade's students with the
+assessment scope pushed into conditional aggregates, followed by an
+in-memory ranking stage. The finished payload is cached per
+(school, grade, term, type); every cached entry of a grade carries the
+grade's version number, so bumping the version in
+invalidate_academic_analytics() drops all term/type combinations at once.
+"""
+from django.core.cache import cache
+from django.db.models import Avg, Count, Q, Sum
+
+ANALYTICS_CACHE_TIMEOUT = 300  # seconds
+
+LEVEL_KEYS = (('4', 'exceeding'), ('3', 'meeting'), ('2', 'approaching'), ('1', 'below'))
+
+
+def _version_key(school_id, grade_id):
+    return f'academic_analytics_version_{school_id}_{grade_id}'
+
+
+def analytics_cache_key(school_id, grade_id, term=None, assessment_type=None):
+    version = cache.get(_version_key(school_id, grade_id), 0)
+    return f'academic_analytics_{school_id}_{grade_id}_{term or "all"}_{assessment_type or "all"}_v{version}'
+
+
+def invalidate_academic_analytics(school_id, *grade_ids):
+    """Drop the cached analytics of the given grades (every term and type)"""
+    for grade_id in {grade_id for grade_id in grade_ids if grade_id}:
+        key = _version_key(school_id, grade_id)
+        cache.set(key, cache.get(key, 0) + 1, None)
+
+
+def overall_grade(avg_score):
+    if avg_score >= 80:
+        return 'Exceeding'
+    if avg_score >= 60:
+        return 'Meeting'
+    if avg_score >= 40:
+        return 'Approaching'
+    return 'Below'
+
+
+def rank_merit_list(merit_list):
+    """
+    Sort by total marks (desc); equal totals are split by subjects sat
+    (fewer subjects for the same total is the better mean). Rows equal on
+    both share a rank: `rank` is the competition rank (1, 2, 2, 4) and
+    `dense_rank` the dense one (1, 2, 2, 3).
+    """
+    merit_list.sort(key=lambda x: (-x['total_marks'], x['subjects_sat'], x['full_name']))
+    previous = None
+    rank = dense_rank = 0
+    for position, item in enumerate(merit_list, start=1):
+        key = (item['total_marks'], item['subjects_sat'])
+        if key != previous:
+            rank = position
+            dense_rank += 1
+            previous = key
+        item['rank'] = rank
+        item['dense_rank'] = dense_rank
+    return merit_list
+
+
+def build_grade_analytics(school, grade_id, term=None, assessment_type=None):
+    """Compute the analytics payload for one grade (three queries)"""
+    from .models import Assessment, AssessmentResult, Student
+
+    assessments = Assessment.objects.filter(student__grade_id=grade_id, school=school)
+    scope = Q(assessments__school=school)
+    if term:
+        assessments = assessments.filter(term=term)
+        scope &= Q(assessments__term=term)
+    if assessment_type:
+        assessments = assessments.filter(assessment_type=assessment_type)
+        scope &= Q(assessments__assessment_type=assessment_type)
+
+    # 1. Subject Performance (Average Score per Subject)
+    subject_performance = AssessmentResult.objects.filter(
+        assessment__in=assessments
+    ).values('subject__name', 'subject__code').annotate(
+        avg_score=Avg('marks')
+    ).order_by('-avg_score')
+
+    # 2. Performance Distribution (Count of 4s, 3s, 2s, 1s)
+    distribution = {
+        row['performance_level']: row['count']
+        for row in AssessmentResult.objects.filter(assessment__in=assessments)
+        .values('performance_level').annotate(count=Count('id')).order_by()
+    }
+
+    # 3. Student Merit List: every student of the grade with their totals in the scope
+    students = Student.objects.filter(grade_id=grade_id, school=school).annotate(
+        total_marks=Sum('assessments__results__marks', filter=scope),
+        avg_score=Avg('assessments__results__marks', filter=scope),
+        subjects_sat=Count('assessments__results', filter=scope),
+    ).only('id', 'admission_number', 'first_name', 'last_name', 'photo').order_by()
+
+    merit_list = []
+    for student in students:
+        avg_score = float(student.avg_score or 0)
+        merit_list.append({
+            'id': student.id,
+            'admission_number': student.admission_number,
+            'full_name': student.get_full_name(),
+            'photo': student.get_photo_url(),
+            'total_marks': float(student.total_marks or 0),
+            'average': round(avg_score, 1),
+            'subjects_sat': student.subjects_sat,
+            'grade': overall_grade(avg_score)
+        })
+
+    return {
+        'subject_performance': list(subject_performance),
+        'distribution': {name: distribution.get(level, 0) for level, name in LEVEL_KEYS},
+        'merit_list': rank_merit_list(merit_list)
+    }
+
+
+def get_grade_analytics(school, grade_id, term=None, assessment_type=None):
+    """Cached analytics payload for one (grade, term, type)"""
+    key = analytics_cache_key(getattr(school, 'pk', None), grade_id, term, assessment_type)
+    data = cache.get(key)
+    if data is None:
+        data = build_grade_analytics(school, grade_id, term, assessment_type)
+        cache.set(key, data, ANALYTICS_CACHE_TIMEOUT)
+    return data
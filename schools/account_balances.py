@@ -0,0 +1,207 @@
+"""
+Incremental maintenance of the denormalized totals (total_billed,
+total_paid, balance) on the three student accounts: StudentFinanceAccount,
+TransportStudentAccount and FoodStudentAccount.
+
+Saving a transaction used to re-sum the account's whole history. Now each
+write turns into signed deltas, one per affected account, applied with a
+single UPDATE ... SET total = total + delta, so a write costs the same
+whatever the account's history and concurrent writers cannot lose each
+other's updates. An edited transaction first reverses what its stored
+version contributed (which also covers a move to another account or type);
+a deleted one is reversed by the post_delete signals in each app.
+
+record_transactions() inserts many transactions of one model with a single
+bulk INSERT and one UPDATE per distinct delta, for billing runs and
+imports. find_balance_drift() compares the cached totals with the raw
+ledger and backs the `reconcile_account_balances` command.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.utils import timezone
+
+ZERO = Decimal('0')
+
+# transaction model -> (account model, debit type, credit type, account timestamp field)
+LEDGERS = {
+    'finance.Transaction': ('finance.StudentFinanceAccount', 'INVOICE', 'PAYMENT', 'last_updated'),
+    'transport.TransportTransaction': ('transport.TransportStudentAccount', 'CHARGE', 'PAYMENT', 'updated_at'),
+    'food.FoodTransaction': ('food.FoodStudentAccount', 'CHARGE', 'PAYMENT', 'updated_at'),
+}
+
+
+def _ledger(model):
+    account_label, debit, credit, stamp = LEDGERS[model._meta.label]
+    return apps.get_model(account_label), debit, credit, stamp
+
+
+def contribution(model, tx_type, amount):
+    """(billed, paid) that one transaction adds to its account"""
+    _, debit, credit, _ = _ledger(model)
+    amount = Decimal(amount or 0)
+    if tx_type == debit:
+        return amount, ZERO
+    if tx_type == credit:
+        return ZERO, amount
+    # e.g. finance ADJUSTMENT rows, which never counted towards the totals
+    return ZERO, ZERO
+
+
+def apply_deltas(account_model, deltas, stamp_field):
+    """
+    Add {account_id: (billed, paid)} to the accounts. Accounts sharing the
+    same delta (a billing run charging everyone the same fee) are updated
+    together, so this is one UPDATE per distinct delta.
+    """
+    groups = defaultdict(list)
+    for account_id, (billed, paid) in deltas.items():
+        if billed or paid:
+            groups[(billed, paid)].append(account_id)
+    now = timezone.now()
+    for (billed, paid), account_ids in groups.items():
+        account_model.objects.filter(pk__in=account_ids).update(**{
+            'total_billed': F('total_billed') + billed,
+            'total_paid': F('total_paid') + paid,
+            'balance': F('balance') + (billed - paid),
+            stamp_field: now,
+        })
+
+
+def stored_state(tx):
+    """(account_id, type, amount) of a transaction as stored, None before its first save"""
+    if tx._state.adding or tx.pk is None:
+        return None
+    return type(tx).objects.filter(pk=tx.pk).values_list('account_id', 'type', 'amount').first()
+
+
+def _add(deltas, account_id, billed, paid, sign=1):
+    current = deltas.get(account_id, (ZERO, ZERO))
+    deltas[account_id] = (current[0] + sign * billed, current[1] + sign * paid)
+
+
+def _refresh_cached_account(tx, deltas):
+    """Keep an account instance loaded on the transaction in step with the UPDATE"""
+    account = tx._state.fields_cache.get('account')
+    if account is None or account.pk not in deltas:
+        return
+    billed, paid = deltas[account.pk]
+    account.total_billed = Decimal(account.total_billed or 0) + billed
+    account.total_paid = Decimal(account.total_paid or 0) + paid
+    account.balance = Decimal(account.balance or 0) + billed - paid
+
+
+def transaction_saved(tx, previous):
+    """Apply a saved transaction's change; `previous` is its stored_state() from before the save"""
+    model = type(tx)
+    account_model, _, _, stamp = _ledger(model)
+    deltas = {}
+    if previous is not None:
+        account_id, tx_type, amount = previous
+        _add(deltas, account_id, *contribution(model, tx_type, amount), sign=-1)
+    _add(deltas, tx.account_id, *contribution(model, tx.type, tx.amount))
+    apply_deltas(account_model, deltas, stamp)
+    _refresh_cached_account(tx, deltas)
+
+
+def transaction_deleted(tx):
+    """Reverse a deleted transaction (post_delete)"""
+    model = type(tx)
+    account_model, _, _, stamp = _ledger(model)
+    deltas = {}
+    _add(deltas, tx.account_id, *contribution(model, tx.type, tx.amount), sign=-1)
+    apply_deltas(account_model, deltas, stamp)
+    _refresh_cached_account(tx, deltas)
+
+
+def record_transactions(model, transactions, batch_size=500):
+    """
+    Insert unsaved transactions of one model with bulk_create and update
+    every affected account once. The school defaults to the account's, as
+    in save(). save() and signals are bypassed. Returns the number inserted.
+    """
+    transactions = list(transactions)
+    if not transactions:
+        return 0
+    account_model, _, _, stamp = _ledger(model)
+    missing_school = {tx.account_id for tx in transactions if tx.school_id is None}
+    schools = dict(
+        account_model.objects.filter(pk__in=missing_school).values_list('pk', 'school_id')
+    ) if missing_school else {}
+
+    deltas = {}
+    for tx in transactions:
+        if tx.school_id is None:
+            tx.school_id = schools.get(tx.account_id)
+        _add(deltas, tx.account_id, *contribution(model, tx.type, tx.amount))
+    with transaction.atomic():
+        model.objects.bulk_create(transactions, batch_size=batch_size)
+        apply_deltas(account_model, deltas, stamp)
+    return len(transactions)
+
+
+def _ledger_totals(model, account_ids=None):
+    """{account_id: (billed, paid)} summed from the raw transactions in one grouped query"""
+    _, debit, credit, _ = _ledger(model)
+    amount = DecimalField(max_digits=14, decimal_places=2)
+    rows = model.objects.all()
+    if account_ids is not None:
+        rows = rows.filter(account_id__in=account_ids)
+    rows = rows.order_by().values('account_id').annotate(
+        billed=Sum(Case(When(type=debit, then=F('amount')), default=Value(ZERO), output_field=amount)),
+        paid=Sum(Case(When(type=credit, then=F('amount')), default=Value(ZERO), output_field=amount)),
+    )
+    return {row['account_id']: (row['billed'] or ZERO, row['paid'] or ZERO) for row in rows}
+
+
+def find_balance_drift(model, accounts=None, batch_size=2000):
+    """
+    Compare the cached totals of the accounts (a queryset of the ledger's
+    account model, all by default) with their transactions. Returns a list
+    of {'account_id', 'field', 'expected', 'actual'}.
+    """
+    account_model, _, _, _ = _ledger(model)
+    if accounts is None:
+        accounts = account_model.objects.all()
+    drift = []
+    rows = list(accounts.order_by('pk').values_list('pk', 'total_billed', 'total_paid', 'balance'))
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        totals = _ledger_totals(model, [row[0] for row in chunk])
+        for account_id, billed, paid, balance in chunk:
+            expected_billed, expected_paid = totals.get(account_id, (ZERO, ZERO))
+            expected = {
+                'total_billed': expected_billed,
+                'total_paid': expected_paid,
+                'balance': expected_billed - expected_paid,
+            }
+            actual = {'total_billed': billed, 'total_paid': paid, 'balance': balance}
+            for field, value in expected.items():
+                if Decimal(actual[field] or 0) != value:
+                    drift.append({
+                        'account_id': account_id,
+                        'field': field,
+                        'expected': value,
+                        'actual': actual[field],
+                    })
+    return drift
+
+
+def rebuild_balances(model, account_ids):
+    """Recompute the cached totals of the given accounts from their transactions"""
+    account_model, _, _, stamp = _ledger(model)
+    account_ids = list(account_ids)
+    totals = _ledger_totals(model, account_ids)
+    accounts = list(account_model.objects.filter(pk__in=account_ids))
+    now = timezone.now()
+    for account in accounts:
+        billed, paid = totals.get(account.pk, (ZERO, ZERO))
+        account.total_billed = billed
+        account.total_paid = paid
+        account.balance = billed - paid
+        setattr(account, stamp, now)
+    account_model.objects.bulk_update(accounts, ['total_billed', 'total_paid', 'balance', stamp], batch_size=500)
+    return len(accounts)
@@ -8,6 +8,7 @@ from .models import (
     Attendance, SMSMessage, Department, Vehicle, Route, StudentTransportAssignment, TransportFee,
     Expense
 )
+from . import fee_ledger
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
@@ -111,6 +112,7 @@ class GradeAdmin(admin.ModelAdmin):
                 term2_fees=grade.term2_fees,
                 term3_fees=grade.term3_fees
             )
+            fee_ledger.sync_ledger_fees(students)
             updated_count += students.count()
         
         messages.success(
@@ -130,6 +132,7 @@ class GradeAdmin(admin.ModelAdmin):
             term2_fees=obj.term2_fees,
             term3_fees=obj.term3_fees
         )
+        fee_ledger.sync_ledger_fees(students)
         
         if students.exists():
             messages.success(
@@ -212,6 +215,10 @@ class StudentAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         })
     )
+
+    def get_queryset(self, request):
+        # Balance/status columns read the fee ledger; fetch it for the whole page at once
+        return super().get_queryset(request).prefetch_related('fee_ledger')
     
     def get_payment_status(self, obj):
         status = obj.get_payment_status()
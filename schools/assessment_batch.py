@@ -0,0 +1,135 @@
+"""
+Bulk writer for api_assessment_batch_save.
+
+A mark sheet is saved with a fixed number of queries regardless of its
+size: one query each for the subjects, students and existing assessment
+containers, one bulk insert (plus a re-read) for missing containers and
+one bulk upsert for the results, all inside a single transaction. Rows
+that cannot be saved are reported back individually instead of failing
+the whole sheet.
+"""
+import math
+
+from django.db import transaction
+
+from .bulk import bulk_upsert
+
+SCORE_FIELDS = {
+    'weekly': 'weekly_score',
+    'opener': 'opener_score',
+    'mid-term': 'midpoint_score',
+    'end-term': 'endpoint_score',
+}
+
+RESULT_UPDATE_FIELDS = ['marks', 'performance_level'] + list(SCORE_FIELDS.values())
+
+
+def performance_level(marks):
+    if marks >= 80:
+        return '4'
+    if marks >= 60:
+        return '3'
+    if marks >= 40:
+        return '2'
+    return '1'
+
+
+def _is_blank(value):
+    return value is None or value == ''
+
+
+def save_marks(school, user, assessment_type, term, date, rows):
+    """
+    Save a batch of marks. `rows` is a list of dicts with student_id,
+    subject_id and marks. Blank marks are skipped, as before.
+
+    Returns (saved_count, errors) where every error is a dict holding the
+    row index, its student_id/subject_id and a message.
+    """
+    from .models import Assessment, AssessmentResult, Student, Subject
+
+    errors = []
+    pending = []
+    for index, row in enumerate(rows):
+        student_id, subject_id, marks = row.get('student_id'), row.get('subject_id'), row.get('marks')
+        if not student_id or not subject_id or _is_blank(marks):
+            continue
+        try:
+            marks = float(marks)
+            if not math.isfinite(marks):
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append({'index': index, 'student_id': student_id, 'subject_id': subject_id,
+                           'error': f'Invalid marks: {marks}'})
+            continue
+        pending.append((index, student_id, subject_id, marks))
+
+    if not pending:
+        return 0, errors
+
+    subject_ids = set(Subject.objects.filter(
+        pk__in={subject_id for _, _, subject_id, _ in pending}
+    ).values_list('pk', flat=True))
+    student_ids = set(Student.objects.filter(
+        pk__in={student_id for _, student_id, _, _ in pending}, school=school
+    ).values_list('pk', flat=True))
+
+    valid = []
+    for index, student_id, subject_id, marks in pending:
+        # ids arrive as JSON numbers or strings
+        try:
+            student_id, subject_id = int(student_id), int(subject_id)
+        except (TypeError, ValueError):
+            student_id = subject_id = None
+        if student_id not in student_ids:
+            errors.append({'index': index, 'student_id': student_id, 'subject_id': subject_id,
+                           'error': 'Student not found'})
+        elif subject_id not in subject_ids:
+            errors.append({'index': index, 'student_id': student_id, 'subject_id': subject_id,
+                           'error': 'Subject not found'})
+        else:
+            valid.append((student_id, subject_id, marks))
+
+    errors.sort(key=lambda error: error['index'])
+    if not valid:
+        return 0, errors
+
+    containers = Assessment.objects.filter(
+        student_id__in={student_id for student_id, _, _ in valid},
+        assessment_type=assessment_type, term=term, school=school,
+    ).order_by('-pk')
+
+    score_field = SCORE_FIELDS.get(assessment_type)
+    with transaction.atomic():
+        # The oldest container per student wins, as get_or_create used to find it
+        assessment_ids = dict(containers.values_list('student_id', 'pk'))
+        missing = {student_id for student_id, _, _ in valid} - set(assessment_ids)
+        if missing:
+            Assessment.objects.bulk_create([
+                Assessment(student_id=student_id, assessment_type=assessment_type, term=term,
+                           school=school, date=date, recorded_by=user)
+                for student_id in sorted(missing)
+            ])
+            # bulk_create does not return primary keys on MySQL
+            assessment_ids = dict(containers.values_list('student_id', 'pk'))
+
+        # Last mark wins when a sheet repeats a (student, subject) cell
+        results = {}
+        for student_id, subject_id, marks in valid:
+            result = AssessmentResult(
+                assessment_id=assessment_ids[student_id],
+                subject_id=subject_id,
+                marks=marks,
+                performance_level=performance_level(marks),
+            )
+            if score_field:
+                setattr(result, score_field, marks)
+            results[(student_id, subject_id)] = result
+
+        bulk_upsert(
+            AssessmentResult, list(results.values()),
+            unique_fields=['assessment', 'subject'],
+            update_fields=RESULT_UPDATE_FIELDS,
+        )
+
+    return len(valid), errors
@@ -0,0 +1,127 @@
+"""
+Bulk attendance writer shared by the attendance endpoints.
+
+A roll-call for one date is applied with a fixed number of queries: the
+student ids are validated against the tenant in one query, the existing
+Attendance rows for that date are loaded in one more, and the difference
+is written with one bulk_update and one bulk upsert. Rows whose status
+and remarks did not change are not written at all.
+
+bulk_create/bulk_update bypass model signals, so the writer updates the
+attendance rollups and drops the cached dashboard itself.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .attendance_rollup import apply_attendance_deltas, attendance_delta
+from .bulk import bulk_upsert
+from .dashboard import invalidate_dashboard
+
+VALID_STATUSES = ('PRESENT', 'ABSENT', 'LATE', 'EXCUSED')
+
+UNSET = object()
+
+
+def mark_attendance(school, date, entries, recorded_by=None):
+    """
+    Apply a list of {student_id, status[, remarks][, term]} entries for a
+    single date. Entries without a `remarks` key keep the stored remarks.
+    Students outside `school` are reported in `errors` and skipped.
+
+    Returns {'created', 'updated', 'unchanged', 'errors'}.
+    """
+    from .models import Attendance, Student
+
+    result = {'created': 0, 'updated': 0, 'unchanged': 0, 'errors': []}
+
+    # Last entry wins when a student is listed twice
+    wanted = {}
+    for index, entry in enumerate(entries):
+        student_id = entry.get('student_id')
+        status = (entry.get('status') or '').upper()
+        if not student_id or not status:
+            continue
+        if status not in VALID_STATUSES:
+            result['errors'].append({'index': index, 'student_id': student_id,
+                                     'error': f'Invalid status: {entry.get("status")}'})
+            continue
+        try:
+            student_id = int(student_id)
+        except (TypeError, ValueError):
+            result['errors'].append({'index': index, 'student_id': student_id, 'error': 'Student not found'})
+            continue
+        wanted[student_id] = (index, status, entry.get('remarks', UNSET), entry.get('term'))
+
+    if not wanted:
+        return result
+
+    students = Student.objects.filter(pk__in=wanted)
+    if school is not None:
+        students = students.filter(school=school)
+    students = {
+        pk: (school_id, grade_id, current_term)
+        for pk, school_id, grade_id, current_term in students.values_list('pk', 'school_id', 'grade_id', 'current_term')
+    }
+    for student_id in [student_id for student_id in wanted if student_id not in students]:
+        index = wanted.pop(student_id)[0]
+        result['errors'].append({'index': index, 'student_id': student_id, 'error': 'Student not found'})
+    result['errors'].sort(key=lambda error: error['index'])
+
+    if not wanted:
+        return result
+
+    now = timezone.now()
+    with transaction.atomic():
+        existing = {
+            record.student_id: record
+            for record in Attendance.objects.select_for_update().filter(student_id__in=wanted, date=date)
+        }
+
+        to_create, to_update, deltas = [], [], []
+        for student_id, (_, status, remarks, term) in wanted.items():
+            school_id, grade_id, current_term = students[student_id]
+            record = existing.get(student_id)
+            if record is None:
+                to_create.append(Attendance(
+                    school_id=school_id,
+                    student_id=student_id,
+                    date=date,
+                    status=status,
+                    remarks='' if remarks is UNSET else remarks,
+                    recorded_by=recorded_by,
+                    term=str(term or current_term or 1),
+                    created_at=now,
+                    updated_at=now,
+                ))
+                deltas.append(attendance_delta(school_id, grade_id, student_id, to_create[-1].term, date, status, 1))
+                continue
+            new_remarks = record.remarks if remarks is UNSET else remarks
+            if record.status == status and record.remarks == new_remarks and record.school_id == school_id:
+                result['unchanged'] += 1
+                continue
+            if record.status != status:
+                deltas.append(attendance_delta(school_id, grade_id, student_id, record.term, date, record.status, -1))
+                deltas.append(attendance_delta(school_id, grade_id, student_id, record.term, date, status, 1))
+            record.status = status
+            record.remarks = new_remarks
+            record.school_id = school_id
+            record.recorded_by = recorded_by
+            record.updated_at = now
+            to_update.append(record)
+
+        if to_update:
+            Attendance.objects.bulk_update(
+                to_update, ['status', 'remarks', 'school', 'recorded_by', 'updated_at']
+            )
+        # Upsert so a concurrent roll-call for the same class cannot fail the batch
+        bulk_upsert(
+            Attendance, to_create,
+            unique_fields=['student', 'date'],
+            update_fields=['status', 'remarks', 'school', 'recorded_by', 'updated_at'],
+        )
+        apply_attendance_deltas(deltas)
+
+    result['created'] = len(to_create)
+    result['updated'] = len(to_update)
+    invalidate_dashboard(*{school_id for school_id, _, _ in students.values()})
+    return result
@@ -0,0 +1,228 @@
+"""
+Maintenance helpers for the attendance rollups (AttendanceDailyRollup and
+StudentAttendanceSummary).
+
+Every Attendance write is turned into signed status deltas, one per
+(school, grade, day) and per (student, term), and applied to the locked
+rollup rows. A rollup row that does not exist yet is built from the raw
+attendance rows instead, which already include the write that triggered
+it. Streaks are recomputed from the touched students' rows for the term
+only. The bulk writer in schools.attendance calls apply_attendance_deltas()
+directly; single-row saves and deletes go through the signals in
+schools.signals. rebuild_attendance_rollups() backs the
+`rebuild_attendance_rollups` management command.
+"""
+import datetime
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.utils.dateparse import parse_date
+
+from .bulk import bulk_upsert
+
+STATUS_FIELDS = {'PRESENT': 'present', 'ABSENT': 'absent', 'LATE': 'late', 'EXCUSED': 'excused'}
+COUNTER_FIELDS = ('present', 'absent', 'late', 'excused')
+ATTENDED = ('PRESENT', 'LATE')
+REBUILD_BATCH_SIZE = 2000
+
+
+def normalize_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, str):
+        return parse_date(value)
+    return value
+
+
+def attendance_delta(school_id, grade_id, student_id, term, date, status, sign):
+    """One signed status count for the rollups; sign is +1 for a write, -1 for a reversal"""
+    return (school_id, grade_id, student_id, str(term), normalize_date(date), status, sign)
+
+
+def _collect(deltas):
+    daily = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    summaries = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    schools = {}
+    for school_id, grade_id, student_id, term, date, status, sign in deltas:
+        field = STATUS_FIELDS.get(status)
+        if field is None or date is None:
+            continue
+        daily[(school_id, grade_id, date)][field] += sign
+        summaries[(student_id, term)][field] += sign
+        schools[student_id] = school_id
+    return daily, summaries, schools
+
+
+def _counts_query(queryset, keys):
+    return queryset.order_by().values(*keys, 'status').annotate(count=Count('id'))
+
+
+def _streaks(student_ids, terms):
+    """{(student_id, term): (current_streak, last_date)} from the raw attendance rows"""
+    from .models import Attendance
+
+    rows = Attendance.objects.filter(student_id__in=student_ids, term__in=terms)
+    last_dates = {
+        (row['student_id'], row['term']): row['last']
+        for row in rows.order_by().values('student_id', 'term').annotate(last=Max('date'))
+    }
+    last_miss = (
+        Attendance.objects.filter(student_id=OuterRef('student_id'), term=OuterRef('term'))
+        .exclude(status__in=ATTENDED).order_by('-date').values('date')[:1]
+    )
+    runs = {
+        (row['student_id'], row['term']): row['streak']
+        for row in rows.filter(status__in=ATTENDED)
+        .annotate(last_miss=Subquery(last_miss))
+        .filter(Q(last_miss__isnull=True) | Q(date__gt=F('last_miss')))
+        .order_by().values('student_id', 'term').annotate(streak=Count('id'))
+    }
+    return {key: (runs.get(key, 0), last_date) for key, last_date in last_dates.items()}
+
+
+def _apply_daily(daily, rebuild_missing):
+    from .models import Attendance, AttendanceDailyRollup
+
+    keys = [key for key, counts in daily.items() if any(counts.values())]
+    if not keys:
+        return
+    lookup = reduce(or_, [Q(school_id=school_id, grade_id=grade_id, date=date) for school_id, grade_id, date in keys])
+    existing = {
+        (row.school_id, row.grade_id, row.date): row
+        for row in AttendanceDailyRollup.objects.select_for_update().filter(lookup)
+    }
+    for key, row in existing.items():
+        for field, delta in daily[key].items():
+            setattr(row, field, getattr(row, field) + delta)
+    AttendanceDailyRollup.objects.bulk_update(list(existing.values()), list(COUNTER_FIELDS))
+
+    missing = [key for key in keys if key not in existing]
+    if not missing or not rebuild_missing:
+        return
+    raw = Attendance.objects.filter(reduce(or_, [
+        Q(student__school_id=school_id, student__grade_id=grade_id, date=date) for school_id, grade_id, date in missing
+    ]))
+    rows = {key: AttendanceDailyRollup(school_id=key[0], grade_id=key[1], date=key[2]) for key in missing}
+    for row in _counts_query(raw, ('student__school_id', 'student__grade_id', 'date')):
+        rollup = rows.get((row['student__school_id'], row['student__grade_id'], row['date']))
+        field = STATUS_FIELDS.get(row['status'])
+        if rollup is not None and field:
+            setattr(rollup, field, getattr(rollup, field) + row['count'])
+    bulk_upsert(AttendanceDailyRollup, list(rows.values()),
+                unique_fields=['school', 'grade', 'date'], update_fields=list(COUNTER_FIELDS))
+
+
+def _apply_summaries(summaries, schools, rebuild_missing):
+    from .models import Attendance, StudentAttendanceSummary
+
+    keys = list(summaries)
+    if not keys:
+        return
+    student_ids = {student_id for student_id, _ in keys}
+    terms = {term for _, term in keys}
+    streaks = _streaks(student_ids, terms)
+
+    existing = {
+        (row.student_id, row.term): row
+        for row in StudentAttendanceSummary.objects.select_for_update().filter(student_id__in=student_ids, term__in=terms)
+        if (row.student_id, row.term) in summaries
+    }
+    for key, row in existing.items():
+        for field, delta in summaries[key].items():
+            setattr(row, field, getattr(row, field) + delta)
+        row.current_streak, row.last_date = streaks.get(key, (0, None))
+    StudentAttendanceSummary.objects.bulk_update(
+        list(existing.values()), list(COUNTER_FIELDS) + ['current_streak', 'last_date']
+    )
+
+    missing = [key for key in keys if key not in existing]
+    if not missing or not rebuild_missing:
+        return
+    rows = {}
+    for student_id, term in missing:
+        streak, last_date = streaks.get((student_id, term), (0, None))
+        rows[(student_id, term)] = StudentAttendanceSummary(
+            school_id=schools.get(student_id), student_id=student_id, term=term,
+            current_streak=streak, last_date=last_date,
+        )
+    raw = Attendance.objects.filter(student_id__in={key[0] for key in missing}, term__in={key[1] for key in missing})
+    for row in _counts_query(raw, ('student_id', 'term')):
+        summary = rows.get((row['student_id'], row['term']))
+        field = STATUS_FIELDS.get(row['status'])
+        if summary is not None and field:
+            setattr(summary, field, getattr(summary, field) + row['count'])
+    bulk_upsert(StudentAttendanceSummary, list(rows.values()), unique_fields=['student', 'term'],
+                update_fields=list(COUNTER_FIELDS) + ['school', 'current_streak', 'last_date'])
+
+
+def apply_attendance_deltas(deltas, rebuild_missing=True):
+    """
+    Apply attendance_delta() tuples to the rollups. Reversals coming from a
+    delete pass rebuild_missing=False so a cascading student delete never
+    re-creates rollup rows for a student that is about to disappear.
+    """
+    daily, summaries, schools = _collect(deltas)
+    if not daily:
+        return
+    with transaction.atomic():
+        _apply_daily(daily, rebuild_missing)
+        _apply_summaries(summaries, schools, rebuild_missing)
+
+
+def rebuild_attendance_rollups(school=None, batch_size=REBUILD_BATCH_SIZE, progress=None):
+    """
+    Recompute every rollup (for one school, or all schools) in a single
+    ordered pass over the attendance rows. Returns the number of rows read.
+    """
+    from .models import Attendance, AttendanceDailyRollup, StudentAttendanceSummary
+
+    records = Attendance.objects.all()
+    daily_rows = AttendanceDailyRollup.objects.all()
+    summary_rows = StudentAttendanceSummary.objects.all()
+    if school is not None:
+        records = records.filter(student__school=school)
+        daily_rows = daily_rows.filter(school=school)
+        summary_rows = summary_rows.filter(Q(school=school) | Q(student__school=school))
+
+    daily = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    summaries = []
+    current = None
+    processed = 0
+
+    def flush_summaries(force=False):
+        if summaries and (force or len(summaries) >= batch_size):
+            StudentAttendanceSummary.objects.bulk_create(summaries)
+            summaries.clear()
+
+    with transaction.atomic():
+        daily_rows.delete()
+        summary_rows.delete()
+        rows = records.order_by('student_id', 'term', 'date').values_list(
+            'student_id', 'student__school_id', 'student__grade_id', 'term', 'date', 'status'
+        )
+        for student_id, school_id, grade_id, term, date, status in rows.iterator(chunk_size=batch_size):
+            processed += 1
+            field = STATUS_FIELDS.get(status)
+            if field is None:
+                continue
+            daily[(school_id, grade_id, date)][field] += 1
+            if current is None or (current.student_id, current.term) != (student_id, term):
+                flush_summaries()
+                current = StudentAttendanceSummary(school_id=school_id, student_id=student_id, term=term)
+                summaries.append(current)
+            setattr(current, field, getattr(current, field) + 1)
+            current.current_streak = current.current_streak + 1 if status in ATTENDED else 0
+            current.last_date = date
+            if progress and processed % batch_size == 0:
+                progress(processed)
+        flush_summaries(force=True)
+
+        AttendanceDailyRollup.objects.bulk_create(
+            [AttendanceDailyRollup(school_id=key[0], grade_id=key[1], date=key[2], **counts)
+             for key, counts in daily.items()],
+            batch_size=batch_size,
+        )
+    return processed
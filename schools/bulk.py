@@ -0,0 +1,20 @@
+"""
+Small helpers for set-based writes that have to run on both sqlite
+(development) and MySQL (production).
+"""
+from django.db import connections, router
+
+
+def bulk_upsert(model, objs, unique_fields, update_fields, batch_size=None):
+    """
+    INSERT ... ON CONFLICT/ON DUPLICATE KEY UPDATE for a list of unsaved
+    instances. MySQL picks the conflicting unique key itself and rejects an
+    explicit target, so `unique_fields` is only passed to backends that
+    accept one. Model.save() and signals are bypassed.
+    """
+    if not objs:
+        return []
+    options = {'update_conflicts': True, 'update_fields': update_fields, 'batch_size': batch_size}
+    if connections[router.db_for_write(model)].features.supports_update_conflicts_with_target:
+        options['unique_fields'] = unique_fields
+    return model.objects.bulk_create(objs, **options)
@@ -0,0 +1,171 @@
+"""
+Dashboard snapshot for api_dashboard.
+
+All headline figures are computed in one query (a scalar subquery per
+figure, correlated on the school), the revenue chart in one grouped
+TruncMonth query and the recent payments in one more. The resulting
+snapshot is cached per school for a short time and dropped by the
+Payment/Student/Attendance signals in schools.signals.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+DASHBOARD_CACHE_TIMEOUT = 60  # seconds
+CHART_MONTHS = 6
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def dashboard_cache_key(school_id):
+    return f'dashboard_snapshot_{school_id}'
+
+
+def invalidate_dashboard(*school_ids):
+    """Drop the cached snapshot of every given school"""
+    for school_id in {school_id for school_id in school_ids if school_id}:
+        cache.delete(dashboard_cache_key(school_id))
+
+
+def _school_sum(queryset, school_path, expression, output_field=MONEY):
+    """Scalar subquery: SUM(expression) over the rows of queryset that belong to the outer school"""
+    totals = (
+        queryset.filter(**{school_path: OuterRef('pk')})
+        .order_by()
+        .values(school_path)
+        .annotate(total=Sum(expression, output_field=output_field))
+        .values('total')
+    )
+    zero = Value(Decimal('0')) if output_field is MONEY else Value(0)
+    return Coalesce(Subquery(totals, output_field=output_field), zero, output_field=output_field)
+
+
+def _school_count(queryset, school_path):
+    """Scalar subquery: COUNT(*) of the rows of queryset that belong to the outer school"""
+    counts = (
+        queryset.filter(**{school_path: OuterRef('pk')})
+        .order_by()
+        .values(school_path)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def _chart_months(today):
+    """First day of each of the last CHART_MONTHS months, oldest first"""
+    months = []
+    cursor = today.replace(day=1)
+    for _ in range(CHART_MONTHS):
+        months.insert(0, cursor)
+        cursor = (cursor - timedelta(days=1)).replace(day=1)
+    return months
+
+
+def build_dashboard_snapshot(school):
+    """Compute the dashboard payload for a school (three queries)"""
+    from config.models import SchoolConfig
+    from food.models import FoodSubscription, FoodTransaction
+    from transport.models import TransportAssignment, TransportTransaction
+    from .models import AttendanceDailyRollup, FoodFee, Payment, Student, StudentFeeLedger, StudentMealPayment, Teacher
+
+    now = timezone.now()
+    today = now.date()
+
+    figures = SchoolConfig.objects.filter(pk=school.pk).annotate(
+        total_students=_school_count(Student.objects.all(), 'school'),
+        new_students=_school_count(
+            Student.objects.filter(created_at__month=now.month, created_at__year=now.year), 'school'
+        ),
+        total_teachers=_school_count(Teacher.objects.all(), 'school'),
+        present_today=_school_sum(
+            AttendanceDailyRollup.objects.filter(date=today), 'school', F('present'), output_field=IntegerField()
+        ),
+        tuition_target=_school_sum(
+            Student.objects.all(), 'school',
+            F('admission_fee') + F('term1_fees') + F('term2_fees') + F('term3_fees')
+        ),
+        tuition_collected=_school_sum(StudentFeeLedger.objects.all(), 'student__school', F('paid')),
+        transport_target=_school_sum(
+            TransportAssignment.objects.filter(active=True), 'account__school', F('route__cost_per_term') * 3
+        ),
+        transport_collected=_school_sum(TransportTransaction.objects.filter(type='PAYMENT'), 'school', F('amount')),
+        food_target=_school_sum(
+            FoodSubscription.objects.filter(active=True), 'account__school', F('meal_item__cost') * 3
+        ),
+        food_collected=_school_sum(FoodTransaction.objects.filter(type='PAYMENT'), 'school', F('amount')),
+        food_fee_collected=_school_sum(FoodFee.objects.filter(status='COMPLETED'), 'school', F('amount')),
+        meal_payment_collected=_school_sum(
+            StudentMealPayment.objects.filter(status='COMPLETED'), 'school', F('amount')
+        ),
+    ).values(
+        'total_students', 'new_students', 'total_teachers', 'present_today',
+        'tuition_target', 'tuition_collected', 'transport_target', 'transport_collected',
+        'food_target', 'food_collected', 'food_fee_collected', 'meal_payment_collected',
+    ).first()
+
+    total_students = figures['total_students']
+    attendance_rate = (figures['present_today'] / total_students * 100) if total_students > 0 else 0
+
+    expected_total = (
+        float(figures['tuition_target']) + float(figures['transport_target']) + float(figures['food_target'])
+    )
+    collected_total = (
+        float(figures['tuition_collected']) + float(figures['transport_collected'])
+        + float(figures['food_collected']) + float(figures['food_fee_collected'])
+        + float(figures['meal_payment_collected'])
+    )
+
+    # Revenue chart: one grouped query for the whole window
+    months = _chart_months(today)
+    monthly = {
+        (row['month'].year, row['month'].month): row['total']
+        for row in Payment.objects.filter(school=school, date__gte=months[0])
+        .annotate(month=TruncMonth('date'))
+        .order_by()
+        .values('month')
+        .annotate(total=Sum('amount'))
+    }
+    chart_labels = [month.strftime('%b') for month in months]
+    chart_data = [float(monthly.get((month.year, month.month)) or 0) for month in months]
+
+    recent_payments = Payment.objects.filter(school=school).select_related('student').order_by('-date')[:5]
+    recent_payments_data = [{
+        'id': p.id,
+        'student_name': p.student.get_full_name(),
+        'amount': float(p.amount),
+        'date': p.date.strftime('%Y-%m-%d'),
+        'method': p.payment_method
+    } for p in recent_payments]
+
+    return {
+        'stats': {
+            'total_students': total_students,
+            'new_students': figures['new_students'],
+            'total_teachers': figures['total_teachers'],
+            'attendance_rate': round(attendance_rate, 1),
+            'total_revenue': collected_total,
+            'expected_revenue': expected_total,
+            'outstanding': max(0, expected_total - collected_total),
+            'revenue_growth': 12.5, # Placeholder or calc real growth
+        },
+        'chart_data': {
+            'labels': chart_labels,
+            'revenue': chart_data
+        },
+        'recent_payments': recent_payments_data
+    }
+
+
+def get_dashboard_snapshot(school):
+    """Cached dashboard payload for a school"""
+    key = dashboard_cache_key(school.pk)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_dashboard_snapshot(school)
+        cache.set(key, snapshot, DASHBOARD_CACHE_TIMEOUT)
+    return snapshot
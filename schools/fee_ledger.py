@@ -0,0 +1,215 @@
+"""
+Maintenance helpers for the per-student fee ledger (StudentFeeLedger).
+
+The ledger keeps one row per student per term holding the billed amount
+(copied from Student.term{n}_fees) and the running total of payments, so
+balance lookups read a handful of rows instead of summing the payments
+table on every call. Rows are kept current by the signals in
+schools.signals; rebuild_fee_ledger() and find_fee_ledger_drift() back the
+`rebuild_fee_ledger` and `check_fee_ledger` management commands.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, Sum, Count, Subquery, OuterRef, DecimalField
+
+from .bulk import bulk_upsert
+
+TERMS = (1, 2, 3)
+REBUILD_BATCH_SIZE = 500
+
+
+def normalize_term(term):
+    """Return the term as an int, or None if it cannot be interpreted"""
+    try:
+        return int(term)
+    except (TypeError, ValueError):
+        return None
+
+
+def _term_fees(student, term):
+    return getattr(student, f'term{term}_fees', None) or Decimal('0')
+
+
+def _payment_totals(student_ids):
+    """{(student_id, term): (paid, count)} for the given students in one grouped query"""
+    from .models import Payment
+
+    rows = (
+        Payment.objects.filter(student_id__in=student_ids)
+        .order_by()
+        .values('student_id', 'term')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    return {
+        (row['student_id'], row['term']): (row['total'] or Decimal('0'), row['count'])
+        for row in rows
+    }
+
+
+def _build_rows(students, totals):
+    from .models import StudentFeeLedger
+
+    paid_terms = {}
+    for student_id, term in totals:
+        paid_terms.setdefault(student_id, set()).add(term)
+
+    rows = []
+    for student in students:
+        for term in sorted(set(TERMS) | paid_terms.get(student.pk, set())):
+            paid, count = totals.get((student.pk, term), (Decimal('0'), 0))
+            rows.append(StudentFeeLedger(
+                school_id=student.school_id,
+                student_id=student.pk,
+                term=term,
+                billed=_term_fees(student, term),
+                paid=paid,
+                payment_count=count,
+            ))
+    return rows
+
+
+def _write_rows(rows):
+    from .models import StudentFeeLedger
+
+    bulk_upsert(
+        StudentFeeLedger, rows,
+        unique_fields=['student', 'term'],
+        update_fields=['school', 'billed', 'paid', 'payment_count'],
+    )
+
+
+def rebuild_student_ledger(student):
+    """Recompute all ledger rows of a single student from the payments table"""
+    with transaction.atomic():
+        _write_rows(_build_rows([student], _payment_totals([student.pk])))
+
+
+def rebuild_fee_ledger(students=None, batch_size=REBUILD_BATCH_SIZE, progress=None):
+    """
+    Recompute the ledger for a Student queryset (all students by default).
+    Works in batches of `batch_size` students: one query to load the batch,
+    one grouped payments query and one bulk upsert. Returns the number of
+    students processed.
+    """
+    from .models import Student
+
+    if students is None:
+        students = Student.objects.all()
+    students = students.order_by('pk').only('pk', 'school_id', 'term1_fees', 'term2_fees', 'term3_fees')
+
+    processed = 0
+    last_pk = 0
+    while True:
+        batch = list(students.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            _write_rows(_build_rows(batch, _payment_totals([s.pk for s in batch])))
+        processed += len(batch)
+        last_pk = batch[-1].pk
+        if progress:
+            progress(processed)
+    return processed
+
+
+def apply_payment(student_id, term, amount, count=1, rebuild_missing=True):
+    """
+    Add a payment delta (negative amount/count for reversals) to the ledger.
+    With `rebuild_missing`, a student without a ledger row for the term is
+    rebuilt from scratch instead, which already includes the payment that
+    triggered the call. Reversals pass False so a cascading student delete
+    never re-creates rows for a student that is about to disappear.
+    """
+    from .models import Student, StudentFeeLedger
+
+    term = normalize_term(term)
+    if term is None or not amount and not count:
+        return
+    with transaction.atomic():
+        updated = StudentFeeLedger.objects.filter(student_id=student_id, term=term).update(
+            paid=F('paid') + amount,
+            payment_count=F('payment_count') + count,
+        )
+        if updated or not rebuild_missing:
+            return
+        student = Student.objects.filter(pk=student_id).first()
+        if student is not None:
+            rebuild_student_ledger(student)
+
+
+def sync_student_fees(student):
+    """Copy a student's term fees onto their ledger rows in a single UPDATE"""
+    from .models import StudentFeeLedger
+
+    updated = StudentFeeLedger.objects.filter(student_id=student.pk).update(
+        school_id=student.school_id,
+        billed=Case(
+            *[When(term=term, then=Value(_term_fees(student, term))) for term in TERMS],
+            default=Value(Decimal('0')),
+            output_field=DecimalField(),
+        ),
+    )
+    if not updated:
+        rebuild_student_ledger(student)
+
+
+def sync_ledger_fees(students):
+    """
+    Copy term fees onto the ledger for a Student queryset, for callers that
+    change fees with QuerySet.update() and so bypass the Student signals.
+    """
+    from .models import Student, StudentFeeLedger
+
+    def fee(term):
+        return Subquery(Student.objects.filter(pk=OuterRef('student_id')).values(f'term{term}_fees')[:1])
+
+    return StudentFeeLedger.objects.filter(student__in=students).update(
+        billed=Case(
+            *[When(term=term, then=fee(term)) for term in TERMS],
+            default=Value(Decimal('0')),
+            output_field=DecimalField(),
+        )
+    )
+
+
+def find_fee_ledger_drift(students=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Compare the ledger with the raw Student fees and Payment rows.
+    Returns a list of dicts describing every mismatching (student, term)
+    pair: missing rows, stale billed amounts and wrong payment totals.
+    """
+    from .models import Student, StudentFeeLedger
+
+    if students is None:
+        students = Student.objects.all()
+    students = students.order_by('pk').only('pk', 'school_id', 'term1_fees', 'term2_fees', 'term3_fees')
+
+    drift = []
+    last_pk = 0
+    while True:
+        batch = list(students.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        expected = {(row.student_id, row.term): row for row in _build_rows(batch, _payment_totals([s.pk for s in batch]))}
+        actual = {
+            (row.student_id, row.term): row
+            for row in StudentFeeLedger.objects.filter(student_id__in=[s.pk for s in batch])
+        }
+        for key in sorted(set(expected) | set(actual)):
+            want, have = expected.get(key), actual.get(key)
+            if have is None:
+                if want.paid or want.payment_count or want.billed:
+                    drift.append({'student_id': key[0], 'term': key[1], 'field': 'missing',
+                                  'expected': want.paid, 'actual': None})
+                continue
+            if want is None:
+                want_values = {'billed': Decimal('0'), 'paid': Decimal('0'), 'payment_count': 0}
+            else:
+                want_values = {'billed': want.billed, 'paid': want.paid, 'payment_count': want.payment_count}
+            for field, value in want_values.items():
+                if getattr(have, field) != value:
+                    drift.append({'student_id': key[0], 'term': key[1], 'field': field,
+                                  'expected': value, 'actual': getattr(have, field)})
+    return drift
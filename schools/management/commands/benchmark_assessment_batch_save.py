@@ -0,0 +1,114 @@
+import math
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from config.models import SchoolConfig
+from schools.assessment_batch import save_marks
+from schools.models import Assessment, AssessmentResult, Grade, Student, Subject
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks that saving a mark sheet takes the same number of queries whatever '
+        'its size, on a generated school. Everything it creates is rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--students',
+            type=int,
+            default=50,
+            help='Students on the generated mark sheet (default: 50)',
+        )
+        parser.add_argument(
+            '--subjects',
+            type=int,
+            default=10,
+            choices=range(1, len(Subject.SUBJECT_CHOICES) + 1),
+            metavar=f'1-{len(Subject.SUBJECT_CHOICES)}',
+            help='Subjects on the generated mark sheet (default: 10)',
+        )
+
+    def _insert_batches(self, model, count):
+        """Statements the backend splits a bulk insert of `count` rows into (sqlite caps query parameters)"""
+        fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+        objs = [model()] * count
+        return math.ceil(count / connection.ops.bulk_batch_size(fields, objs)) if count else 0
+
+    def _save(self, school, user, rows):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            saved, errors = save_marks(school, user, 'end-term', 1, '2025-03-28', rows)
+            elapsed = time.perf_counter() - started
+        if errors or saved != len(rows):
+            raise CommandError(f"Saved {saved} of {len(rows)} marks: {errors[:3]}")
+        return len(queries), elapsed
+
+    def handle(self, *args, **options):
+        student_count, subject_count = options['students'], options['subjects']
+        if student_count < 1:
+            raise CommandError("--students must be at least 1")
+        try:
+            with transaction.atomic():
+                school = SchoolConfig.objects.create(school_name='Assessment Benchmark Academy', school_code='BENCH')
+                grade = Grade.objects.create(school=school, name='Benchmark Grade')
+                user = User.objects.create(username='assessment-benchmark')
+                Student.objects.bulk_create([
+                    Student(
+                        school=school, grade=grade, admission_number=f'BENCH{i:05d}',
+                        first_name=f'Student{i}', last_name='Benchmark', gender='F',
+                        date_of_birth='2015-01-01',
+                    )
+                    # One more student for the one-mark sheet
+                    for i in range(student_count + 1)
+                ], batch_size=500)
+                Subject.objects.bulk_create([
+                    Subject(school=school, code=code, name=name)
+                    for code, name in Subject.SUBJECT_CHOICES[:subject_count]
+                ])
+                student_ids = list(Student.objects.filter(school=school).order_by('pk').values_list('pk', flat=True))
+                subject_ids = list(Subject.objects.filter(school=school).order_by('pk').values_list('pk', flat=True))
+                pilot = [{'student_id': student_ids.pop(), 'subject_id': subject_ids[0], 'marks': 50}]
+                sheet = [
+                    {'student_id': student_id, 'subject_id': subject_id, 'marks': (student_id * 7 + subject_id) % 101}
+                    for student_id in student_ids for subject_id in subject_ids
+                ]
+
+                # A one-cell sheet and the full sheet both create their missing
+                # assessments, so they have to cost the same number of queries,
+                # apart from the statements the backend splits a bulk insert into
+                single_queries, _ = self._save(school, user, pilot)
+                created_queries, created_elapsed = self._save(school, user, sheet)
+                updated_queries, updated_elapsed = self._save(school, user, sheet)
+                batching = (
+                    self._insert_batches(Assessment, student_count) - self._insert_batches(Assessment, 1)
+                    + self._insert_batches(AssessmentResult, len(sheet)) - self._insert_batches(AssessmentResult, 1)
+                )
+
+                self.stdout.write(
+                    f"{student_count}x{subject_count} sheet, {len(sheet)} marks: "
+                    f"new {created_queries} queries in {created_elapsed * 1000:.0f} ms, "
+                    f"re-saved {updated_queries} queries in {updated_elapsed * 1000:.0f} ms "
+                    f"(one mark: {single_queries} queries; {batching} extra insert batches "
+                    f"on {connection.vendor})"
+                )
+                if created_queries - batching != single_queries or updated_queries > created_queries:
+                    raise CommandError(
+                        f"Query count grows with the sheet: {single_queries} for one mark, "
+                        f"{created_queries} for {len(sheet)} of which {batching} are insert batches"
+                    )
+                self.stdout.write(self.style.SUCCESS(
+                    f"Saved {len(sheet)} marks with the {single_queries} queries of a single mark"
+                    + (f" plus {batching} insert batches." if batching else ".")
+                ))
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from config.models import SchoolConfig
+from schools.models import Grade, SMSMessage, Student, StudentFeeLedger
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the personalization of a fees reminder for a generated school. '
+        'Everything it creates is rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--students',
+            type=int,
+            default=2000,
+            help='Number of generated parents to render for (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        count = options['students']
+        try:
+            with transaction.atomic():
+                school = SchoolConfig.objects.create(school_name='SMS Benchmark Academy', school_code='BENCH')
+                grade = Grade.objects.create(school=school, name='Benchmark Grade', term1_fees=15000,
+                                             term2_fees=15000, term3_fees=15000)
+                Student.objects.bulk_create([
+                    Student(
+                        school=school, grade=grade, admission_number=f'BENCH{i:05d}',
+                        first_name=f'Student{i}', last_name='Benchmark', gender='F',
+                        date_of_birth='2015-01-01', parent_phone=f'07{i:08d}',
+                        term1_fees=15000, term2_fees=15000, term3_fees=15000,
+                    )
+                    for i in range(count)
+                ], batch_size=500)
+                StudentFeeLedger.objects.bulk_create([
+                    StudentFeeLedger(school=school, student_id=student_id, term=1, billed=15000,
+                                     paid=(student_id % 4) * 5000, payment_count=student_id % 4)
+                    for student_id in Student.objects.filter(school=school).values_list('pk', flat=True)
+                ], batch_size=500)
+
+                sms = SMSMessage(
+                    school=school,
+                    recipient_type='FEES_REMINDER',
+                    message='Dear {parent_name}, this is a reminder from {school_name} that {student_name} '
+                            'has a fee balance of {balance}. Please clear as soon as possible. Thank you.',
+                )
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    targets = sms.collect_targets()
+                    elapsed = time.perf_counter() - started
+
+                self.stdout.write(self.style.SUCCESS(
+                    f"Rendered {len(targets)} fee reminders for {count} students "
+                    f"in {elapsed * 1000:.0f} ms with {len(queries)} queries."
+                ))
+                raise Rollback
+        except Rollback:
+            pass
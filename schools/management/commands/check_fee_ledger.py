@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from schools.models import Student
+from schools.fee_ledger import find_fee_ledger_drift, rebuild_fee_ledger
+from config.models import SchoolConfig
+
+
+class Command(BaseCommand):
+    help = 'Reports drift between the fee ledger and the raw student fees/payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=int,
+            default=None,
+            help='Only check students of this SchoolConfig id',
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Rebuild the ledger for every student with drift',
+        )
+
+    def handle(self, *args, **options):
+        students = Student.objects.all()
+        school_id = options['school']
+        if school_id is not None:
+            if not SchoolConfig.objects.filter(pk=school_id).exists():
+                raise CommandError(f"School {school_id} does not exist")
+            students = students.filter(school_id=school_id)
+
+        drift = find_fee_ledger_drift(students)
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Fee ledger is consistent."))
+            return
+
+        for item in drift:
+            self.stdout.write(
+                f"Student {item['student_id']} term {item['term']}: {item['field']} "
+                f"expected {item['expected']}, ledger has {item['actual']}"
+            )
+
+        drifted_ids = {item['student_id'] for item in drift}
+        self.stdout.write(self.style.WARNING(
+            f"\n{len(drift)} mismatches across {len(drifted_ids)} students."
+        ))
+
+        if options['fix']:
+            fixed = rebuild_fee_ledger(Student.objects.filter(pk__in=drifted_ids))
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt fee ledger for {fixed} students."))
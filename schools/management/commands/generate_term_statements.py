@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from schools.models import Grade
+from schools.term_statements import statement_data, write_statements, DEFAULT_WORKERS
+from config.models import SchoolConfig
+
+
+class Command(BaseCommand):
+    help = 'Renders the term fee statement of every student of a school (or grade) into a ZIP or merged PDF'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--school', type=int, required=True, help='SchoolConfig id')
+        parser.add_argument('--term', type=int, required=True, choices=[1, 2, 3], help='Statement term')
+        parser.add_argument('--grade', type=int, default=None, help='Only this Grade id')
+        parser.add_argument(
+            '--format',
+            choices=['zip', 'pdf'],
+            default='zip',
+            help='One PDF per student in a ZIP, or a single merged PDF (default: zip)',
+        )
+        parser.add_argument('--output', default=None, help='Output file (default: statements-term<N>.<format>)')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help=f'Rendering processes (default: {DEFAULT_WORKERS})',
+        )
+
+    def handle(self, *args, **options):
+        school = SchoolConfig.objects.filter(pk=options['school']).first()
+        if school is None:
+            raise CommandError(f"School {options['school']} does not exist")
+        grade = None
+        if options['grade'] is not None:
+            grade = Grade.objects.filter(pk=options['grade'], school=school).first()
+            if grade is None:
+                raise CommandError(f"Grade {options['grade']} does not exist in this school")
+
+        output = options['output'] or f"statements-term{options['term']}.{options['format']}"
+        started = time.monotonic()
+        items = statement_data(school, options['term'], grade)
+        total = len(items)
+        self.stdout.write(f"Rendering {total} statements with {options['workers']} workers...")
+
+        def progress(done):
+            self.stdout.write(f"  {done}/{total}")
+
+        written = write_statements(items, output, options['format'].upper(), options['workers'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} statements to {output} in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from schools.models import SMSOutbox
+from schools.outbox import process_queue, IDLE_SLEEP
+from schools.sms_queue import deliver, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        'Delivers queued SMS campaigns from the SMS outbox. Runs as a long-lived '
+        'worker, or with --once from cron to drain whatever is due and exit'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no message is due instead of polling for new ones',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Messages claimed per batch (default: {BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=IDLE_SLEEP,
+            help=f'Seconds to wait when the queue is empty (default: {IDLE_SLEEP})',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Processing SMS queue...")
+
+        def progress(done):
+            self.stdout.write(f"  {done} messages processed")
+
+        processed = process_queue(
+            SMSOutbox,
+            deliver,
+            batch_size=options['batch_size'],
+            once=options['once'],
+            idle_sleep=options['sleep'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} queued messages."))
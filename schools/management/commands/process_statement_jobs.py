@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from schools.term_statements import process_jobs, DEFAULT_WORKERS, IDLE_SLEEP
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds term statement jobs requested through the API. Runs as a long-lived '
+        'worker, or with --once from cron to build whatever is queued and exit'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no job is queued instead of polling for new ones',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help=f'Rendering processes per job (default: {DEFAULT_WORKERS})',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=IDLE_SLEEP,
+            help=f'Seconds to wait when no job is queued (default: {IDLE_SLEEP})',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Processing statement jobs...")
+
+        def progress(job):
+            self.stdout.write(f"  job {job.pk}: {job.status} ({job.processed}/{job.total})")
+
+        done = process_jobs(
+            once=options['once'],
+            idle_sleep=options['sleep'],
+            workers=options['workers'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Ran {done} statement jobs."))
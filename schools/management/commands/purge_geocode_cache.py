@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from schools.utils.geocache import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired geocoding answers from the geocode cache'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} expired geocode cache entries"))
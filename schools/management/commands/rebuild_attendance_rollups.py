@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from schools.models import Attendance
+from schools.attendance_rollup import rebuild_attendance_rollups, REBUILD_BATCH_SIZE
+from config.models import SchoolConfig
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily and per-student attendance rollups from the attendance records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=int,
+            default=None,
+            help='Only rebuild the rollups for this SchoolConfig id',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=REBUILD_BATCH_SIZE,
+            help=f'Attendance rows read per chunk (default: {REBUILD_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        school = None
+        records = Attendance.objects.all()
+        school_id = options['school']
+        if school_id is not None:
+            school = SchoolConfig.objects.filter(pk=school_id).first()
+            if school is None:
+                raise CommandError(f"School {school_id} does not exist")
+            records = records.filter(student__school=school)
+
+        total = records.count()
+        self.stdout.write(f"Rebuilding attendance rollups from {total} attendance records...")
+
+        def progress(done):
+            self.stdout.write(f"  {done}/{total}")
+
+        processed = rebuild_attendance_rollups(school, batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt attendance rollups from {processed} records."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from schools.models import Student
+from schools.fee_ledger import rebuild_fee_ledger, REBUILD_BATCH_SIZE
+from config.models import SchoolConfig
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-student fee ledger from student fees and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=int,
+            default=None,
+            help='Only rebuild the ledger for this SchoolConfig id',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=REBUILD_BATCH_SIZE,
+            help=f'Students processed per batch (default: {REBUILD_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        students = Student.objects.all()
+        school_id = options['school']
+        if school_id is not None:
+            if not SchoolConfig.objects.filter(pk=school_id).exists():
+                raise CommandError(f"School {school_id} does not exist")
+            students = students.filter(school_id=school_id)
+
+        total = students.count()
+        self.stdout.write(f"Rebuilding fee ledger for {total} students...")
+
+        def progress(done):
+            self.stdout.write(f"  {done}/{total}")
+
+        processed = rebuild_fee_ledger(students, batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt fee ledger for {processed} students."))
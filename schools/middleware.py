@@ -4,6 +4,8 @@ Middleware for offline-first functionality
 import logging
 from django.utils.deprecation import MiddlewareMixin
 from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from config.models import SchoolConfig
 from schools.utils.network import is_online, force_check_online
 from schools.models import SyncStatus
 
@@ -51,3 +53,18 @@ class OfflineDetectionMiddleware(MiddlewareMixin):
         
         return None
 
+
+
+class SchoolTenantMiddleware(MiddlewareMixin):
+    """
+    Resolves the current school once per request and exposes it as
+    request.school. Resolution is lazy, so endpoints that never touch the
+    tenant (login, static pages) pay nothing; SchoolConfig.get_config()
+    reuses the same result for the rest of the request.
+    """
+
+    def process_request(self, request):
+        request.school = SimpleLazyObject(
+            lambda: SchoolConfig.get_config(user=getattr(request, 'user', None), request=request)
+        )
+        return None
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_fee_ledger(apps, schema_editor):
+    Student = apps.get_model('schools', 'Student')
+    Payment = apps.get_model('schools', 'Payment')
+    StudentFeeLedger = apps.get_model('schools', 'StudentFeeLedger')
+
+    totals = {}
+    for row in Payment.objects.order_by().values('student_id', 'term').annotate(total=Sum('amount'), count=Count('id')):
+        totals[(row['student_id'], row['term'])] = (row['total'] or 0, row['count'])
+
+    rows = []
+    for student in Student.objects.only('pk', 'school_id', 'term1_fees', 'term2_fees', 'term3_fees').iterator():
+        for term in (1, 2, 3):
+            paid, count = totals.pop((student.pk, term), (0, 0))
+            rows.append(StudentFeeLedger(
+                school_id=student.school_id,
+                student_id=student.pk,
+                term=term,
+                billed=getattr(student, f'term{term}_fees') or 0,
+                paid=paid,
+                payment_count=count,
+            ))
+        if len(rows) >= 1500:
+            StudentFeeLedger.objects.bulk_create(rows)
+            rows = []
+
+    # Payments recorded against a term outside 1-3 still count towards the total paid
+    for (student_id, term), (paid, count) in totals.items():
+        rows.append(StudentFeeLedger(student_id=student_id, term=term, paid=paid, payment_count=count))
+    StudentFeeLedger.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('config', '0011_systemsettings'),
+        ('schools', '0045_change_payment_date_to_datefield'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentFeeLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.IntegerField(choices=[(1, 'Term 1'), (2, 'Term 2'), (3, 'Term 3')])),
+                ('billed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='fee_ledgers', to='config.schoolconfig')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_ledger', to='schools.student')),
+            ],
+            options={
+                'ordering': ['student', 'term'],
+                'unique_together': {('student', 'term')},
+            },
+        ),
+        migrations.RunPython(populate_fee_ledger, migrations.RunPython.noop),
+    ]
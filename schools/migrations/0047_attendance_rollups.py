@@ -0,0 +1,91 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+STATUS_FIELDS = {'PRESENT': 'present', 'ABSENT': 'absent', 'LATE': 'late', 'EXCUSED': 'excused'}
+
+
+def populate_attendance_rollups(apps, schema_editor):
+    Attendance = apps.get_model('schools', 'Attendance')
+    AttendanceDailyRollup = apps.get_model('schools', 'AttendanceDailyRollup')
+    StudentAttendanceSummary = apps.get_model('schools', 'StudentAttendanceSummary')
+
+    daily = {}
+    summaries = []
+    current = None
+    rows = Attendance.objects.order_by('student_id', 'term', 'date').values_list(
+        'student_id', 'student__school_id', 'student__grade_id', 'term', 'date', 'status'
+    )
+    for student_id, school_id, grade_id, term, date, status in rows.iterator(chunk_size=2000):
+        field = STATUS_FIELDS.get(status)
+        if field is None:
+            continue
+        counts = daily.setdefault((school_id, grade_id, date), dict.fromkeys(STATUS_FIELDS.values(), 0))
+        counts[field] += 1
+        if current is None or (current.student_id, current.term) != (student_id, term):
+            if len(summaries) >= 2000:
+                StudentAttendanceSummary.objects.bulk_create(summaries)
+                summaries = []
+            current = StudentAttendanceSummary(school_id=school_id, student_id=student_id, term=term)
+            summaries.append(current)
+        setattr(current, field, getattr(current, field) + 1)
+        current.current_streak = current.current_streak + 1 if status in ('PRESENT', 'LATE') else 0
+        current.last_date = date
+    StudentAttendanceSummary.objects.bulk_create(summaries)
+
+    AttendanceDailyRollup.objects.bulk_create(
+        [AttendanceDailyRollup(school_id=key[0], grade_id=key[1], date=key[2], **counts)
+         for key, counts in daily.items()],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('config', '0011_systemsettings'),
+        ('schools', '0046_studentfeeledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('present', models.IntegerField(default=0)),
+                ('absent', models.IntegerField(default=0)),
+                ('late', models.IntegerField(default=0)),
+                ('excused', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('grade', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_rollups', to='schools.grade')),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_rollups', to='config.schoolconfig')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('school', 'grade', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(choices=[('1', 'Term 1'), ('2', 'Term 2'), ('3', 'Term 3')], max_length=1)),
+                ('present', models.IntegerField(default=0)),
+                ('absent', models.IntegerField(default=0)),
+                ('late', models.IntegerField(default=0)),
+                ('excused', models.IntegerField(default=0)),
+                ('current_streak', models.IntegerField(default=0)),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='config.schoolconfig')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='schools.student')),
+            ],
+            options={
+                'ordering': ['student', 'term'],
+                'unique_together': {('student', 'term')},
+            },
+        ),
+        migrations.RunPython(populate_attendance_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:13
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('config', '0011_systemsettings'),
+        ('schools', '0047_attendance_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='smsmessage',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('QUEUED', 'Queued'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='SMSOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=32)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, default='', max_length=32)),
+                ('provider_message_id', models.CharField(blank=True, default='', max_length=100)),
+                ('error', models.TextField(blank=True, default='')),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sms_outbox', to='config.schoolconfig')),
+                ('sms', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='schools.smsmessage')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='schools_sms_status_7868ac_idx'), models.Index(fields=['sms', 'status'], name='schools_sms_sms_id_2ff3c2_idx')],
+            },
+        ),
+    ]
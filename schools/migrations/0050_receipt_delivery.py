@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('config', '0011_systemsettings'),
+        ('schools', '0049_statement_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('payment', 'Fee Payment'), ('transport_fee', 'Transport Fee'), ('food_fee', 'Food Fee'), ('meal_payment', 'Meal Payment')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('channel', models.CharField(choices=[('email', 'Email'), ('whatsapp', 'WhatsApp')], max_length=10)),
+                ('recipient', models.CharField(max_length=254)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, default='', max_length=32)),
+                ('error', models.TextField(blank=True, default='')),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('school', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='receipt_deliveries', to='config.schoolconfig')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='schools_rec_status_0df320_idx'), models.Index(fields=['kind', 'object_id'], name='schools_rec_kind_4d6965_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0050_receipt_delivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=20)),
+                ('kind', models.CharField(choices=[('geocode', 'Geocode'), ('reverse', 'Reverse Geocode'), ('search', 'Address Search')], max_length=10)),
+                ('key', models.CharField(max_length=64)),
+                ('query', models.CharField(max_length=255)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('provider', 'kind', 'key')},
+            },
+        ),
+    ]
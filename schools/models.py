@@ -553,16 +553,29 @@ class Student(models.Model):
             return self.term3_fees
         return 0
 
+    def get_term_paid_map(self):
+        """
+        Get {term: amount paid} from the fee ledger.
+        Uses prefetch_related('fee_ledger') when the caller has prefetched it;
+        falls back to one grouped payments query if the ledger is not built yet.
+        """
+        paid = {row.term: row.paid for row in self.fee_ledger.all()}
+        if not paid and self.pk:
+            paid = {
+                row['term']: row['total'] or 0
+                for row in self.payments.order_by().values('term').annotate(total=Sum('amount'))
+            }
+        return paid
+
     def get_previous_balance(self):
         """Get balance from previous terms"""
         current_term = self.current_term
         total_previous = 0
         if current_term > 1:
+            paid = self.get_term_paid_map()
             for term in range(1, current_term):
                 term_fee = self.get_term_fees(term)
-                term_paid = self.payments.filter(term=term).aggregate(
-                    total=Sum('amount')
-                )['total'] or 0
+                term_paid = paid.get(term, 0)
                 total_previous += term_fee - term_paid
         return total_previous
 
@@ -604,9 +617,7 @@ class Student(models.Model):
     
     def get_term_paid_amount(self, term):
         """Get total amount paid for specific term"""
-        return self.payments.filter(term=term).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
+        return self.get_term_paid_map().get(int(term), 0)
 
     def get_term_balance(self, term):
         """Get balance for specific term"""
@@ -628,9 +639,7 @@ class Student(models.Model):
     
     def get_total_paid(self):
         """Calculate total amount paid by student"""
-        total = self.payments.aggregate(
-            total=Sum('amount')
-        )['total'] or 0
+        total = sum(self.get_term_paid_map().values()) or 0
         return total
 
     def get_holistic_financials(self):
@@ -832,17 +841,32 @@ class Student(models.Model):
 
     def get_attendance_stats(self, start_date=None, end_date=None):
         """Get attendance statistics for the student"""
-        records = self.attendance_records.all()
-        
-        if start_date:
-            records = records.filter(date__gte=start_date)
-        if end_date:
-            records = records.filter(date__lte=end_date)
-
-        total = records.count()
-        present = records.filter(status='PRESENT').count()
-        absent = records.filter(status='ABSENT').count()
-        late = records.filter(status='LATE').count()
+        summaries = [] if start_date or end_date else list(self.attendance_summaries.all())
+        counts = {'PRESENT': 0, 'ABSENT': 0, 'LATE': 0, 'EXCUSED': 0}
+        current_streak = 0
+
+        if summaries:
+            # Served from the per-term rollups kept by schools.attendance_rollup
+            for summary in summaries:
+                counts['PRESENT'] += summary.present
+                counts['ABSENT'] += summary.absent
+                counts['LATE'] += summary.late
+                counts['EXCUSED'] += summary.excused
+                if summary.term == str(self.current_term):
+                    current_streak = summary.current_streak
+        else:
+            records = self.attendance_records.all()
+            if start_date:
+                records = records.filter(date__gte=start_date)
+            if end_date:
+                records = records.filter(date__lte=end_date)
+            for row in records.order_by().values('status').annotate(count=models.Count('id')):
+                counts[row['status']] = counts.get(row['status'], 0) + row['count']
+
+        total = sum(counts.values())
+        present = counts['PRESENT']
+        absent = counts['ABSENT']
+        late = counts['LATE']
 
         return {
             'total_days': total,
@@ -851,6 +875,7 @@ class Student(models.Model):
             'absent_count': absent,
             'absent_days': absent,
             'late_days': late,
+            'current_streak': current_streak,
             'present_percentage': round((present + late) * 100 / total if total > 0 else 0, 1),
             'absent_percentage': round(absent * 100 / total if total > 0 else 0, 1),
             'attendance_rate': round((present + late) * 100 / total if total > 0 else 0, 1)
@@ -888,9 +913,8 @@ class Student(models.Model):
     def get_term_paid_amount(self, term):
         """Get the total amount paid for a specific term"""
         try:
-            term_payments = self.payments.filter(term=int(term))
-            return term_payments.aggregate(Sum('amount'))['amount__sum'] or 0
-        except (ValueError, AttributeError):
+            return self.get_term_paid_map().get(int(term), 0)
+        except (ValueError, TypeError, AttributeError):
             return 0
 
     def get_term_payment_status(self, term):
@@ -1129,6 +1153,31 @@ class Payment(models.Model):
     class Meta:
         ordering = ['-date']
 
+class StudentFeeLedger(models.Model):
+    """
+    Denormalized per-student, per-term fee totals.
+    Maintained by schools.fee_ledger on Payment writes and fee changes so
+    balances can be read without re-aggregating the payments table.
+    """
+    school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='fee_ledgers', null=True, blank=True)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='fee_ledger')
+    term = models.IntegerField(choices=TERM_CHOICES)
+    billed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    payment_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['student', 'term']
+        ordering = ['student', 'term']
+
+    def __str__(self):
+        return f"{self.student_id} - Term {self.term}: {self.billed} billed / {self.paid} paid"
+
+    @property
+    def balance(self):
+        return self.billed - self.paid
+
 class Salary(models.Model):
     employee = models.ForeignKey(
         Employee,
@@ -1275,6 +1324,60 @@ class Attendance(models.Model):
     def __str__(self):
         return f"{self.student.get_full_name()} - {self.date} - {self.get_status_display()}"
 
+class AttendanceDailyRollup(models.Model):
+    """
+    Attendance counters per school, grade and day.
+    Maintained by schools.attendance_rollup on Attendance writes so daily
+    rates can be read without counting the raw attendance rows.
+    """
+    school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='attendance_rollups', null=True, blank=True)
+    grade = models.ForeignKey(Grade, on_delete=models.CASCADE, related_name='attendance_rollups', null=True, blank=True)
+    date = models.DateField()
+    present = models.IntegerField(default=0)
+    absent = models.IntegerField(default=0)
+    late = models.IntegerField(default=0)
+    excused = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['school', 'grade', 'date']
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.school_id} / {self.grade_id} - {self.date}: {self.present} present of {self.total}"
+
+    @property
+    def total(self):
+        return self.present + self.absent + self.late + self.excused
+
+class StudentAttendanceSummary(models.Model):
+    """
+    Attendance counters per student and term, plus the current run of
+    consecutive days attended (present or late) within the term.
+    Maintained by schools.attendance_rollup on Attendance writes.
+    """
+    school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='attendance_summaries', null=True, blank=True)
+    student = models.ForeignKey('Student', on_delete=models.CASCADE, related_name='attendance_summaries')
+    term = models.CharField(max_length=1, choices=Attendance.TERM_CHOICES)
+    present = models.IntegerField(default=0)
+    absent = models.IntegerField(default=0)
+    late = models.IntegerField(default=0)
+    excused = models.IntegerField(default=0)
+    current_streak = models.IntegerField(default=0)
+    last_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['student', 'term']
+        ordering = ['student', 'term']
+
+    def __str__(self):
+        return f"{self.student_id} - Term {self.term}: {self.present + self.late} of {self.total} days"
+
+    @property
+    def total(self):
+        return self.present + self.absent + self.late + self.excused
+
 class Schedule(models.Model):
     school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='schedules', null=True, blank=True)
     DAY_CHOICES = [
@@ -1340,6 +1443,8 @@ class SMSMessage(models.Model):
     
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
+        ('QUEUED', 'Queued'),
+        ('SENDING', 'Sending'),
         ('SENT', 'Sent'),
         ('FAILED', 'Failed'),
     ]
@@ -1395,224 +1500,228 @@ class SMSMessage(models.Model):
     class Meta:
         ordering = ['-created_at']
     
-    def send(self):
-        from .utils.sms import send_bulk_sms, format_phone_number
-        from django.db.models import Sum, F, Q, DecimalField, Value
-        from django.db.models.functions import Coalesce
-        from django.utils import timezone
+    def collect_targets(self):
+        """Build the personalised (phone, message) list for this campaign"""
+        from django.db.models import Q
+        from .sms_personalize import annotate_sms_balance, campaign_assessment, render_employee_messages, render_student_messages
         
         # Get base queryset for school
         school_students = Student.objects.filter(school=self.school)
         school_teachers = Teacher.objects.filter(school=self.school)
         school_employees = Employee.objects.filter(school=self.school)
         
-        targets = [] # List of (phone, message_content)
         print(f"DEBUG: Starting SMS send for recipient_type={self.recipient_type}, school={self.school}")
-        print(f"DEBUG: Specific Grade={self.specific_grade}, Student={self.specific_student}, Employee={self.specific_employee}")
-        print(f"DEBUG: Assessment Term={self.assessment_term}, Type={self.assessment_type}")
         
-        # Performance optimization: Pre-calculate balances if needed
-        student_balances = {}
-        if "{balance}" in self.message or self.recipient_type == 'FEES_REMINDER':
-            for s in school_students:
-                total_fees = (s.term1_fees or 0) + (s.term2_fees or 0) + (s.term3_fees or 0)
-                # This is still a bit slow, but better than doing aggregate() in a loop
-                # Ideally we'd use annotate(total_paid=Sum('payments__amount')) on school_students
-                pass
-
-        def populate_message(student=None, employee=None):
-            msg = self.message
-            if student:
-                # Calculate balance if placeholder exists
-                balance = 0
-                if "{balance}" in msg or self.recipient_type == 'FEES_REMINDER':
-                    total_fees = (student.term1_fees or 0) + (student.term2_fees or 0) + (student.term3_fees or 0)
-                    total_paid = student.payments.aggregate(total=Sum('amount'))['total'] or 0
-                    balance = total_fees - total_paid
-                
-                # Format results if placeholder exists
-                results_str = ""
-                if "{results}" in msg or self.recipient_type == 'ASSESSMENT_RESULTS':
-                    res_qs = AssessmentResult.objects.filter(
-                        assessment__student=student,
-                        assessment__term=self.assessment_term or 1,
-                        assessment__assessment_type=self.assessment_type or 'mid-term'
-                    ).select_related('subject')
-                    
-                    res_list = []
-                    total_marks = 0
-                    for r in res_qs:
-                        label = r.subject.code or r.subject.name
-                        res_list.append(f"{label}: {int(r.marks or 0)}")
-                        total_marks += (r.marks or 0)
-                    
-                    if res_list:
-                        results_str = ", ".join(res_list) + f". Total: {int(total_marks)}"
-                    else:
-                        results_str = "No results found."
-
-                msg = msg.replace("{student_name}", student.full_name)
-                msg = msg.replace("{parent_name}", f"{student.first_name}'s Parent")
-                msg = msg.replace("{balance}", f"{balance:,.2f}")
-                msg = msg.replace("{results}", results_str)
-                msg = msg.replace("{term}", f"Term {self.assessment_term or '1'}")
-                exam_name = dict(Assessment.ASSESSMENT_TYPES).get(self.assessment_type, self.assessment_type or 'Assessment')
-                msg = msg.replace("{exam_type}", str(exam_name))
-            
-            if employee:
-                msg = msg.replace("{staff_name}", employee.get_full_name())
-                msg = msg.replace("{position}", employee.position or "")
-            
-            # School name placeholder
-            if self.school:
-                msg = msg.replace("{school_name}", self.school.school_name)
-            
-            return msg
-
-        # Collect targets
-        # Collect targets
+        # Pick the recipients; sms_personalize renders them with a few grouped queries
+        students = employees = None
         if self.recipient_type == 'ALL_STUDENTS':
-            # Get all students for the school
             students = school_students.all()
-            total_count = students.count()
-            print(f"DEBUG: Processing {total_count} students for SMS")
             
-            # Use iterator to prevent loading all students into memory at once
-            for s in students.iterator(chunk_size=100):
-                phone = s.parent_phone
-                if not phone:
-                    phone = s.guardian_phone
-                
-                # If still no phone, check user email if it looks like a phone? No, risky.
-                
-                if phone:
-                    targets.append((phone, populate_message(student=s)))
-                else:
-                    # Log only first few missing to avoid spam
-                    if len(targets) < 5:
-                         print(f"DEBUG: Skipping student {s.full_name} - No parent or guardian phone")
-
         elif self.recipient_type == 'GRADE' and self.specific_grade:
             students = school_students.filter(grade=self.specific_grade)
-            total_count = students.count()
-            print(f"DEBUG: Processing {total_count} students in grade {self.specific_grade}")
-            
-            # Use iterator to prevent memory overload
-            for s in students.iterator(chunk_size=100):
-                phone = s.parent_phone or s.guardian_phone
-                if phone:
-                    targets.append((phone, populate_message(student=s)))
                     
         elif self.recipient_type == 'FEES_REMINDER':
-            students = school_students.annotate(
-                total_fees=F('term1_fees') + F('term2_fees') + F('term3_fees'),
-                total_paid=Coalesce(Sum('payments__amount', output_field=DecimalField(max_digits=10, decimal_places=2)), Value(0, output_field=DecimalField(max_digits=10, decimal_places=2))),
-                balance=F('total_fees') - F('total_paid')
-            ).filter(balance__gt=0)
+            students = annotate_sms_balance(school_students).filter(sms_balance__gt=0)
             
             if self.specific_grade: students = students.filter(grade=self.specific_grade)
-            if self.fee_min is not None: students = students.filter(balance__gte=self.fee_min)
-            if self.fee_max is not None: students = students.filter(balance__lte=self.fee_max)
+            if self.fee_min is not None: students = students.filter(sms_balance__gte=self.fee_min)
+            if self.fee_max is not None: students = students.filter(sms_balance__lte=self.fee_max)
             
-            for s in students:
-                # Since we already have balance annotated, let's use it
-                bal = s.balance if hasattr(s, 'balance') else 0
-                msg = self.message
-                msg = msg.replace("{student_name}", s.full_name)
-                msg = msg.replace("{parent_name}", f"{s.first_name}'s Parent")
-                msg = msg.replace("{balance}", f"{bal:,.2f}")
-                if self.school: msg = msg.replace("{school_name}", self.school.school_name)
-                targets.append((s.parent_phone or s.guardian_phone, msg))
-
         elif self.recipient_type == 'ASSESSMENT_RESULTS':
             # Only students who HAVE results for this assessment
+            term, assessment_type = campaign_assessment(self)
             students = school_students.filter(
-                assessments__term=self.assessment_term or 1,
-                assessments__assessment_type=self.assessment_type or 'mid-term'
-            ).distinct().exclude(Q(parent_phone__isnull=True) | Q(parent_phone=''))
+                pk__in=Assessment.objects.filter(term=term, assessment_type=assessment_type).values('student_id')
+            ).exclude(Q(parent_phone__isnull=True) | Q(parent_phone=''))
             
             if self.specific_grade:
                 students = students.filter(grade=self.specific_grade)
-            
-            for s in students:
-                targets.append((s.parent_phone or s.guardian_phone, populate_message(student=s)))
                     
         elif self.recipient_type == 'ALL_TEACHERS':
-            teachers = school_teachers.filter(status='ACTIVE').exclude(Q(phone__isnull=True) | Q(phone=''))
-            for t in teachers:
-                targets.append((t.phone, populate_message(employee=t)))
+            employees = school_teachers.filter(status='ACTIVE').exclude(Q(phone__isnull=True) | Q(phone=''))
             
         elif self.recipient_type == 'ALL_STAFF':
-            staff = school_employees.filter(status='ACTIVE').exclude(Q(phone__isnull=True) | Q(phone=''))
-            for s in staff:
-                targets.append((s.phone, populate_message(employee=s)))
+            employees = school_employees.filter(status='ACTIVE').exclude(Q(phone__isnull=True) | Q(phone=''))
             
         elif self.recipient_type == 'INDIVIDUAL' and self.specific_student:
-                phone = self.specific_student.parent_phone or self.specific_student.guardian_phone
-                if phone: targets.append((phone, populate_message(student=self.specific_student)))
+            students = Student.objects.filter(pk=self.specific_student_id)
             
         elif self.recipient_type == 'INDIVIDUAL_STAFF' and self.specific_employee:
-            if self.specific_employee.phone:
-                targets.append((self.specific_employee.phone, populate_message(employee=self.specific_employee)))
+            employees = [self.specific_employee]
         
-        print(f"DEBUG: Found {len(targets)} unique targets")
-        self.recipients_count = len(targets)
+        targets = [] # List of (phone, message_content)
+        if students is not None:
+            targets = render_student_messages(self, students)
+        elif employees is not None:
+            targets = render_employee_messages(self, employees)
         
-        if not targets:
-            print("DEBUG: No targets found - returning FAILED")
-            self.status = 'FAILED'
-            self.response_data = {'error': 'No valid recipients found'}
-            self.save()
+        print(f"DEBUG: Found {len(targets)} unique targets")
+        return targets
+
+    def send(self):
+        """
+        Queue the campaign: the recipients are expanded into the SMSOutbox
+        and delivered by the `process_sms_queue` worker. Returns
+        (success, response) like the old synchronous send.
+        """
+        from .sms_queue import enqueue
+
+        queued = enqueue(self)
+        if not queued:
             return False, 'No valid recipients found'
-        
-        # Check if all messages are identical
-        unique_messages = set([t[1] for t in targets])
-        print(f"DEBUG: Unique messages count={len(unique_messages)}")
-        
-        try:
-            if len(unique_messages) == 1:
-                # Send bulk
-                phone_numbers = [t[0] for t in targets]
-                print(f"DEBUG: Sending bulk to {len(phone_numbers)} numbers")
-                success, response = send_bulk_sms(phone_numbers, list(unique_messages)[0])
-                print(f"DEBUG: Bulk send response: success={success}, response={response}")
-            else:
-                # Send individually
-                print(f"DEBUG: Sending individually to {len(targets)} numbers")
-                results_log = []
-                success_count = 0
-                # Limit to first 100 to prevent long timeouts in HTTP request if not using Celery
-                process_targets = targets[:100]
-                for phone, individual_msg in process_targets:
-                    try:
-                        res_ok, res_data = send_bulk_sms([phone], individual_msg)
-                        if res_ok: success_count += 1
-                        results_log.append({'phone': phone, 'success': res_ok})
-                    except Exception as e:
-                        print(f"DEBUG: Error sending to {phone}: {str(e)}")
-                        results_log.append({'phone': phone, 'success': False, 'error': str(e)})
-                
-                success = success_count > 0
-                response = {
-                    'summary': f'Sent {success_count}/{len(process_targets)} successfully',
-                    'total_requested': len(targets),
-                    'processed': len(process_targets),
-                    'details': results_log
-                }
-                print(f"DEBUG: Individual send summary: {response['summary']}")
-        except Exception as e:
-            self.status = 'FAILED'
-            self.response_data = {'error': f'Critical send failure: {str(e)}'}
-            self.save()
-            return False, f'Critical send failure: {str(e)}'
-
-        # Update status
-        self.status = 'SENT' if success else 'FAILED'
-        self.sent_at = timezone.now() if success else None
-        self.response_data = response
-        self.save()
-        
-        return success, response
+        return True, {'queued': queued}
+
+class SMSOutbox(models.Model):
+    """
+    One recipient of an SMSMessage campaign. Rows are written when the
+    campaign is queued and delivered by the `process_sms_queue` worker, so
+    a campaign survives restarts and retries only the numbers that failed.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='sms_outbox', null=True, blank=True)
+    sms = models.ForeignKey(SMSMessage, on_delete=models.CASCADE, related_name='outbox')
+    phone = models.CharField(max_length=32)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=32, blank=True, default='')
+    provider_message_id = models.CharField(max_length=100, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['sms', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.phone} - {self.get_status_display()}"
+
+class ReceiptDelivery(models.Model):
+    """
+    One receipt to deliver to a parent on one channel. Rows are written when
+    a payment is recorded and sent by the `process_receipt_outbox` worker,
+    so recording a payment never waits on SMTP or the WhatsApp API and a
+    failed delivery is retried with backoff.
+    """
+    KIND_CHOICES = [
+        ('payment', 'Fee Payment'),
+        ('transport_fee', 'Transport Fee'),
+        ('food_fee', 'Food Fee'),
+        ('meal_payment', 'Meal Payment'),
+    ]
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('whatsapp', 'WhatsApp'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='receipt_deliveries', null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=32, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} via {self.channel} - {self.get_status_display()}"
+
+class StatementJob(models.Model):
+    """
+    A batch of term fee statements requested through the API. Jobs are
+    built by the `process_statement_jobs` worker into one ZIP of PDFs or one
+    merged PDF; `processed` counts the statements rendered so far.
+    """
+    FORMAT_CHOICES = [
+        ('ZIP', 'ZIP of PDFs'),
+        ('PDF', 'Merged PDF'),
+    ]
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='statement_jobs', null=True, blank=True)
+    grade = models.ForeignKey(Grade, on_delete=models.SET_NULL, null=True, blank=True, related_name='statement_jobs')
+    term = models.IntegerField(choices=TERM_CHOICES)
+    output_format = models.CharField(max_length=3, choices=FORMAT_CHOICES, default='ZIP')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to='statements/', blank=True)
+    error = models.TextField(blank=True, default='')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='statement_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Term {self.term} statements - {self.get_status_display()}"
+
+class GeocodeCache(models.Model):
+    """
+    A provider's answer to one geocoding lookup (address search, forward or
+    reverse geocode), kept until `expires_at` so repeated lookups are served
+    without calling Nominatim or Google. `key` is a hash of the normalized
+    address or the rounded coordinates; see schools.utils.geocache.
+    """
+    KIND_CHOICES = [
+        ('geocode', 'Geocode'),
+        ('reverse', 'Reverse Geocode'),
+        ('search', 'Address Search'),
+    ]
+
+    provider = models.CharField(max_length=20)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=64)
+    query = models.CharField(max_length=255)
+    result = models.JSONField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['provider', 'kind', 'key']
+
+    def __str__(self):
+        return f"{self.provider} {self.kind}: {self.query}"
 
 class EmployeeAttendance(models.Model):
     STATUS_CHOICES = [
@@ -3,31 +3,32 @@ import base64
 import logging
 from datetime import datetime, timedelta
 from django.conf import settings
-from django.core.cache import cache
+from .utils.integrations import get_client
+from .utils.tokens import get_token
 
 logger = logging.getLogger(__name__)
 
-def get_access_token():
-    # Try to get token from cache first
-    cached_token = cache.get('mpesa_access_token')
-    if cached_token:
-        return cached_token
-    
+def _fetch_access_token():
     consumer_key = settings.MPESA_CONSUMER_KEY
     consumer_secret = settings.MPESA_CONSUMER_SECRET
     auth = base64.b64encode(f"{consumer_key}:{consumer_secret}".encode()).decode()
     
+    url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
+    headers = {"Authorization": f"Basic {auth}"}
+    # Add timeout to prevent hanging
+    response = get_client('mpesa').get(url, headers=headers, timeout=10)
+    response.raise_for_status()
+    data = response.json()
+    # Daraja tokens last an hour; honour whatever lifetime it reports
+    return data['access_token'], int(data.get('expires_in') or 3599)
+
+def get_access_token(force_refresh=False):
+    """Daraja OAuth token, cached until shortly before it expires (see utils.tokens)"""
     try:
-        url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
-        headers = {"Authorization": f"Basic {auth}"}
-        # Add timeout to prevent hanging
-        response = requests.get(url, headers=headers, timeout=10)
-        token = response.json()['access_token']
-        
-        # Cache the token for 50 minutes (tokens typically expire after 1 hour)
-        cache.set('mpesa_access_token', token, timeout=3000)
-        return token
+        return get_token('mpesa', _fetch_access_token, credentials=settings.MPESA_CONSUMER_KEY,
+                         force_refresh=force_refresh)
     except Exception as e:
+        logger.error(f"Failed to fetch M-Pesa access token: {str(e)}")
         return None
 
 def generate_password():
@@ -70,7 +71,13 @@ def initiate_stk_push(phone, amount, account_ref, description):
         logger.info(f"Initiating STK push for phone: {phone}, amount: {amount}, ref: {account_ref}")
         
         # Add timeout to prevent hanging
-        response = requests.post(url, json=payload, headers=headers, timeout=15)
+        response = get_client('mpesa').post(url, json=payload, headers=headers, timeout=15)
+        if response.status_code == 401:
+            # Token revoked or expired early: renew it and retry once
+            access_token = get_access_token(force_refresh=True)
+            if access_token:
+                headers["Authorization"] = f"Bearer {access_token}"
+                response = get_client('mpesa').post(url, json=payload, headers=headers, timeout=15)
         response_data = response.json()
         
         # Log the complete response for debugging
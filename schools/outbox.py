@@ -0,0 +1,81 @@
+"""
+Claim, backoff and worker loop shared by the database-backed delivery
+queues: the SMS outbox (schools.sms_queue) and the receipt outbox
+(schools.receipt_outbox).
+
+An outbox model has status (PENDING, SENDING, then SENT or FAILED),
+attempts, next_attempt_at, locked_at and locked_by fields. Workers claim
+due rows in batches with a conditional UPDATE, so several workers, or a
+worker and a cron run, never send the same row twice, and hand them to the
+queue's deliver(rows) callable, which sends them and writes each outcome
+back. A row left in SENDING by a worker that died is picked up again once
+its lock is LOCK_TIMEOUT old. deliver() retries failures with backoff()
+up to MAX_ATTEMPTS.
+"""
+import time
+import uuid
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 60  # seconds; doubled on every further attempt
+BACKOFF_MAX = 60 * 60
+LOCK_TIMEOUT = 10 * 60  # seconds a claimed row may stay in SENDING
+IDLE_SLEEP = 5
+
+
+def backoff(attempts):
+    """Delay before the next try of a row that has failed `attempts` times"""
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** max(attempts - 1, 0), BACKOFF_MAX))
+
+
+def _claimable(now):
+    return (
+        Q(status='PENDING', next_attempt_at__lte=now)
+        | Q(status='SENDING', locked_at__lt=now - timedelta(seconds=LOCK_TIMEOUT))
+    )
+
+
+def claim_batch(model, worker_id, batch_size):
+    """Lock up to `batch_size` due rows of the outbox `model` for this worker and return them"""
+    now = timezone.now()
+    ids = list(
+        model.objects.filter(_claimable(now))
+        .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    # Re-checking the condition in the UPDATE makes the claim atomic
+    model.objects.filter(_claimable(now), pk__in=ids).update(
+        status='SENDING', locked_at=now, locked_by=worker_id, attempts=F('attempts') + 1,
+    )
+    return list(model.objects.filter(pk__in=ids, status='SENDING', locked_by=worker_id, locked_at=now))
+
+
+def run_once(model, deliver, batch_size, worker_id=None):
+    """Claim one batch and pass it to deliver(rows). Returns the number of rows claimed."""
+    rows = claim_batch(model, worker_id or uuid.uuid4().hex, batch_size)
+    if rows:
+        deliver(rows)
+    return len(rows)
+
+
+def process_queue(model, deliver, batch_size, once=False, idle_sleep=IDLE_SLEEP, progress=None):
+    """
+    Worker loop. With once=True it drains everything that is currently due
+    and returns; otherwise it keeps polling, sleeping `idle_sleep` seconds
+    whenever the queue is empty. Returns the number of rows processed.
+    """
+    worker_id = uuid.uuid4().hex
+    processed = 0
+    while True:
+        claimed = run_once(model, deliver, batch_size, worker_id)
+        processed += claimed
+        if claimed and progress:
+            progress(processed)
+        if not claimed:
+            if once:
+                return processed
+            time.sleep(idle_sleep)
@@ -2,6 +2,7 @@ import requests
 import json
 import logging
 from django.conf import settings
+from .utils.integrations import get_client
 
 logger = logging.getLogger(__name__)
 
@@ -58,7 +59,7 @@ def initiate_paystack_stk(phone, amount, email, reference, school_name):
     }
     
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=15)
+        response = get_client('paystack').post(url, json=payload, headers=headers, timeout=15)
         response_data = response.json()
         print(f"DEBUG: Paystack response for {clean_phone}: {response_data}")
         
@@ -91,7 +92,7 @@ def verify_paystack_payment(reference):
     }
     
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = get_client('paystack').get(url, headers=headers, timeout=10)
         data = response.json()
         
         if data.get('status') and data.get('data', {}).get('status') == 'success':
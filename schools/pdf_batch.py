@@ -0,0 +1,99 @@
+"""
+Shared plumbing for batches of PDFs rendered from plain dicts: the term
+fee statements (schools.term_statements) and the payslips
+(finance.payslips).
+
+render_batch() maps a render function over the items on a
+ProcessPoolExecutor and yields the results in item order. An optional
+cache hook serves unchanged documents without rendering them.
+atomic_output() and write_zip() write the result under a temporary name
+and move it into place once complete.
+
+Forking a pool is only safe in a worker or command process. Web views
+must pass workers=1, or queue the batch as a job.
+"""
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+CHUNK_SIZE = 8  # items handed to a worker process at a time
+
+
+def render_batch(render, items, workers=DEFAULT_WORKERS, lookup=None, store=None, stats=None):
+    """
+    Yield render(item), a (filename, PDF bytes) pair, for every item in
+    order. `render` must be a picklable module-level function that does
+    not touch the database.
+
+    With a cache, lookup(item) returns the cached (filename, bytes) or
+    None. Only the misses are rendered, and each one is passed to
+    store(item, content). `stats`, if given, gets the 'cached' and
+    'rendered' counts.
+    """
+    cached = [lookup(item) if lookup else None for item in items]
+    misses = [item for item, hit in zip(items, cached) if hit is None]
+    if stats is not None:
+        stats.update(cached=len(items) - len(misses), rendered=len(misses))
+
+    pool = None
+    if workers <= 1 or len(misses) < CHUNK_SIZE * 2:
+        rendered = map(render, misses)
+    else:
+        from django.db import connections
+        # Forked workers must not inherit (and later close) this process's DB connections
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers)
+        rendered = pool.map(render, misses, chunksize=CHUNK_SIZE)
+    try:
+        for item, hit in zip(items, cached):
+            if hit is not None:
+                yield hit
+                continue
+            filename, content = next(rendered)
+            if store:
+                store(item, content)
+            yield filename, content
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+@contextmanager
+def atomic_output(path):
+    """Yield a temporary path next to `path`, moved onto it if the block succeeds"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_zip(documents, output, progress=None, progress_every=25):
+    """
+    Write (filename, bytes) pairs into a ZIP at `output`: a path, written
+    atomically, or a binary file object. Returns the number written.
+    """
+    if not isinstance(output, (str, os.PathLike)):
+        return _write_archive(documents, output, progress, progress_every)
+    with atomic_output(output) as tmp_path:
+        return _write_archive(documents, tmp_path, progress, progress_every)
+
+
+def _write_archive(documents, target, progress, progress_every):
+    written = 0
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in documents:
+            archive.writestr(filename, content)
+            written += 1
+            if progress and written % progress_every == 0:
+                progress(written)
+    return written
@@ -0,0 +1,278 @@
+"""
+Content-addressed disk cache for receipt PDFs.
+
+A receipt is stored under RECEIPT_CACHE_DIR as <kind>/<pk>-<digest>.pdf,
+where the digest hashes everything the PDF prints: the record's own fields,
+the related rows shown on it (student, grade, route, ...), the QR payload,
+the school header and the logo file's version. Downloading a receipt whose
+data has not changed is therefore a file read; editing the payment, the
+student or the school details changes the digest, so a stale PDF is never
+served. Writing a new version removes the older files of the same record.
+
+The fee receipt also prints the day it was generated, so its digest
+includes today's date and the cached copy is re-rendered once a day.
+
+With settings.RECEIPT_PRERENDER on, a completed payment's receipt is
+rendered as soon as the payment is committed, so even the first download
+is a file read.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import date
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+
+logger = logging.getLogger(__name__)
+
+# Bump when a receipt layout changes so every cached PDF is re-rendered
+RENDER_VERSION = 1
+
+PAYMENT = 'payment'
+TRANSPORT_FEE = 'transport_fee'
+FOOD_FEE = 'food_fee'
+MEAL_PAYMENT = 'meal_payment'
+
+
+def cache_dir():
+    return getattr(settings, 'RECEIPT_CACHE_DIR', None) or os.path.join(settings.BASE_DIR, 'receipt_cache')
+
+
+def receipt_path(kind, pk, digest):
+    return os.path.join(cache_dir(), kind, f'{pk}-{digest}.pdf')
+
+
+def _row_state(instance):
+    """Every concrete field value of a model instance"""
+    if instance is None:
+        return None
+    return [getattr(instance, field.attname) for field in instance._meta.concrete_fields]
+
+
+def _related(instance, path):
+    for name in path.split('.'):
+        try:
+            instance = getattr(instance, name)
+        except (ObjectDoesNotExist, AttributeError):
+            return None
+        if instance is None:
+            return None
+    return instance
+
+
+def _file_state(path):
+    try:
+        return [path, os.path.getmtime(path)]
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def fingerprint(kind, instance, related=(), qr_data=None, extra=None):
+    """Digest of the data a receipt for `instance` prints"""
+    state = {
+        'version': RENDER_VERSION,
+        'kind': kind,
+        'row': _row_state(instance),
+        'related': {path: _row_state(_related(instance, path)) for path in related},
+        'qr': qr_data,
+        'extra': extra,
+    }
+    payload = json.dumps(state, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:24]
+
+
+def _write(path, content):
+    """Write atomically so a concurrent reader never sees half a PDF"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def purge(kind, pk, keep=None):
+    """Remove the cached versions of one record's receipt (except `keep`)"""
+    for path in glob.glob(os.path.join(cache_dir(), kind, f'{pk}-*.pdf')):
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def cached(kind, pk, digest):
+    """The cached PDF bytes for (kind, pk, digest), or None"""
+    try:
+        with open(receipt_path(kind, pk, digest), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def store(kind, pk, digest, content):
+    """Cache a rendered PDF as the current version of the record's document"""
+    if not content:
+        return
+    path = receipt_path(kind, pk, digest)
+    try:
+        _write(path, content)
+        purge(kind, pk, keep=path)
+    except OSError as e:
+        # A read-only or full disk only costs the cache, never the receipt
+        logger.warning(f"Could not cache {kind} receipt {pk}: {e}")
+
+
+def get_or_render(kind, pk, digest, render):
+    """The cached PDF bytes for (kind, pk, digest), calling render() on a miss"""
+    content = cached(kind, pk, digest)
+    if content is not None:
+        return content
+
+    content = render()
+    store(kind, pk, digest, content)
+    return content
+
+
+# Receipts
+
+def payment_qr_data(payment):
+    """Verification payload of the fee receipt QR code"""
+    return {
+        'payment_id': payment.id,
+        'amount': str(payment.amount),
+        'date': payment.date.strftime('%Y-%m-%d'),
+        'reference': payment.reference_number,
+    }
+
+
+def _school_header_state():
+    """The school details and logo generate_payment_receipt prints"""
+    from config.models import SchoolConfig
+
+    sc = SchoolConfig.get_config()
+    if sc is None:
+        return None
+    logo = None
+    if sc.school_logo:
+        try:
+            logo = _file_state(sc.school_logo.path)
+        except Exception:
+            logo = None
+    return [sc.pk, sc.school_name, sc.school_address, sc.school_phone, sc.school_email, logo]
+
+
+def payment_receipt_pdf(payment):
+    """Fee receipt PDF for a Payment, served from the cache when unchanged"""
+    from .utils import generate_payment_receipt, generate_receipt_qr
+
+    qr_data = payment_qr_data(payment)
+    digest = fingerprint(
+        PAYMENT, payment, ('student', 'student.grade'), qr_data,
+        extra=[_school_header_state(), date.today().isoformat()],
+    )
+    return get_or_render(
+        PAYMENT, payment.pk, digest,
+        lambda: generate_payment_receipt(payment, generate_receipt_qr(qr_data)),
+    )
+
+
+def _static_logo_state():
+    from .utils import receipt_logo_path
+
+    return _file_state(receipt_logo_path())
+
+
+def transport_fee_receipt_pdf(fee):
+    """Transport fee receipt PDF, served from the cache when unchanged"""
+    from .utils import generate_receipt_qr, generate_transport_payment_receipt
+
+    qr_data = {
+        'type': 'transport_fee',
+        'receipt_no': fee.reference_number,
+        'student_id': fee.student.id,
+        'amount': str(fee.amount),
+        'date': fee.date.isoformat()
+    }
+    digest = fingerprint(
+        TRANSPORT_FEE, fee, ('student', 'student.grade', 'route', 'route.vehicle'), qr_data,
+        extra=_static_logo_state(),
+    )
+    return get_or_render(
+        TRANSPORT_FEE, fee.pk, digest,
+        lambda: generate_transport_payment_receipt(fee, generate_receipt_qr(qr_data)),
+    )
+
+
+def food_fee_receipt_pdf(fee):
+    """Food fee receipt PDF, served from the cache when unchanged"""
+    from .utils import generate_food_fee_receipt, generate_receipt_qr
+
+    qr_data = {
+        'type': 'food_fee',
+        'receipt_no': fee.reference_number,
+        'student_id': fee.student.id,
+        'amount': str(fee.amount),
+        'date': fee.date.isoformat()
+    }
+    digest = fingerprint(
+        FOOD_FEE, fee, ('student', 'student.grade', 'food_plan'), qr_data,
+        extra=_static_logo_state(),
+    )
+    return get_or_render(
+        FOOD_FEE, fee.pk, digest,
+        lambda: generate_food_fee_receipt(fee, generate_receipt_qr(qr_data)),
+    )
+
+
+def meal_payment_receipt_pdf(payment):
+    """Meal payment receipt PDF (covering its whole payment group), served from the cache when unchanged"""
+    from .models import StudentMealPayment
+    from .utils import generate_meal_payment_receipt, generate_receipt_qr
+
+    qr_data = {
+        'type': 'meal_payment',
+        'receipt_no': payment.reference_number,
+        'student_id': payment.student.id,
+        'amount': str(payment.amount),
+        'date': payment.payment_date.isoformat()
+    }
+    group = None
+    if payment.payment_group:
+        group = list(StudentMealPayment.objects.filter(
+            payment_group=payment.payment_group
+        ).order_by('meal_type').values_list('pk', 'meal_type', 'amount'))
+    digest = fingerprint(
+        MEAL_PAYMENT, payment, ('student', 'student.grade'), qr_data,
+        extra=[group, _static_logo_state()],
+    )
+    return get_or_render(
+        MEAL_PAYMENT, payment.pk, digest,
+        lambda: generate_meal_payment_receipt(payment, generate_receipt_qr(qr_data)),
+    )
+
+
+RENDERERS = {
+    PAYMENT: payment_receipt_pdf,
+    TRANSPORT_FEE: transport_fee_receipt_pdf,
+    FOOD_FEE: food_fee_receipt_pdf,
+    MEAL_PAYMENT: meal_payment_receipt_pdf,
+}
+
+
+def prerender(kind, instance):
+    """Render a receipt into the cache, logging instead of raising"""
+    try:
+        RENDERERS[kind](instance)
+    except Exception as e:
+        logger.warning(f"Pre-rendering {kind} receipt {instance.pk} failed: {e}")
@@ -0,0 +1,157 @@
+"""
+Database-backed delivery queue for payment receipts.
+
+Recording a payment only writes one ReceiptDelivery row per channel the
+parent can be reached on (email, WhatsApp) and returns; the PDF, the email
+template, SMTP and the WhatsApp calls all happen in the
+`process_receipt_outbox` worker. It claims due rows in batches through
+schools.outbox, like the SMS queue, and deliver() sends each row through the
+existing send_*_receipt helper limited to the row's channel, so the
+messages themselves are unchanged. The PDF comes from the receipt cache
+and WhatsApp reuses the media ID of an identical document, so a retry or
+a second channel does not render or upload the receipt again.
+
+Failures are retried with exponential backoff up to MAX_ATTEMPTS; a
+record deleted in the meantime, or a parent without the contact any more,
+fails straight away.
+"""
+import logging
+
+from django.utils import timezone
+
+from .outbox import MAX_ATTEMPTS, backoff
+from .receipt_cache import FOOD_FEE, MEAL_PAYMENT, PAYMENT, TRANSPORT_FEE
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 20
+
+
+def receipt_models():
+    """{kind: model} of the records a receipt is sent for"""
+    from .models import FoodFee, Payment, StudentMealPayment, TransportFee
+
+    return {
+        PAYMENT: Payment,
+        TRANSPORT_FEE: TransportFee,
+        FOOD_FEE: FoodFee,
+        MEAL_PAYMENT: StudentMealPayment,
+    }
+
+
+def _senders():
+    from .utils import send_food_fee_receipt, send_meal_payment_receipt, send_payment_receipt, send_transport_fee_receipt
+
+    return {
+        PAYMENT: send_payment_receipt,
+        TRANSPORT_FEE: send_transport_fee_receipt,
+        FOOD_FEE: send_food_fee_receipt,
+        MEAL_PAYMENT: send_meal_payment_receipt,
+    }
+
+
+def _contacts(student):
+    """{channel: recipient} the parent can be reached on"""
+    contacts = {}
+    if student.parent_email:
+        contacts['email'] = student.parent_email
+    if student.parent_phone:
+        contacts['whatsapp'] = student.parent_phone
+    return contacts
+
+
+def enqueue(kind, instance):
+    """
+    Queue the receipt of a payment record for delivery on every channel the
+    parent has. A channel that already has a delivery waiting is not queued
+    twice: the worker sends the record as it is at delivery time. Returns
+    the number of rows queued.
+    """
+    from .models import ReceiptDelivery
+
+    contacts = _contacts(instance.student)
+    waiting = set(ReceiptDelivery.objects.filter(
+        kind=kind, object_id=instance.pk, status__in=('PENDING', 'SENDING'),
+    ).values_list('channel', flat=True))
+    rows = [
+        ReceiptDelivery(
+            school_id=instance.school_id, kind=kind, object_id=instance.pk,
+            channel=channel, recipient=str(recipient)[:254],
+        )
+        for channel, recipient in contacts.items() if channel not in waiting
+    ]
+    ReceiptDelivery.objects.bulk_create(rows)
+    return len(rows)
+
+
+def _error_text(result):
+    if isinstance(result, dict):
+        errors = [result.get(f'{channel}_error') for channel in ('email', 'whatsapp')]
+        return "; ".join(error for error in errors if error) or "Failed to send receipt"
+    return str(result or "Failed to send receipt")
+
+
+def deliver(rows):
+    """Send claimed rows and record each outcome. Returns the number sent."""
+    from .models import ReceiptDelivery
+
+    if not rows:
+        return 0
+    models, senders = receipt_models(), _senders()
+    records = {}
+    for kind in {row.kind for row in rows}:
+        ids = {row.object_id for row in rows if row.kind == kind}
+        records[kind] = models[kind].objects.select_related('student', 'student__grade').in_bulk(ids)
+
+    sent = 0
+    now = timezone.now()
+    for row in rows:
+        row.locked_at = None
+        row.locked_by = ''
+        record = records[row.kind].get(row.object_id)
+        if record is None:
+            row.status = 'FAILED'
+            row.error = 'The payment no longer exists'
+            continue
+        if row.channel not in _contacts(record.student):
+            row.status = 'FAILED'
+            row.error = f'The parent has no {row.get_channel_display()} contact any more'
+            continue
+
+        try:
+            success, result = senders[row.kind](record, channels=(row.channel,))
+        except Exception as e:
+            success, result = False, str(e)
+
+        if success:
+            row.status = 'SENT'
+            row.sent_at = timezone.now()
+            row.error = ''
+            sent += 1
+        elif row.attempts < MAX_ATTEMPTS:
+            row.status = 'PENDING'
+            row.next_attempt_at = now + backoff(row.attempts)
+            row.error = _error_text(result)
+        else:
+            row.status = 'FAILED'
+            row.error = _error_text(result)
+            logger.error(f"Giving up on {row.kind} receipt {row.object_id} via {row.channel}: {row.error}")
+    ReceiptDelivery.objects.bulk_update(rows, ['status', 'sent_at', 'error', 'next_attempt_at', 'locked_at', 'locked_by'])
+    return sent
+
+
+def delivery_status(kind, object_id):
+    """Latest delivery of a record's receipt on each channel"""
+    from .models import ReceiptDelivery
+
+    status = {}
+    for row in ReceiptDelivery.objects.filter(kind=kind, object_id=object_id).order_by('id'):
+        status[row.channel] = {
+            'status': row.status,
+            'recipient': row.recipient,
+            'attempts': row.attempts,
+            'error': row.error or None,
+            'next_attempt_at': row.next_attempt_at.isoformat() if row.status == 'PENDING' else None,
+            'sent_at': row.sent_at.isoformat() if row.sent_at else None,
+        }
+    return status
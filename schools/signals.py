@@ -1,7 +1,16 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
-from .models import Grade, Student, Teacher, NonTeachingStaff
+from .models import (
+    Grade, Student, Teacher, NonTeachingStaff, Payment, Attendance, Assessment, AssessmentResult,
+    TransportFee, FoodFee, StudentMealPayment,
+)
 from .user_utils import create_staff_user
+from . import fee_ledger, receipt_cache
+from .attendance_rollup import apply_attendance_deltas, attendance_delta
+from .dashboard import invalidate_dashboard
+from .academic_analytics import invalidate_academic_analytics
 
 @receiver(post_save, sender=Grade)
 def update_student_fees(sender, instance, **kwargs):
@@ -15,6 +24,107 @@ def update_student_fees(sender, instance, **kwargs):
         term2_fees=instance.term2_fees,
         term3_fees=instance.term3_fees
     )
+    fee_ledger.sync_ledger_fees(students)
+
+@receiver(post_save, sender=Student)
+def sync_student_fee_ledger(sender, instance, **kwargs):
+    """Keep the fee ledger's billed amounts in step with the student's term fees"""
+    if kwargs.get('raw'):
+        return
+    fee_ledger.sync_student_fees(instance)
+
+@receiver(pre_save, sender=Payment)
+def remember_previous_payment(sender, instance, **kwargs):
+    """Capture the stored amount/term so an edit can be applied to the ledger as a delta"""
+    instance._ledger_previous = None
+    if instance.pk and not kwargs.get('raw'):
+        instance._ledger_previous = Payment.objects.filter(pk=instance.pk).values(
+            'student_id', 'term', 'amount'
+        ).first()
+
+@receiver(post_save, sender=Payment)
+def apply_payment_to_fee_ledger(sender, instance, created, **kwargs):
+    if kwargs.get('raw'):
+        return
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous:
+        fee_ledger.apply_payment(previous['student_id'], previous['term'], -previous['amount'], count=-1,
+                                  rebuild_missing=False)
+    fee_ledger.apply_payment(instance.student_id, instance.term, instance.amount)
+    instance._ledger_previous = None
+
+@receiver(post_delete, sender=Payment)
+def reverse_payment_in_fee_ledger(sender, instance, **kwargs):
+    fee_ledger.apply_payment(instance.student_id, instance.term, -instance.amount, count=-1,
+                              rebuild_missing=False)
+
+def _attendance_scope(student_id):
+    """(school_id, grade_id) the rollups file a student's attendance under"""
+    return Student.objects.filter(pk=student_id).values_list('school_id', 'grade_id').first() or (None, None)
+
+@receiver(pre_save, sender=Attendance)
+def remember_previous_attendance(sender, instance, **kwargs):
+    """Capture the stored row so an edit can be applied to the rollups as a delta"""
+    instance._rollup_previous = None
+    if instance.pk and not kwargs.get('raw'):
+        instance._rollup_previous = Attendance.objects.filter(pk=instance.pk).values(
+            'student_id', 'term', 'date', 'status'
+        ).first()
+
+@receiver(post_save, sender=Attendance)
+def apply_attendance_to_rollups(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    deltas = []
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        school_id, grade_id = _attendance_scope(previous['student_id'])
+        deltas.append(attendance_delta(school_id, grade_id, previous['student_id'], previous['term'],
+                                       previous['date'], previous['status'], -1))
+    school_id, grade_id = _attendance_scope(instance.student_id)
+    deltas.append(attendance_delta(school_id, grade_id, instance.student_id, instance.term,
+                                   instance.date, instance.status, 1))
+    apply_attendance_deltas(deltas)
+    instance._rollup_previous = None
+    invalidate_dashboard(school_id)
+
+@receiver(post_delete, sender=Attendance)
+def reverse_attendance_in_rollups(sender, instance, **kwargs):
+    school_id, grade_id = _attendance_scope(instance.student_id)
+    apply_attendance_deltas([attendance_delta(school_id, grade_id, instance.student_id, instance.term,
+                                              instance.date, instance.status, -1)], rebuild_missing=False)
+    invalidate_dashboard(school_id)
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def invalidate_dashboard_on_payment(sender, instance, **kwargs):
+    student_school_id = Student.objects.filter(pk=instance.student_id).values_list('school_id', flat=True).first()
+    invalidate_dashboard(instance.school_id, student_school_id)
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def invalidate_dashboard_on_change(sender, instance, **kwargs):
+    invalidate_dashboard(instance.school_id)
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_analytics_on_student_change(sender, instance, **kwargs):
+    invalidate_academic_analytics(instance.school_id, instance.grade_id)
+
+@receiver(post_save, sender=Assessment)
+@receiver(post_delete, sender=Assessment)
+def invalidate_analytics_on_assessment_change(sender, instance, **kwargs):
+    grade_id = Student.objects.filter(pk=instance.student_id).values_list('grade_id', flat=True).first()
+    invalidate_academic_analytics(instance.school_id, grade_id)
+
+@receiver(post_save, sender=AssessmentResult)
+@receiver(post_delete, sender=AssessmentResult)
+def invalidate_analytics_on_result_change(sender, instance, **kwargs):
+    scope = Assessment.objects.filter(pk=instance.assessment_id).values_list('school_id', 'student__grade_id').first()
+    if scope:
+        invalidate_academic_analytics(*scope)
 
 @receiver(post_save, sender=Teacher)
 def auto_create_teacher_user(sender, instance, created, **kwargs):
@@ -26,4 +136,31 @@ def auto_create_teacher_user(sender, instance, created, **kwargs):
 def auto_create_staff_user(sender, instance, created, **kwargs):
     """Automatically create a user account for a new non-teaching staff member"""
     if created or not instance.user:
-        create_staff_user(instance, instance.school)
\ No newline at end of file
+        create_staff_user(instance, instance.school)
+
+RECEIPT_KINDS = {
+    Payment: receipt_cache.PAYMENT,
+    TransportFee: receipt_cache.TRANSPORT_FEE,
+    FoodFee: receipt_cache.FOOD_FEE,
+    StudentMealPayment: receipt_cache.MEAL_PAYMENT,
+}
+
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=TransportFee)
+@receiver(post_save, sender=FoodFee)
+@receiver(post_save, sender=StudentMealPayment)
+def prerender_receipt(sender, instance, **kwargs):
+    """Render a completed payment's receipt into the cache once the payment is committed"""
+    if kwargs.get('raw') or not getattr(settings, 'RECEIPT_PRERENDER', False):
+        return
+    if instance.status != 'COMPLETED':
+        return
+    kind = RECEIPT_KINDS[sender]
+    transaction.on_commit(lambda: receipt_cache.prerender(kind, instance))
+
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=TransportFee)
+@receiver(post_delete, sender=FoodFee)
+@receiver(post_delete, sender=StudentMealPayment)
+def purge_cached_receipt(sender, instance, **kwargs):
+    receipt_cache.purge(RECEIPT_KINDS[sender], instance.pk)
@@ -0,0 +1,122 @@
+"""
+Set-based personalization for SMSMessage campaigns.
+
+Campaign texts may use {student_name}, {parent_name}, {balance},
+{results}, {term}, {exam_type} and {school_name} for parents, and
+{staff_name} and {position} for staff. Instead of one balance and one
+results query per recipient, the balances come from the fee ledger in
+the same query that lists the students, and all results strings are
+built from one query over the campaign's assessments. The placeholders
+that are the same for every recipient are filled in once per campaign.
+
+The `benchmark_sms_personalization` management command times a fees
+reminder to a generated school.
+"""
+from collections import defaultdict
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def annotate_sms_balance(students):
+    """
+    Add `sms_balance`: every term's fees less everything paid, the figure
+    fee reminders have always quoted, with the payments summed from the
+    fee ledger instead of joining every payment row.
+    """
+    from .models import StudentFeeLedger
+
+    paid = (
+        StudentFeeLedger.objects.filter(student=OuterRef('pk'))
+        .order_by().values('student').annotate(total=Sum('paid')).values('total')
+    )
+    return students.annotate(
+        sms_paid=Coalesce(Subquery(paid, output_field=MONEY), Value(0), output_field=MONEY),
+    ).annotate(
+        sms_balance=F('term1_fees') + F('term2_fees') + F('term3_fees') - F('sms_paid'),
+    )
+
+
+def campaign_assessment(sms):
+    """(term, assessment_type) whose results the campaign reports"""
+    return sms.assessment_term or 1, sms.assessment_type or 'mid-term'
+
+
+def results_by_student(students, term, assessment_type):
+    """{student_id: 'ENG: 70, MAT: 81. Total: 151'} for a Student queryset, in one query"""
+    from .models import AssessmentResult
+
+    rows = AssessmentResult.objects.filter(
+        assessment__student__in=students.values('pk'),
+        assessment__term=term,
+        assessment__assessment_type=assessment_type,
+    ).order_by('assessment__student_id', 'pk').values_list(
+        'assessment__student_id', 'subject__code', 'subject__name', 'marks'
+    )
+    parts = defaultdict(list)
+    totals = defaultdict(int)
+    for student_id, code, name, marks in rows:
+        parts[student_id].append(f"{code or name}: {int(marks or 0)}")
+        totals[student_id] += (marks or 0)
+    return {student_id: ", ".join(labels) + f". Total: {int(totals[student_id])}" for student_id, labels in parts.items()}
+
+
+def _campaign_template(sms):
+    """The campaign text with the placeholders shared by every recipient filled in"""
+    from .models import Assessment
+
+    term, assessment_type = campaign_assessment(sms)
+    message = sms.message
+    message = message.replace("{term}", f"Term {sms.assessment_term or '1'}")
+    exam_name = dict(Assessment.ASSESSMENT_TYPES).get(sms.assessment_type, sms.assessment_type or 'Assessment')
+    message = message.replace("{exam_type}", str(exam_name))
+    if sms.school:
+        message = message.replace("{school_name}", sms.school.school_name)
+    return message
+
+
+def render_student_messages(sms, students):
+    """
+    Render the campaign for a Student queryset. Returns a list of
+    (phone, message) using the parent's phone, or the guardian's when the
+    parent has none; students with neither are left out.
+    """
+    template = _campaign_template(sms)
+    needs_balance = "{balance}" in template or sms.recipient_type == 'FEES_REMINDER'
+    needs_results = "{results}" in template or sms.recipient_type == 'ASSESSMENT_RESULTS'
+
+    results = results_by_student(students, *campaign_assessment(sms)) if needs_results else {}
+    fields = ['pk', 'first_name', 'last_name', 'parent_phone', 'guardian_phone']
+    if needs_balance:
+        if 'sms_balance' not in students.query.annotations:
+            students = annotate_sms_balance(students)
+        fields.append('sms_balance')
+
+    targets = []
+    for row in students.values_list(*fields).iterator(chunk_size=1000):
+        student_id, first_name, last_name, parent_phone, guardian_phone = row[:5]
+        phone = parent_phone or guardian_phone
+        if not phone:
+            continue
+        balance = row[5] if needs_balance else 0
+        msg = template.replace("{student_name}", f"{first_name} {last_name}")
+        msg = msg.replace("{parent_name}", f"{first_name}'s Parent")
+        msg = msg.replace("{balance}", f"{balance or 0:,.2f}")
+        msg = msg.replace("{results}", results.get(student_id, "No results found."))
+        targets.append((phone, msg))
+    return targets
+
+
+def render_employee_messages(sms, employees):
+    """Render the campaign for staff (Employee or Teacher rows); returns (phone, message) pairs"""
+    template = _campaign_template(sms)
+    targets = []
+    for employee in employees:
+        if not employee.phone:
+            continue
+        msg = template.replace("{staff_name}", employee.get_full_name())
+        msg = msg.replace("{position}", getattr(employee, 'position', '') or "")
+        targets.append((employee.phone, msg))
+    return targets
@@ -0,0 +1,178 @@
+"""
+Database-backed delivery queue for SMSMessage campaigns.
+
+Queuing a campaign expands its recipients into SMSOutbox rows in one
+transaction and returns straight away; nothing is sent inside the request.
+The `process_sms_queue` management command is the worker: it claims due
+outbox rows in batches through schools.outbox, and deliver() sends them
+and writes the outcome back with one bulk_update per batch.
+
+Provider and network failures are retried with exponential backoff up to
+MAX_ATTEMPTS; rejected numbers fail straight away. A campaign is marked SENT or FAILED when none of its rows is still
+pending, and campaign_status() backs the status API the frontend polls.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from .outbox import MAX_ATTEMPTS, backoff
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+
+
+def enqueue(sms):
+    """
+    Expand the campaign into its outbox and mark it QUEUED (FAILED when it
+    has no reachable recipient). Returns the number of queued messages.
+    """
+    from .models import SMSOutbox
+    from .utils.sms import format_phone_number
+
+    rows, seen = [], set()
+    for phone, message in sms.collect_targets():
+        if not phone:
+            continue
+        try:
+            number = format_phone_number(phone)
+        except Exception as e:
+            logger.warning(f"Failed to format phone number {phone}: {str(e)}")
+            continue
+        # Siblings share a parent number: send identical texts only once
+        if (number, message) in seen:
+            continue
+        seen.add((number, message))
+        rows.append(SMSOutbox(school_id=sms.school_id, sms=sms, phone=number, message=message))
+
+    with transaction.atomic():
+        SMSOutbox.objects.bulk_create(rows, batch_size=500)
+        sms.recipients_count = len(rows)
+        if rows:
+            sms.status = 'QUEUED'
+            sms.response_data = None
+        else:
+            sms.status = 'FAILED'
+            sms.response_data = {'error': 'No valid recipients found'}
+        sms.save(update_fields=['recipients_count', 'status', 'response_data'])
+    return len(rows)
+
+
+def _release(rows, error):
+    """Put claimed rows back without spending an attempt (SMS disabled or not configured)"""
+    from .models import SMSOutbox
+
+    retry_at = timezone.now() + backoff(1)
+    for row in rows:
+        row.status = 'PENDING'
+        row.attempts = max(row.attempts - 1, 0)
+        row.next_attempt_at = retry_at
+        row.locked_at = None
+        row.locked_by = ''
+        row.error = error
+    SMSOutbox.objects.bulk_update(rows, ['status', 'attempts', 'next_attempt_at', 'locked_at', 'locked_by', 'error'])
+
+
+def deliver(rows):
+    """Send claimed rows and record each outcome. Returns the number sent."""
+    from config.models import SystemSettings
+    from .models import SMSMessage, SMSOutbox
+    from .utils.integrations import fan_out
+    from .utils.sms import initialize_termii, send_termii_message
+
+    if not rows:
+        return 0
+    if not SystemSettings.load().sms_active:
+        _release(rows, "SMS service is currently disabled in global settings.")
+        return 0
+    api_key, sender_id, init_error = initialize_termii()
+    if not api_key:
+        _release(rows, init_error or "Termii service not properly initialized")
+        return 0
+
+    SMSMessage.objects.filter(pk__in={row.sms_id for row in rows}, status='QUEUED').update(status='SENDING')
+
+    # Parallel, bounded by the Termii client's concurrency and rate limits
+    results = fan_out('termii', lambda row: send_termii_message(row.phone, row.message, api_key, sender_id), rows)
+
+    sent = 0
+    now = timezone.now()
+    for row, result in zip(rows, results):
+        row.locked_at = None
+        row.locked_by = ''
+        if result['status'] == 'Success':
+            row.status = 'SENT'
+            row.sent_at = now
+            row.provider_message_id = str(result.get('message_id') or '')[:100]
+            row.error = ''
+            sent += 1
+        elif result.get('retryable') and row.attempts < MAX_ATTEMPTS:
+            row.status = 'PENDING'
+            row.next_attempt_at = now + backoff(row.attempts)
+            row.error = result.get('error', 'Unknown error')
+        else:
+            row.status = 'FAILED'
+            row.error = result.get('error', 'Unknown error')
+    SMSOutbox.objects.bulk_update(
+        rows, ['status', 'sent_at', 'provider_message_id', 'error', 'next_attempt_at', 'locked_at', 'locked_by']
+    )
+    finalize_campaigns({row.sms_id for row in rows})
+    return sent
+
+
+def finalize_campaigns(sms_ids):
+    """Mark campaigns with no outstanding outbox rows as SENT (anything delivered) or FAILED"""
+    from .models import SMSMessage, SMSOutbox
+
+    outstanding = set(
+        SMSOutbox.objects.filter(sms_id__in=sms_ids, status__in=('PENDING', 'SENDING'))
+        .values_list('sms_id', flat=True).distinct()
+    )
+    finished = [sms_id for sms_id in sms_ids if sms_id not in outstanding]
+    if not finished:
+        return
+    totals = {
+        row['sms_id']: row
+        for row in SMSOutbox.objects.filter(sms_id__in=finished).order_by().values('sms_id').annotate(
+            total=Count('id'), sent=Count('id', filter=Q(status='SENT')), last_sent=Max('sent_at'),
+        )
+    }
+    for sms in SMSMessage.objects.filter(pk__in=finished, status__in=('QUEUED', 'SENDING')):
+        row = totals.get(sms.pk, {'total': 0, 'sent': 0, 'last_sent': None})
+        sms.status = 'SENT' if row['sent'] else 'FAILED'
+        sms.sent_at = row['last_sent']
+        sms.response_data = {
+            'summary': f"Sent {row['sent']}/{row['total']} successfully",
+            'sent': row['sent'],
+            'failed': row['total'] - row['sent'],
+            'total': row['total'],
+        }
+        sms.save(update_fields=['status', 'sent_at', 'response_data'])
+
+
+def campaign_status(sms):
+    """Delivery progress of one campaign for the status API"""
+    counts = dict(sms.outbox.order_by().values_list('status').annotate(count=Count('id')))
+    total = sum(counts.values())
+    sent = counts.get('SENT', 0)
+    failed = counts.get('FAILED', 0)
+    next_retry = sms.outbox.filter(status='PENDING', attempts__gt=0).aggregate(at=Min('next_attempt_at'))['at']
+    errors = list(
+        sms.outbox.filter(status='FAILED').order_by('-id').values('phone', 'error', 'attempts')[:5]
+    )
+    return {
+        'id': sms.id,
+        'status': sms.status,
+        'recipients_count': sms.recipients_count,
+        'total': total,
+        'pending': counts.get('PENDING', 0),
+        'sending': counts.get('SENDING', 0),
+        'sent': sent,
+        'failed': failed,
+        'progress': round((sent + failed) * 100 / total, 1) if total else 100,
+        'next_retry_at': next_retry.isoformat() if next_retry else None,
+        'sent_at': sms.sent_at.strftime('%Y-%m-%d %H:%M') if sms.sent_at else None,
+        'recent_errors': errors,
+    }
@@ -0,0 +1,156 @@
+"""
+Streaming student export for export_students.
+
+Rows are read with a chunked values_list() iterator, so only one chunk of
+students is in memory at a time, and the fee balance is computed in the
+same query from the fee ledger. CSV is streamed straight to the client;
+Excel is written with an openpyxl write-only worksheet to a temporary file
+and then streamed from disk.
+"""
+import csv
+import tempfile
+
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+EXPORT_CHUNK_SIZE = 500
+
+HEADERS = ['Admission Number', 'Student Name', 'Grade', 'Gender', 'Parent Contact', 'Term', 'Fee Balance']
+COLUMN_WIDTHS = [18, 32, 14, 10, 18, 10, 14]
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def annotate_fee_balance(students):
+    """
+    Add `fees_paid` and `fee_balance` (the same figure as
+    Student.get_balance()) computed from the fee ledger in the same query.
+    """
+    from .models import StudentFeeLedger
+
+    paid = (
+        StudentFeeLedger.objects.filter(student=OuterRef('pk'))
+        .order_by().values('student').annotate(total=Sum('paid')).values('total')
+    )
+    owed = (
+        F('admission_fee') + F('term1_fees')
+        + Case(When(current_term__gte=2, then=F('term2_fees')), default=Value(0), output_field=MONEY)
+        + Case(When(current_term__gte=3, then=F('term3_fees')), default=Value(0), output_field=MONEY)
+    )
+    return students.annotate(
+        fees_paid=Coalesce(Subquery(paid, output_field=MONEY), Value(0), output_field=MONEY),
+    ).annotate(
+        fee_balance=owed - F('fees_paid'),
+    )
+
+
+def filter_fee_status(students, fee_status):
+    """Filter an annotate_fee_balance() queryset on paid / partial / unpaid"""
+    if fee_status == 'paid':
+        return students.filter(fee_balance__lte=0)
+    if fee_status == 'partial':
+        return students.filter(fee_balance__gt=0, fees_paid__gt=0)
+    if fee_status == 'unpaid':
+        return students.filter(fees_paid=0)
+    return students
+
+
+def export_rows(students, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield one list of cell values per student of an annotate_fee_balance() queryset"""
+    from .models import Student
+
+    genders = dict(Student.GENDER_CHOICES)
+    rows = students.values_list(
+        'admission_number', 'first_name', 'last_name', 'grade__name', 'gender',
+        'parent_phone', 'current_term', 'fee_balance',
+    )
+    for admission_number, first_name, last_name, grade, gender, phone, term, balance in rows.iterator(chunk_size=chunk_size):
+        yield [
+            admission_number,
+            f"{first_name} {last_name}",
+            grade or '',
+            genders.get(gender, gender),
+            phone,
+            f"Term {term}",
+            float(balance or 0),
+        ]
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the csv writer's caller"""
+    def write(self, value):
+        return value
+
+
+def csv_response(students, filename='students_list.csv'):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(HEADERS)
+        for row in export_rows(students):
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+def xlsx_response(students, filter_info=(), filename='students_list.xlsx'):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Students List")
+    for index, width in enumerate(COLUMN_WIDTHS, 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    def titled(value):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal='left')
+        return cell
+
+    # Title, date and filters, then the header at row 5 as before
+    ws.append([titled("STUDENTS LIST")])
+    ws.append([titled(f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M')}")])
+    ws.append([titled("Filters: " + ", ".join(filter_info))] if filter_info else [])
+    ws.append([])
+
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header_font = Font(bold=True)
+    header_fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
+    centered = Alignment(horizontal='center')
+
+    header = []
+    for value in HEADERS:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = centered
+        cell.border = border
+        header.append(cell)
+    ws.append(header)
+
+    for row in export_rows(students):
+        cells = []
+        for value in row:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.alignment = centered
+            cell.border = border
+            cells.append(cell)
+        ws.append(cells)
+
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
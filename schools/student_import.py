@@ -0,0 +1,361 @@
+"""
+Chunked bulk student import for api_students_bulk_import.
+
+The workbook is read in read-only mode and processed in chunks of
+IMPORT_CHUNK_SIZE rows. Existing admission numbers are loaded once per
+import, generated admission numbers are reserved from
+SchoolConfig.admission_counter one block per chunk, and every chunk is
+written in its own transaction with bulk_create for the users, group
+memberships, students, admission fee payments, finance accounts and their
+synced transactions. Those writes bypass the model signals, so the chunk
+also does what the Student/Payment signals would have done (finance
+account, fee ledger, cached dashboard and analytics). A chunk that fails
+is retried in halves, down to single rows, so a bad row only costs itself
+and is reported with its own error.
+
+Progress is published in the cache under import_progress_key(), per
+school, so the client can poll it while the upload request is running.
+"""
+import uuid
+from datetime import date, datetime
+from functools import reduce
+from operator import or_
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from . import account_balances, fee_ledger
+from .academic_analytics import invalidate_academic_analytics
+from .dashboard import invalidate_dashboard
+
+IMPORT_CHUNK_SIZE = 500
+PROGRESS_TIMEOUT = 60 * 60  # seconds
+
+# Expected header names (lowercase)
+COLUMN_DEFINITIONS = {
+    'registration_no': ['registration no.', 'admission number', 'adm no', 'adm', 'reg no', 'admission no', 'stno'],
+    'first_name': ['first name', 'given name', 'fname', 'name', 'full name', 'student name'],
+    'last_name': ['last name', 'surname', 'family name', 'lname'],
+    'gender': ['gender (m/f)', 'gender', 'sex', 'm/f'],
+    'grade': ['grade', 'class', 'form', 'level', 'current class', 'student class'],
+    'date_of_birth': ['date of birth (yyyy-mm-dd)', 'date of birth', 'dob', 'birth date']
+}
+
+
+def import_progress_key(school_id, import_id):
+    return f'student_import_progress_{school_id}_{import_id}'
+
+
+def get_import_progress(school, import_id):
+    return cache.get(import_progress_key(school.pk if school else None, import_id))
+
+
+def map_columns(header_row):
+    """Return ({key: column index}, [lowercased headers]) for the first worksheet row"""
+    headers = {}
+    for idx, value in enumerate(header_row or ()):
+        if value:
+            headers[str(value).strip().lower()] = idx
+    col_map = {}
+    for key, aliases in COLUMN_DEFINITIONS.items():
+        for alias in aliases:
+            if alias in headers:
+                col_map[key] = headers[alias]
+                break
+    return col_map, list(headers)
+
+
+def _parse_row(row, col_map, grades_map):
+    """Return (fields, None) for an importable row, (None, error) for a bad one, (None, None) to skip it"""
+    def get_val(key):
+        idx = col_map.get(key)
+        if idx is not None and idx < len(row):
+            return row[idx]
+        return None
+
+    # Basic Info
+    raw_name = get_val('first_name')
+    if not raw_name:
+        return None, None  # Skip completely empty rows
+
+    name_parts = str(raw_name).strip().split(' ', 1)
+    first_name = name_parts[0]
+    last_name = name_parts[1] if len(name_parts) > 1 else ""
+
+    # If specific last name column exists, it overrides
+    specific_last_name = get_val('last_name')
+    if specific_last_name:
+        last_name = str(specific_last_name).strip()
+
+    registration_no = get_val('registration_no')
+    admission_number = str(registration_no).strip() if registration_no else None
+
+    # Gender
+    gender_raw = str(get_val('gender')).strip().upper() if get_val('gender') else 'M'
+    gender = 'M'
+    if gender_raw.startswith('F'):
+        gender = 'F'
+    elif gender_raw.startswith('O'):
+        gender = 'O'
+
+    # Grade (Optional)
+    grade_obj = None
+    grade_raw = get_val('grade')
+    if grade_raw:
+        grade_obj = grades_map.get(str(grade_raw).strip().lower())
+        if not grade_obj:
+            return None, f"Class '{grade_raw}' not found."
+
+    # Date of Birth
+    dob = date(2015, 1, 1)  # Sensible default
+    dob_val = get_val('date_of_birth')
+    if dob_val:
+        if isinstance(dob_val, datetime):
+            dob = dob_val.date()
+        elif isinstance(dob_val, date):
+            dob = dob_val
+        else:
+            try:
+                dob = datetime.strptime(str(dob_val).strip(), '%Y-%m-%d').date()
+            except ValueError:
+                pass
+
+    return {
+        'admission_number': admission_number,
+        'first_name': first_name[:100],
+        'last_name': last_name[:100],
+        'gender': gender,
+        'grade': grade_obj,
+        'date_of_birth': dob,
+    }, None
+
+
+class _AdmissionNumbers:
+    """Hands out generated admission numbers from blocks reserved on the school's counter"""
+
+    def __init__(self, config, taken):
+        self.config = config
+        self.taken = taken
+        self.block = []
+
+    def next(self, remaining):
+        while True:
+            if not self.block:
+                size = max(remaining, 1)
+                first = self.config.reserve_admission_numbers(size)
+                self.block = [self.config.format_admission_number(counter) for counter in range(first, first + size)]
+                self.block.reverse()
+            number = self.block.pop()
+            if number not in self.taken:
+                return number
+
+
+def _usernames(admission_numbers):
+    """Free STD<admission number> usernames for a chunk, suffixed like the single-student form does"""
+    from django.contrib.auth.models import User
+
+    bases = {number: f"STD{number}"[:150] for number in admission_numbers}
+    taken = set(User.objects.filter(username__in=bases.values()).values_list('username', flat=True))
+    clashing = [base for base in bases.values() if base in taken]
+    if clashing:
+        taken |= set(User.objects.filter(
+            reduce(or_, [Q(username__startswith=base) for base in clashing])
+        ).values_list('username', flat=True))
+
+    usernames = {}
+    for number, base in bases.items():
+        username, counter = base, 1
+        while username in taken:
+            username = f"{base}{counter}"
+            counter += 1
+        taken.add(username)
+        usernames[number] = username
+    return usernames
+
+
+def _write_chunk(config, entries, context):
+    """Create users, students, payments and finance records for one chunk of parsed rows"""
+    from django.contrib.auth.models import User
+    from finance.models import StudentFinanceAccount, Transaction
+    from .models import Payment, Student
+
+    usernames = _usernames([entry['admission_number'] for entry in entries])
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(username=usernames[entry['admission_number']], password=context['password_hash'],
+                 first_name=entry['first_name'][:150], last_name=entry['last_name'][:150])
+            for entry in entries
+        ])
+        # Re-read the ids: bulk_create does not return primary keys on MySQL
+        user_ids = dict(User.objects.filter(username__in=usernames.values()).values_list('username', 'id'))
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=user_id, group_id=context['group'].pk) for user_id in user_ids.values()
+        ])
+
+        Student.objects.bulk_create([
+            Student(
+                school=config,
+                user_id=user_ids[usernames[entry['admission_number']]],
+                admission_number=entry['admission_number'],
+                first_name=entry['first_name'],
+                last_name=entry['last_name'],
+                gender=entry['gender'],
+                grade=entry['grade'],
+                date_of_birth=entry['date_of_birth'],
+                admission_fee=config.admission_fee,
+                current_term=context['current_term'],
+                term1_fees=entry['grade'].term1_fees if entry['grade'] else 0,
+                term2_fees=entry['grade'].term2_fees if entry['grade'] else 0,
+                term3_fees=entry['grade'].term3_fees if entry['grade'] else 0,
+            )
+            for entry in entries
+        ])
+        students = Student.objects.filter(
+            school=config, admission_number__in=[entry['admission_number'] for entry in entries]
+        )
+        student_ids = dict(students.values_list('admission_number', 'id'))
+
+        # Admission Fee Payment Records. The reference is longer than the old
+        # six hex digits: one collision would now fail a whole chunk.
+        references = {number: f'REF-BULK-{uuid.uuid4().hex[:12].upper()}' for number in student_ids}
+        Payment.objects.bulk_create([
+            Payment(
+                school=config,
+                student_id=student_id,
+                amount=config.admission_fee,
+                payment_method='CASH',
+                transaction_id=references[number],
+                reference_number=references[number],
+                term=context['current_term'],
+                status='COMPLETED',
+            )
+            for number, student_id in student_ids.items()
+        ])
+
+        # What the finance signals do for a new student and their first payment
+        StudentFinanceAccount.objects.bulk_create([
+            StudentFinanceAccount(school=config, student_id=student_id)
+            for student_id in student_ids.values()
+        ])
+        account_ids = dict(StudentFinanceAccount.objects.filter(
+            student_id__in=student_ids.values()
+        ).values_list('student_id', 'id'))
+        account_balances.record_transactions(Transaction, [
+            Transaction(
+                school=config,
+                account_id=account_ids[student_id],
+                type='PAYMENT',
+                amount=config.admission_fee,
+                description="Synced Payment: Fee Payment",
+                reference=references[number],
+                payment_method='CASH',
+            )
+            for number, student_id in student_ids.items()
+        ])
+
+        fee_ledger.rebuild_fee_ledger(students)
+    return len(student_ids)
+
+
+def import_students(config, rows, col_map, import_id=None, total=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Import an iterable of worksheet rows (tuples of cell values, header
+    excluded). Returns the summary dict the API reports: total, imported,
+    skipped and a list of per-row error strings.
+    """
+    from django.contrib.auth.models import Group
+    from .models import Grade, Student
+
+    results = {'total': 0, 'imported': 0, 'skipped': 0, 'errors': []}
+
+    def publish(done=False):
+        if import_id:
+            cache.set(import_progress_key(config.pk if config else None, import_id), {
+                'processed': results['total'],
+                'expected': total,
+                'imported': results['imported'],
+                'skipped': results['skipped'],
+                'done': done,
+            }, PROGRESS_TIMEOUT)
+
+    grades_map = {g.name.strip().lower(): g for g in Grade.objects.filter(school=config)}
+    taken = set(Student.objects.filter(school=config).exclude(admission_number=None).values_list(
+        'admission_number', flat=True
+    ))
+    current_term = config.current_term or ''
+    context = {
+        'group': Group.objects.get_or_create(name='Students')[0],
+        # Every imported student starts with the school's portal password; hash it once
+        'password_hash': make_password(config.student_portal_password),
+        'current_term': int(current_term.replace('TERM_', '')) if 'TERM_' in current_term else 1,
+    }
+    numbers = _AdmissionNumbers(config, taken)
+    touched_grades = set()
+
+    def flush(pending, generated):
+        if not pending:
+            return
+        # Reserve one block of admission numbers for the rows that need one
+        for position, entry in enumerate(generated):
+            entry['admission_number'] = numbers.next(len(generated) - position)
+            taken.add(entry['admission_number'])
+        write(pending)
+        publish()
+
+    def write(rows):
+        try:
+            results['imported'] += _write_chunk(config, [entry for _, entry in rows], context)
+            touched_grades.update(entry['grade'].pk for _, entry in rows if entry['grade'])
+        except Exception as chunk_err:
+            if len(rows) > 1:
+                # Retry in halves so only the offending row is skipped, with its own error
+                middle = len(rows) // 2
+                write(rows[:middle])
+                write(rows[middle:])
+                return
+            row_number, entry = rows[0]
+            taken.discard(entry['admission_number'])
+            results['skipped'] += 1
+            results['errors'].append(f"Row {row_number}: {chunk_err}")
+
+    pending, generated = [], []
+    seen_admission_numbers = set()
+    for row_idx, row in enumerate(rows):
+        results['total'] += 1
+        row_number = row_idx + 2
+        entry, error = _parse_row(row, col_map, grades_map)
+        if error:
+            results['skipped'] += 1
+            results['errors'].append(f"Row {row_number}: {error}")
+            continue
+        if entry is None:
+            continue
+
+        admission_number = entry['admission_number']
+        if admission_number:
+            # Check for duplicates (in DB or this file)
+            if admission_number in seen_admission_numbers:
+                results['skipped'] += 1
+                results['errors'].append(f"Row {row_number}: Duplicate Admission Number #{admission_number} found in Excel.")
+                continue
+            if admission_number in taken:
+                results['skipped'] += 1
+                results['errors'].append(f"Row {row_number}: Admission Number #{admission_number} already exists in system.")
+                continue
+            seen_admission_numbers.add(admission_number)
+            taken.add(admission_number)
+        else:
+            generated.append(entry)
+        pending.append((row_number, entry))
+
+        if len(pending) >= chunk_size:
+            flush(pending, generated)
+            pending, generated = [], []
+
+    flush(pending, generated)
+    invalidate_dashboard(config.pk if config else None)
+    invalidate_academic_analytics(config.pk if config else None, *touched_grades)
+    publish(done=True)
+    return results
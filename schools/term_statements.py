@@ -0,0 +1,406 @@
+"""
+Batch term fee statements.
+
+statement_data() loads everything the statements of a school (or one
+grade) print in three queries: the students with their term fees, their
+fee ledger rows and their payments up to the statement term. The result
+is a list of plain dicts, so render_statement() needs no database and runs
+on a process pool (schools.pdf_batch); write_statements() streams the
+rendered PDFs, in student order, into one ZIP or one merged PDF (pypdf) as
+they come back.
+
+Statements are built by the `generate_term_statements` command, or
+requested through the API as a StatementJob that the
+`process_statement_jobs` worker builds while the client polls its
+progress.
+"""
+import functools
+import logging
+import os
+import re
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .pdf_batch import DEFAULT_WORKERS, atomic_output, render_batch, write_zip
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EVERY = 25
+IDLE_SLEEP = 5
+JOB_TIMEOUT = 60 * 60  # seconds a job may stay RUNNING before another worker takes it over
+
+
+# Data
+
+def statement_data(school, term, grade=None):
+    """One dict per student of `school` (or `grade`) with what their term `term` statement prints"""
+    from .models import Payment, Student, StudentFeeLedger
+
+    term = int(term)
+    students = Student.objects.filter(school=school)
+    if grade is not None:
+        students = students.filter(grade=grade)
+
+    paid = {}
+    for student_id, ledger_term, amount in StudentFeeLedger.objects.filter(
+        student__in=students.values('pk')
+    ).values_list('student_id', 'term', 'paid'):
+        paid[(student_id, ledger_term)] = amount
+
+    payments = {}
+    for row in Payment.objects.filter(
+        student__in=students.values('pk'), term__lte=term
+    ).order_by('student_id', 'date', 'pk').values(
+        'student_id', 'date', 'reference_number', 'payment_method', 'term', 'amount'
+    ):
+        payments.setdefault(row.pop('student_id'), []).append(row)
+
+    school_info = {
+        'name': school.school_name if school else '',
+        'address': getattr(school, 'school_address', '') or '',
+        'phone': getattr(school, 'school_phone', '') or '',
+        'email': getattr(school, 'school_email', '') or '',
+        'logo': _logo_path(school),
+    }
+    generated_on = timezone.localdate()
+
+    items = []
+    for student in students.order_by('grade__name', 'admission_number', 'pk').values(
+        'pk', 'admission_number', 'first_name', 'last_name', 'parent_name', 'academic_year',
+        'grade__name', 'admission_fee', 'term1_fees', 'term2_fees', 'term3_fees',
+    ):
+        fees = {1: student['term1_fees'], 2: student['term2_fees'], 3: student['term3_fees']}
+        terms = [
+            {'term': t, 'billed': fees[t] or 0, 'paid': paid.get((student['pk'], t), 0)}
+            for t in range(1, term + 1)
+        ]
+        # Payments recorded against later terms still reduce what is owed
+        paid_later = sum(paid.get((student['pk'], t), 0) for t in range(term + 1, 4))
+        owed = (student['admission_fee'] or 0) + sum(row['billed'] for row in terms)
+        total_paid = sum(row['paid'] for row in terms) + paid_later
+        items.append({
+            'school': school_info,
+            'term': term,
+            'generated_on': generated_on,
+            'student': {
+                'id': student['pk'],
+                'name': f"{student['first_name']} {student['last_name']}",
+                'admission_number': student['admission_number'] or '',
+                'grade': student['grade__name'] or 'N/A',
+                'parent_name': student['parent_name'] or '',
+                'academic_year': student['academic_year'] or str(generated_on.year),
+            },
+            'admission_fee': student['admission_fee'] or 0,
+            'terms': terms,
+            'paid_later': paid_later,
+            'payments': payments.get(student['pk'], []),
+            'total_owed': owed,
+            'total_paid': total_paid,
+            'balance': owed - total_paid,
+        })
+    return items
+
+
+def _logo_path(school):
+    if school is not None and getattr(school, 'school_logo', None):
+        try:
+            path = school.school_logo.path
+            if os.path.exists(path):
+                return path
+        except Exception:
+            pass
+    return None
+
+
+# Rendering (runs in worker processes: no database access below)
+
+@functools.lru_cache(maxsize=None)
+def _styles():
+    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle
+
+    ink = colors.HexColor('#0f172a')
+    muted = colors.HexColor('#64748b')
+    accent = colors.HexColor('#4f46e5')
+    return {
+        'school': ParagraphStyle('StmtSchool', fontSize=16, fontName='Helvetica-Bold', textColor=ink, leading=19),
+        'contact': ParagraphStyle('StmtContact', fontSize=8, textColor=muted, leading=10),
+        'title': ParagraphStyle('StmtTitle', fontSize=12, fontName='Helvetica-Bold', textColor=accent, alignment=2),
+        'label': ParagraphStyle('StmtLabel', fontSize=8, textColor=muted),
+        'value': ParagraphStyle('StmtValue', fontSize=9, fontName='Helvetica-Bold', textColor=ink),
+        'section': ParagraphStyle('StmtSection', fontSize=9, fontName='Helvetica-Bold', textColor=accent, spaceBefore=6, spaceAfter=4),
+        'cell': ParagraphStyle('StmtCell', fontSize=8, textColor=ink),
+        'footer': ParagraphStyle('StmtFooter', fontSize=7, textColor=muted, alignment=1),
+        'ink': ink,
+        'muted': muted,
+        'accent': accent,
+        'light': colors.HexColor('#f1f5f9'),
+        'danger': colors.HexColor('#dc2626'),
+    }
+
+
+@functools.lru_cache(maxsize=4)
+def _logo_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def statement_filename(item):
+    student = item['student']
+    name = re.sub(r'[^A-Za-z0-9]+', '_', f"{student['admission_number'] or student['id']}_{student['name']}").strip('_')
+    return f"term{item['term']}_{name}.pdf"
+
+
+def render_statement(item):
+    """(filename, PDF bytes) of one statement dict from statement_data()"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    st = _styles()
+    student = item['student']
+    school = item['school']
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, leftMargin=14*mm, rightMargin=14*mm, topMargin=12*mm, bottomMargin=12*mm)
+    elements = []
+
+    # Header
+    logo = ''
+    if school['logo']:
+        try:
+            logo = Image(BytesIO(_logo_bytes(school['logo'])), width=16*mm, height=16*mm)
+        except Exception:
+            logo = ''
+    school_block = [
+        [Paragraph(school['name'].upper(), st['school'])],
+        [Paragraph(school['address'], st['contact'])],
+        [Paragraph(f"T: {school['phone']}  |  E: {school['email']}", st['contact'])],
+    ]
+    header = Table([[
+        logo,
+        Table(school_block, colWidths=[105*mm]),
+        Paragraph(f"FEE STATEMENT<br/>TERM {item['term']}, {student['academic_year']}", st['title']),
+    ]], colWidths=[20*mm, 107*mm, 55*mm])
+    header.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LINEBELOW', (0, 0), (-1, -1), 1, st['accent']),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4*mm),
+    ]))
+    elements += [header, Spacer(1, 4*mm)]
+
+    # Student
+    info = Table([
+        [Paragraph("Student", st['label']), Paragraph(student['name'].upper(), st['value']),
+         Paragraph("Admission No.", st['label']), Paragraph(student['admission_number'], st['value'])],
+        [Paragraph("Grade", st['label']), Paragraph(student['grade'], st['value']),
+         Paragraph("Parent/Guardian", st['label']), Paragraph(student['parent_name'] or '-', st['value'])],
+    ], colWidths=[25*mm, 66*mm, 30*mm, 61*mm])
+    info.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), st['light']),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('TOPPADDING', (0, 0), (-1, -1), 2*mm),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2*mm),
+    ]))
+    elements += [info, Spacer(1, 4*mm)]
+
+    # Fees per term
+    rows = [['Description', 'Charged (KES)', 'Paid (KES)', 'Balance (KES)']]
+    if item['admission_fee']:
+        rows.append(['Admission fee', _money(item['admission_fee']), '', _money(item['admission_fee'])])
+    for row in item['terms']:
+        rows.append([f"Term {row['term']} fees", _money(row['billed']), _money(row['paid']), _money(row['billed'] - row['paid'])])
+    if item['paid_later']:
+        rows.append(['Paid in advance (later terms)', '', _money(item['paid_later']), _money(-item['paid_later'])])
+    rows.append(['Total', _money(item['total_owed']), _money(item['total_paid']), _money(item['balance'])])
+    fees = Table(rows, colWidths=[82*mm, 33*mm, 33*mm, 34*mm])
+    fees.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), st['ink']),
+        ('TEXTCOLOR', (0, 0), (-1, 0), st['light']),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('LINEABOVE', (0, -1), (-1, -1), 1, st['ink']),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [None, st['light']]),
+    ]))
+    elements += [Paragraph("FEES SUMMARY", st['section']), fees]
+
+    # Payments
+    elements.append(Paragraph("PAYMENTS RECEIVED", st['section']))
+    if item['payments']:
+        rows = [['Date', 'Reference', 'Method', 'Term', 'Amount (KES)']]
+        for payment in item['payments']:
+            rows.append([
+                payment['date'].strftime('%Y-%m-%d') if payment['date'] else '',
+                Paragraph(payment['reference_number'] or '', st['cell']),
+                payment['payment_method'] or '',
+                f"Term {payment['term']}",
+                _money(payment['amount']),
+            ])
+        payments = Table(rows, colWidths=[26*mm, 70*mm, 28*mm, 24*mm, 34*mm], repeatRows=1)
+        payments.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), st['light']),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+            ('LINEBELOW', (0, 0), (-1, -1), 0.25, st['light']),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]))
+        elements.append(payments)
+    else:
+        elements.append(Paragraph("No payments recorded.", st['cell']))
+
+    # Closing balance
+    label = "BALANCE DUE" if item['balance'] > 0 else "CREDIT" if item['balance'] < 0 else "FULLY PAID"
+    closing = Table([[label, f"KES {_money(abs(item['balance']))}"]], colWidths=[130*mm, 52*mm])
+    closing.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('TEXTCOLOR', (0, 0), (-1, -1), st['danger'] if item['balance'] > 0 else st['ink']),
+        ('TOPPADDING', (0, 0), (-1, -1), 4*mm),
+    ]))
+    elements += [Spacer(1, 2*mm), closing, Spacer(1, 8*mm)]
+    elements.append(Paragraph(
+        f"Computer-generated statement - {item['generated_on'].strftime('%Y-%m-%d')}", st['footer']
+    ))
+
+    doc.build(elements)
+    return statement_filename(item), buffer.getvalue()
+
+
+def render_statements(items, workers=DEFAULT_WORKERS):
+    """Yield (filename, PDF bytes) for every item, in order, rendered on `workers` processes"""
+    return render_batch(render_statement, items, workers)
+
+
+def write_statements(items, path, output_format='ZIP', workers=DEFAULT_WORKERS, progress=None):
+    """
+    Render `items` into `path`: a ZIP with one PDF per student, or
+    (output_format='PDF') a single merged PDF. The file is written under a
+    temporary name and moved into place when complete. Returns the number
+    of statements written.
+    """
+    if output_format == 'PDF':
+        from pypdf import PdfWriter
+
+        writer = PdfWriter()
+        written = 0
+        for _, pdf in render_statements(items, workers):
+            writer.append(BytesIO(pdf))
+            written += 1
+            if progress and written % PROGRESS_EVERY == 0:
+                progress(written)
+        with atomic_output(path) as tmp_path:
+            with open(tmp_path, 'wb') as f:
+                writer.write(f)
+    else:
+        written = write_zip(render_statements(items, workers), path, progress, PROGRESS_EVERY)
+    if progress:
+        progress(written)
+    return written
+
+
+# Jobs
+
+def job_file_name(job):
+    extension = 'pdf' if job.output_format == 'PDF' else 'zip'
+    scope = f"grade{job.grade_id}" if job.grade_id else 'all'
+    return f"statements/{job.school_id or 'none'}/term{job.term}-{scope}-{job.pk}.{extension}"
+
+
+def _claimable(now):
+    return Q(status='QUEUED') | Q(status='RUNNING', started_at__lt=now - timedelta(seconds=JOB_TIMEOUT))
+
+
+def claim_job(job_id=None):
+    """
+    Mark the oldest queued job (or `job_id`) RUNNING and return it, or
+    None. A job left RUNNING by a worker that died is claimed again once
+    it has been running for JOB_TIMEOUT.
+    """
+    from .models import StatementJob
+
+    now = timezone.now()
+    claimable = StatementJob.objects.filter(_claimable(now))
+    if job_id is not None:
+        claimable = claimable.filter(pk=job_id)
+    job = claimable.order_by('created_at', 'pk').first()
+    if job is None:
+        return None
+    # The conditional UPDATE keeps two workers from building the same job
+    if not StatementJob.objects.filter(_claimable(now), pk=job.pk).update(
+        status='RUNNING', started_at=now, processed=0, error='',
+    ):
+        return None
+    if job.status == 'RUNNING':
+        logger.warning(f"Statement job {job.pk} was running since {job.started_at}; building it again")
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job, workers=DEFAULT_WORKERS):
+    """Build a claimed StatementJob and record the outcome on it"""
+    from django.core.files.storage import default_storage
+    from .models import StatementJob
+
+    # Updates only land while this worker still holds the claim, so a
+    # worker that was taken over for being too slow cannot overwrite it
+    claimed = StatementJob.objects.filter(pk=job.pk, status='RUNNING', started_at=job.started_at)
+    try:
+        items = statement_data(job.school, job.term, job.grade)
+        claimed.update(total=len(items), processed=0)
+
+        def progress(done):
+            claimed.update(processed=done)
+
+        name = job_file_name(job)
+        write_statements(items, default_storage.path(name), job.output_format, workers, progress)
+        claimed.update(status='DONE', file=name, processed=len(items), finished_at=timezone.now(), error='')
+    except Exception as e:
+        logger.exception(f"Statement job {job.pk} failed")
+        claimed.update(status='FAILED', error=str(e), finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
+
+
+def process_jobs(once=False, idle_sleep=IDLE_SLEEP, workers=DEFAULT_WORKERS, progress=None):
+    """Worker loop for queued StatementJobs. Returns the number of jobs run."""
+    done = 0
+    while True:
+        job = claim_job()
+        if job is None:
+            if once:
+                return done
+            time.sleep(idle_sleep)
+            continue
+        job = run_job(job, workers)
+        done += 1
+        if progress:
+            progress(job)
+
+
+def job_status(job):
+    """Progress of a StatementJob for the status API"""
+    return {
+        'id': job.id,
+        'status': job.status,
+        'term': job.term,
+        'grade': job.grade.name if job.grade else None,
+        'format': job.output_format,
+        'total': job.total,
+        'processed': job.processed,
+        'progress': round(job.processed * 100 / job.total, 1) if job.total else (100 if job.status == 'DONE' else 0),
+        'error': job.error or None,
+        'created_at': job.created_at.strftime('%Y-%m-%d %H:%M') if job.created_at else None,
+        'finished_at': job.finished_at.strftime('%Y-%m-%d %H:%M') if job.finished_at else None,
+        'download_ready': job.status == 'DONE' and bool(job.file),
+    }
@@ -16,6 +16,7 @@ urlpatterns = [
     path('api/students/', views.api_student_list, name='api_student_list'),
     path('api/students/create/', views.api_student_create, name='api_student_create'),
     path('api/students/bulk-import/', views.api_students_bulk_import, name='api_students_bulk_import'),
+    path('api/students/bulk-import/progress/<str:import_id>/', views.api_students_bulk_import_progress, name='api_students_bulk_import_progress'),
     path('api/students/template/', views.download_student_template, name='api_students_template'),
     path('api/students/<int:pk>/', views.api_student_detail, name='api_student_detail'),
     path('api/students/bulk-delete/', views.api_student_bulk_delete, name='api_student_bulk_delete'),
@@ -68,6 +69,7 @@ urlpatterns = [
     path('api/app-status/', views_super.api_app_status, name='api_app_status'),
     path('api/super-portal/stats/', views_super.api_super_stats, name='api_super_stats'),
     path('api/super-portal/subscriptions/', views_super.api_super_subscriptions, name='api_super_subscriptions'),
+    path('api/super-portal/integrations/metrics/', views_super.api_super_integration_metrics, name='api_super_integration_metrics'),
     path('api/super-portal/settings/', views_super.api_system_settings, name='api_system_settings'),
     
     # Dashboard
@@ -154,6 +156,8 @@ urlpatterns = [
     path('sms/send/', views.send_sms, name='send_sms'),
     path('api/sms/', views.api_sms_list, name='api_sms_list'),
     path('api/sms/send/bulk/', views.api_sms_send_bulk, name='api_sms_send_bulk'),
+    path('api/sms/<int:pk>/status/', views.api_sms_status, name='api_sms_status'),
+    path('api/receipts/<str:kind>/<int:object_id>/delivery/', views.api_receipt_delivery_status, name='api_receipt_delivery_status'),
     path('api/communication/templates/', views.api_communication_template_list, name='api_communication_template_list'),
     path('api/communication/templates/create/', views.api_communication_template_create, name='api_communication_template_create'),
     
@@ -241,4 +245,9 @@ urlpatterns = [
     # Simple Finance Expenses
     path('api/finance/expenses/', views_finance.api_expenses, name='api_expenses'),
     path('api/finance/expenses/<int:expense_id>/', views_finance.api_expense_detail, name='api_expense_detail'),
+
+    # Term statements
+    path('api/finance/statements/', views_finance.api_statement_jobs, name='api_statement_jobs'),
+    path('api/finance/statements/<int:pk>/', views_finance.api_statement_job_detail, name='api_statement_job_detail'),
+    path('api/finance/statements/<int:pk>/download/', views_finance.api_statement_job_download, name='api_statement_job_download'),
 ]
\ No newline at end of file
@@ -17,6 +17,7 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from django.utils import timezone
 import logging
 import datetime
+import functools
 
 logger = logging.getLogger(__name__)
 
@@ -92,6 +93,88 @@ def number_to_words(num):
     
     return result.title()
 
+# Design tokens of the payment receipt
+INDIGO_600 = colors.HexColor('#4f46e5')
+INDIGO_700 = colors.HexColor('#4338ca')
+INDIGO_50 = colors.HexColor('#eef2ff')
+INDIGO_100 = colors.HexColor('#e0e7ff')
+INDIGO_950 = colors.HexColor('#1e1b4b')
+SLATE_50 = colors.HexColor('#f8fafc')
+SLATE_100 = colors.HexColor('#f1f5f9')
+SLATE_200 = colors.HexColor('#e2e8f0')
+SLATE_400 = colors.HexColor('#a0aec0')
+SLATE_500 = colors.HexColor('#64748b')
+SLATE_900 = colors.HexColor('#0f172a')
+EMERALD_50 = colors.HexColor('#ecfdf5')
+EMERALD_700 = colors.HexColor('#047857')
+
+
+@functools.lru_cache(maxsize=None)
+def _payment_receipt_styles():
+    """Paragraph styles of generate_payment_receipt, built once per process"""
+    return {
+        'header_name': ParagraphStyle('HeadName', fontSize=18, fontName='Helvetica-Bold', textColor=INDIGO_950, leading=20),
+        'sub_header': ParagraphStyle('SubHead', fontSize=7, fontName='Helvetica-Bold', textColor=INDIGO_600, leading=9, tracking=1.5),
+        'contact_text': ParagraphStyle('ContactText', fontSize=7, textColor=SLATE_500, leading=8),
+        'badge_style': ParagraphStyle('Badge', fontSize=18, fontName='Helvetica-Bold', textColor=INDIGO_700, alignment=1),
+        'meta_label': ParagraphStyle('MetaLabel', fontSize=7, fontName='Helvetica-Bold', textColor=SLATE_400, alignment=2, tracking=1),
+        'meta_id': ParagraphStyle('MetaID', fontSize=11, fontName='Courier-Bold', textColor=SLATE_900, alignment=2),
+        'card_title': ParagraphStyle('CardTitle', fontSize=7, fontName='Helvetica-Bold', textColor=SLATE_400, leading=9, tracking=1),
+        'card_label': ParagraphStyle('CardLabel', fontSize=8, textColor=SLATE_500, leading=10),
+        'card_value': ParagraphStyle('CardValue', fontSize=9, fontName='Helvetica-Bold', textColor=SLATE_900, leading=11),
+        'th_style': ParagraphStyle('TH', fontSize=8, fontName='Helvetica-Bold', textColor=colors.white, tracking=0.5, alignment=1),
+        'td_desc': ParagraphStyle('TDDesc', fontSize=10, fontName='Helvetica-Bold', textColor=SLATE_900),
+        'td_cat': ParagraphStyle('TDCat', fontSize=6, fontName='Helvetica-Bold', textColor=colors.white, backColor=INDIGO_600, alignment=1),
+        'total_label': ParagraphStyle('TotalLabel', fontSize=10, fontName='Helvetica-Bold', textColor=SLATE_400, tracking=0.5, alignment=2),
+        'total_val': ParagraphStyle('TotalVal', fontSize=16, fontName='Helvetica-Bold', textColor=INDIGO_700, alignment=2),
+        'p_std': ParagraphStyle('PStd', fontSize=9, textColor=SLATE_500, fontName='Helvetica'),
+        'p_bold': ParagraphStyle('PBold', fontSize=9, fontName='Helvetica-Bold', textColor=SLATE_900),
+        'status_badge': ParagraphStyle('PBadge', fontSize=7, fontName='Helvetica-Bold', textColor=EMERALD_700, alignment=1),
+        'cat_label': ParagraphStyle('CatL', fontSize=6, fontName='Helvetica-Bold', textColor=colors.white, alignment=1),
+        'cat_value': ParagraphStyle('CatV', fontSize=7, fontName='Helvetica-Bold', textColor=SLATE_500),
+        'unit_price': ParagraphStyle('P', fontSize=10, textColor=SLATE_500, fontName='Courier'),
+        'amount_paid': ParagraphStyle('P', fontSize=14, fontName='Helvetica-Bold', textColor=SLATE_900, alignment=2),
+        'total_currency': ParagraphStyle('TC', fontSize=10, fontName='Helvetica-Bold', textColor=INDIGO_700),
+        'balance_label': ParagraphStyle('BL', fontSize=9, fontName='Helvetica-Bold', textColor=colors.HexColor('#f87171'), alignment=2),
+        'balance_val': ParagraphStyle('BV', fontSize=12, fontName='Helvetica-Bold', textColor=colors.HexColor('#ef4444'), alignment=2),
+        'verify': ParagraphStyle('PV', fontSize=6, fontName='Courier', textColor=SLATE_400, alignment=1),
+        'disclaimer': ParagraphStyle('PD', fontSize=7, textColor=SLATE_400, leading=9),
+        'served_by': ParagraphStyle('PS', fontSize=10, fontName='Helvetica-Bold', textColor=SLATE_900, alignment=2),
+        'officer': ParagraphStyle('PO', fontSize=6, fontName='Courier', textColor=SLATE_400, alignment=2),
+        'footer_date': ParagraphStyle('PDD', fontSize=7, textColor=SLATE_400, alignment=2),
+        'copyright': ParagraphStyle('PC', fontSize=7, textColor=SLATE_200, alignment=1, tracking=4),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def sample_styles():
+    """reportlab's sample stylesheet, built once per process (the receipts only read it)"""
+    return getSampleStyleSheet()
+
+
+def receipt_logo_path():
+    """The static logo printed on the transport and meal receipts, or None"""
+    for path in (
+        os.path.join(settings.STATIC_ROOT, 'images', 'logo.png'),
+        os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png'),
+        os.path.join(settings.BASE_DIR, 'schools', 'static', 'images', 'logo.png'),
+    ):
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+@functools.lru_cache(maxsize=16)
+def _logo_bytes(path, mtime):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def load_logo_image(path, width, height):
+    """An Image flowable for a logo file whose bytes are read once per process (per file version)"""
+    return Image(BytesIO(_logo_bytes(path, os.path.getmtime(path))), width=width, height=height)
+
+
 def generate_payment_receipt(payment, qr_code=None):
     """Generate PDF receipt matching the official school receipt design exactly
     Supports both Payment and StudentMealPayment objects
@@ -121,52 +204,15 @@ def generate_payment_receipt(payment, qr_code=None):
         bottomMargin=10*mm
     )
     
-    # Design Tokens
-    indigo_600 = colors.HexColor('#4f46e5')
-    indigo_700 = colors.HexColor('#4338ca')
-    indigo_50 = colors.HexColor('#eef2ff')
-    indigo_100 = colors.HexColor('#e0e7ff')
-    indigo_950 = colors.HexColor('#1e1b4b')
-    slate_50 = colors.HexColor('#f8fafc')
-    slate_100 = colors.HexColor('#f1f5f9')
-    slate_200 = colors.HexColor('#e2e8f0')
-    slate_400 = colors.HexColor('#a0aec0')
-    slate_500 = colors.HexColor('#64748b')
-    slate_900 = colors.HexColor('#0f172a')
-    emerald_50 = colors.HexColor('#ecfdf5')
-    emerald_700 = colors.HexColor('#047857')
-
-    styles = getSampleStyleSheet()
-    
-    # Custom Styled Components
-    def get_styles_map():
-        return {
-            'header_name': ParagraphStyle('HeadName', fontSize=18, fontName='Helvetica-Bold', textColor=indigo_950, leading=20),
-            'sub_header': ParagraphStyle('SubHead', fontSize=7, fontName='Helvetica-Bold', textColor=indigo_600, leading=9, tracking=1.5),
-            'contact_text': ParagraphStyle('ContactText', fontSize=7, textColor=slate_500, leading=8),
-            'badge_style': ParagraphStyle('Badge', fontSize=18, fontName='Helvetica-Bold', textColor=indigo_700, alignment=1),
-            'meta_label': ParagraphStyle('MetaLabel', fontSize=7, fontName='Helvetica-Bold', textColor=slate_400, alignment=2, tracking=1),
-            'meta_id': ParagraphStyle('MetaID', fontSize=11, fontName='Courier-Bold', textColor=slate_900, alignment=2),
-            'card_title': ParagraphStyle('CardTitle', fontSize=7, fontName='Helvetica-Bold', textColor=slate_400, leading=9, tracking=1),
-            'card_label': ParagraphStyle('CardLabel', fontSize=8, textColor=slate_500, leading=10),
-            'card_value': ParagraphStyle('CardValue', fontSize=9, fontName='Helvetica-Bold', textColor=slate_900, leading=11),
-            'th_style': ParagraphStyle('TH', fontSize=8, fontName='Helvetica-Bold', textColor=colors.white, tracking=0.5, alignment=1),
-            'td_desc': ParagraphStyle('TDDesc', fontSize=10, fontName='Helvetica-Bold', textColor=slate_900),
-            'td_cat': ParagraphStyle('TDCat', fontSize=6, fontName='Helvetica-Bold', textColor=colors.white, backColor=indigo_600, alignment=1),
-            'total_label': ParagraphStyle('TotalLabel', fontSize=10, fontName='Helvetica-Bold', textColor=slate_400, tracking=0.5, alignment=2),
-            'total_val': ParagraphStyle('TotalVal', fontSize=16, fontName='Helvetica-Bold', textColor=indigo_700, alignment=2),
-            'p_std': ParagraphStyle('PStd', fontSize=9, textColor=slate_500, fontName='Helvetica'),
-            'p_bold': ParagraphStyle('PBold', fontSize=9, fontName='Helvetica-Bold', textColor=slate_900),
-        }
-
-    st = get_styles_map()
+    # Styles are built once per process and shared by every receipt
+    st = _payment_receipt_styles()
     from config.models import SchoolConfig
     sc = SchoolConfig.get_config()
     elements = []
 
     # 1. TOP BORDER
     line_table = Table([['']], colWidths=[186*mm], rowHeights=[1.5*mm])
-    line_table.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), indigo_600)]))
+    line_table.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), INDIGO_600)]))
     elements.append(line_table)
     elements.append(Spacer(1, 4*mm))
 
@@ -177,13 +223,13 @@ def generate_payment_receipt(payment, qr_code=None):
         except: pass
     
     if logo_file and os.path.exists(logo_file):
-        logo_img = Image(logo_file, width=12*mm, height=12*mm)
+        logo_img = load_logo_image(logo_file, width=12*mm, height=12*mm)
     else:
         logo_img = Paragraph("LOGO", st['card_title'])
 
     logo_box = Table([[logo_img]], colWidths=[15*mm], rowHeights=[15*mm])
     logo_box.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,-1), indigo_600),
+        ('BACKGROUND', (0,0), (-1,-1), INDIGO_600),
         ('ALIGN', (0,0), (-1,-1), 'CENTER'),
         ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
         ('ROUNDEDCORNERS', [10, 10, 10, 10]),
@@ -201,18 +247,18 @@ def generate_payment_receipt(payment, qr_code=None):
 
     receipt_badge = Table([[Paragraph("RECEIPT", st['badge_style'])]], colWidths=[50*mm], rowHeights=[10*mm])
     receipt_badge.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,-1), indigo_50),
+        ('BACKGROUND', (0,0), (-1,-1), INDIGO_50),
         ('ALIGN', (0,0), (-1,-1), 'CENTER'),
         ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ('LINEABOVE', (0,0), (-1,-1), 1, indigo_100),
-        ('LINEBELOW', (0,0), (-1,-1), 1, indigo_100),
-        ('LINELEFT', (0,0), (-1,-1), 1, indigo_100),
-        ('LINERIGHT', (0,0), (-1,-1), 1, indigo_100),
+        ('LINEABOVE', (0,0), (-1,-1), 1, INDIGO_100),
+        ('LINEBELOW', (0,0), (-1,-1), 1, INDIGO_100),
+        ('LINELEFT', (0,0), (-1,-1), 1, INDIGO_100),
+        ('LINERIGHT', (0,0), (-1,-1), 1, INDIGO_100),
     ]))
 
-    status_badge = Table([[Paragraph("PAYMENT CAPTURED", ParagraphStyle('PBadge', fontSize=7, fontName='Helvetica-Bold', textColor=emerald_700, alignment=1))]], colWidths=[40*mm], rowHeights=[6*mm])
+    status_badge = Table([[Paragraph("PAYMENT CAPTURED", st['status_badge'])]], colWidths=[40*mm], rowHeights=[6*mm])
     status_badge.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,-1), emerald_50),
+        ('BACKGROUND', (0,0), (-1,-1), EMERALD_50),
         ('ROUNDEDCORNERS', [10, 10, 10, 10]),
         ('ALIGN', (0,0), (-1,-1), 'CENTER'),
         ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
@@ -232,7 +278,7 @@ def generate_payment_receipt(payment, qr_code=None):
     main_header.setStyle(TableStyle([
         ('VALIGN', (0,0), (-1,-1), 'TOP'),
         ('BOTTOMPADDING', (0,0), (-1,-1), 6*mm),
-        ('LINEBELOW', (0,0), (-1,-1), 1, slate_100),
+        ('LINEBELOW', (0,0), (-1,-1), 1, SLATE_100),
     ]))
     elements.append(main_header)
     elements.append(Spacer(1, 4*mm))
@@ -245,8 +291,8 @@ def generate_payment_receipt(payment, qr_code=None):
             rows.append([Table([[Paragraph(label, st['card_label']), Paragraph(str(val), st['card_value'])]], colWidths=[30*mm, 45*mm])])
         t = Table(rows, colWidths=[80*mm])
         t.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,-1), slate_50),
-            ('BOX', (0,0), (-1,-1), 1, slate_100),
+            ('BACKGROUND', (0,0), (-1,-1), SLATE_50),
+            ('BOX', (0,0), (-1,-1), 1, SLATE_100),
             ('TOPPADDING', (0,0), (-1,-1), 4*mm),
             ('BOTTOMPADDING', (0,0), (-1,-1), 4*mm),
             ('LEFTPADDING', (0,0), (-1,-1), 4*mm),
@@ -279,24 +325,24 @@ def generate_payment_receipt(payment, qr_code=None):
     desc_cell = [
         Paragraph(getattr(payment, 'description', 'Fees Payment'), st['td_desc']),
         Spacer(1, 1*mm),
-        Table([[Paragraph("CATEGORY", ParagraphStyle('CatL', fontSize=6, fontName='Helvetica-Bold', textColor=colors.white, alignment=1)), Paragraph("GENERAL FEES", ParagraphStyle('CatV', fontSize=7, fontName='Helvetica-Bold', textColor=slate_500))]], colWidths=[15*mm, 30*mm], style=[('BACKGROUND', (0,0), (0,0), indigo_600), ('VALIGN',(0,0),(-1,-1),'MIDDLE')])
+        Table([[Paragraph("CATEGORY", st['cat_label']), Paragraph("GENERAL FEES", st['cat_value'])]], colWidths=[15*mm, 30*mm], style=[('BACKGROUND', (0,0), (0,0), INDIGO_600), ('VALIGN',(0,0),(-1,-1),'MIDDLE')])
     ]
     
     table_data.append([
         desc_cell,
-        Paragraph(f"{payment.amount:,.2f}", ParagraphStyle('P', fontSize=10, textColor=slate_500, fontName='Courier')),
-        Paragraph(f"{payment.amount:,.2f}", ParagraphStyle('P', fontSize=14, fontName='Helvetica-Bold', textColor=slate_900, alignment=2))
+        Paragraph(f"{payment.amount:,.2f}", st['unit_price']),
+        Paragraph(f"{payment.amount:,.2f}", st['amount_paid'])
     ])
 
     tx_table = Table(table_data, colWidths=[110*mm, 35*mm, 41*mm])
     tx_table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), slate_900),
+        ('BACKGROUND', (0,0), (-1,0), SLATE_900),
         ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
         ('TOPPADDING', (0,0), (-1,0), 4*mm),
         ('BOTTOMPADDING', (0,0), (-1,0), 4*mm),
         ('TOPPADDING', (0,1), (-1,-1), 8*mm),
         ('BOTTOMPADDING', (0,1), (-1,-1), 8*mm),
-        ('LINEBELOW', (0,1), (-1,1), 2, slate_100),
+        ('LINEBELOW', (0,1), (-1,1), 2, SLATE_100),
         ('LEFTPADDING', (0,0), (-1,-1), 6*mm),
         ('RIGHTPADDING', (0,0), (-1,-1), 6*mm),
     ]))
@@ -304,11 +350,11 @@ def generate_payment_receipt(payment, qr_code=None):
 
     # 5. TOTAL SECTION
     total_table = Table([
-        ['', Paragraph("TOTAL NET PAYMENT", st['total_label']), Table([[Paragraph("KES", ParagraphStyle('TC', fontSize=10, fontName='Helvetica-Bold', textColor=indigo_700)), Paragraph(f"{payment.amount:,.2f}", st['total_val'])]], colWidths=[12*mm, 29*mm])],
-        ['', Paragraph("OUTSTANDING BALANCE", ParagraphStyle('BL', fontSize=9, fontName='Helvetica-Bold', textColor=colors.HexColor('#f87171'), alignment=2)), Paragraph(f"KES {getattr(payment.student, 'balance', 0):,.2f}", ParagraphStyle('BV', fontSize=12, fontName='Helvetica-Bold', textColor=colors.HexColor('#ef4444'), alignment=2))] if getattr(payment.student, 'balance', 0) > 0 else ['', '', '']
+        ['', Paragraph("TOTAL NET PAYMENT", st['total_label']), Table([[Paragraph("KES", st['total_currency']), Paragraph(f"{payment.amount:,.2f}", st['total_val'])]], colWidths=[12*mm, 29*mm])],
+        ['', Paragraph("OUTSTANDING BALANCE", st['balance_label']), Paragraph(f"KES {getattr(payment.student, 'balance', 0):,.2f}", st['balance_val'])] if getattr(payment.student, 'balance', 0) > 0 else ['', '', '']
     ], colWidths=[110*mm, 45*mm, 31*mm])
     total_table.setStyle(TableStyle([
-        ('BACKGROUND', (2,0), (2,0), indigo_50),
+        ('BACKGROUND', (2,0), (2,0), INDIGO_50),
         ('BACKGROUND', (2,1), (2,1), colors.HexColor('#fef2f2')),
         ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
         ('TOPPADDING', (0,0), (-1,-1), 4*mm),
@@ -326,8 +372,8 @@ def generate_payment_receipt(payment, qr_code=None):
             qr_img = Image(BytesIO(qr_data), width=18*mm, height=18*mm)
             qr_box = Table([[qr_img]], colWidths=[20*mm], rowHeights=[20*mm])
             qr_box.setStyle(TableStyle([
-                ('BACKGROUND', (0,0), (-1,-1), slate_50),
-                ('BOX', (0,0), (-1,-1), 0.5, slate_100),
+                ('BACKGROUND', (0,0), (-1,-1), SLATE_50),
+                ('BOX', (0,0), (-1,-1), 0.5, SLATE_100),
                 ('ALIGN', (0,0), (-1,-1), 'CENTER'),
                 ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
             ]))
@@ -335,35 +381,35 @@ def generate_payment_receipt(payment, qr_code=None):
 
     footer_left = Table([
         [qr_box],
-        [Paragraph("SCAN TO VERIFY", ParagraphStyle('PV', fontSize=6, fontName='Courier', textColor=slate_400, alignment=1))],
+        [Paragraph("SCAN TO VERIFY", st['verify'])],
         [Spacer(1, 1*mm)],
-        [Paragraph("<b>Disclaimers & Conditions:</b><br/>1. Computer-generated official receipt.<br/>2. Fees non-refundable/transferable.<br/>3. Retain for future queries.", ParagraphStyle('PD', fontSize=7, textColor=slate_400, leading=9))]
+        [Paragraph("<b>Disclaimers & Conditions:</b><br/>1. Computer-generated official receipt.<br/>2. Fees non-refundable/transferable.<br/>3. Retain for future queries.", st['disclaimer'])]
     ], colWidths=[45*mm])
 
     sig_line = Table([['']], colWidths=[55*mm], rowHeights=[0.2*mm])
-    sig_line.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), slate_200)]))
+    sig_line.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,-1), SLATE_200)]))
     
     stamp_box = Table([['']], colWidths=[20*mm], rowHeights=[20*mm])
-    stamp_box.setStyle(TableStyle([('BOX',(0,0),(-1,-1),1,slate_100), ('DASH',(0,0),(-1,-1),(2,2))]))
+    stamp_box.setStyle(TableStyle([('BOX',(0,0),(-1,-1),1,SLATE_100), ('DASH',(0,0),(-1,-1),(2,2))]))
 
     footer_right = Table([
         [Paragraph("SERVED BY:", st['meta_label']), ''],
-        [Paragraph(f"<i>{getattr(payment, 'recorded_by', 'Finance Dept')}</i>", ParagraphStyle('PS', fontSize=10, fontName='Helvetica-Bold', textColor=slate_900, alignment=2)), ''],
-        [Paragraph("AUTHORIZED FINANCE OFFICER", ParagraphStyle('PO', fontSize=6, fontName='Courier', textColor=slate_400, alignment=2)), ''],
+        [Paragraph(f"<i>{getattr(payment, 'recorded_by', 'Finance Dept')}</i>", st['served_by']), ''],
+        [Paragraph("AUTHORIZED FINANCE OFFICER", st['officer']), ''],
         [Spacer(1, 4*mm), ''],
         [Paragraph("OFFICIAL SEAL / STAMP", st['meta_label']), stamp_box],
         [Spacer(1, 2*mm), ''],
-        [Paragraph(f"Date: {datetime.date.today().strftime('%Y-%m-%d')}", ParagraphStyle('PDD', fontSize=7, textColor=slate_400, alignment=2)), ''],
+        [Paragraph(f"Date: {datetime.date.today().strftime('%Y-%m-%d')}", st['footer_date']), ''],
         [sig_line, '']
     ], colWidths=[55*mm, 25*mm])
     footer_right.setStyle(TableStyle([('ALIGN', (0,0), (-1,-1), 'RIGHT'), ('VALIGN', (0,0), (-1,-1), 'BOTTOM')]))
 
     footer_main = Table([[footer_left, footer_right]], colWidths=[90*mm, 96*mm])
-    footer_main.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'TOP'), ('TOPPADDING', (0,0), (-1,-1), 5*mm), ('LINEABOVE', (0,0), (-1,-1), 1, slate_100)]))
+    footer_main.setStyle(TableStyle([('VALIGN', (0,0), (-1,-1), 'TOP'), ('TOPPADDING', (0,0), (-1,-1), 5*mm), ('LINEABOVE', (0,0), (-1,-1), 1, SLATE_100)]))
     elements.append(footer_main)
 
     elements.append(Spacer(1, 6*mm))
-    elements.append(Paragraph(f"{sc.school_name.upper()} - {datetime.date.today().year} - OFFICIAL DOCUMENT", ParagraphStyle('PC', fontSize=7, textColor=slate_200, alignment=1, tracking=4)))
+    elements.append(Paragraph(f"{sc.school_name.upper()} - {datetime.date.today().year} - OFFICIAL DOCUMENT", st['copyright']))
 
     def add_watermark(canvas, doc):
         canvas.saveState()
@@ -415,19 +461,23 @@ def generate_payment_receipt_qr(payment):
     img.save(buffer, format='PNG')
     return base64.b64encode(buffer.getvalue()).decode()
 
-def send_payment_receipt(payment):
+# Channels a receipt is delivered on; the receipt outbox sends one channel per row
+RECEIPT_CHANNELS = ('email', 'whatsapp')
+
+def send_payment_receipt(payment, channels=RECEIPT_CHANNELS):
     """
     Automatically send payment receipt to parent via email and/or WhatsApp
     Uses parent contact details from student record
+    `channels` limits delivery to some of RECEIPT_CHANNELS
     """
     try:
+        from config.models import SchoolConfig
         student = payment.student
+        sc = payment.school or SchoolConfig.get_config()
         
-        # Generate QR code for receipt
-        qr_code = generate_payment_receipt_qr(payment)
-        
-        # Generate PDF receipt
-        pdf_content = generate_payment_receipt(payment, qr_code)
+        # Generate PDF receipt (a file read when it was rendered before)
+        from schools.receipt_cache import payment_receipt_pdf
+        pdf_content = payment_receipt_pdf(payment)
         
         if not pdf_content:
             logger.error(f"Failed to generate PDF receipt for payment {payment.id}")
@@ -441,7 +491,7 @@ def send_payment_receipt(payment):
         }
         
         # Send via email if parent email exists
-        if student.parent_email:
+        if 'email' in channels and student.parent_email:
             try:
                 from django.template.loader import render_to_string
                 
@@ -505,7 +555,7 @@ Best regards,
                 logger.error(f"Email sending failed for payment {payment.id}: {error_msg}")
         
         # Send via WhatsApp if parent phone exists
-        if student.parent_phone:
+        if 'whatsapp' in channels and student.parent_phone:
             try:
                 from schools.utils.whatsapp import send_whatsapp_pdf, send_whatsapp_message
                 
@@ -636,7 +686,7 @@ def generate_transport_fee_receipt(fee, qr_code=None):
     accent_color = colors.HexColor('#f7fafc')  # Light background
     
     # Get styles
-    styles = getSampleStyleSheet()
+    styles = sample_styles()
     
     # Create custom styles (same as payment receipt)
     school_name_style = ParagraphStyle(
@@ -704,20 +754,13 @@ def generate_transport_fee_receipt(fee, qr_code=None):
     
     # Try to load school logo
     logo_image = None
-    possible_logo_paths = [
-        os.path.join(settings.STATIC_ROOT, 'images', 'logo.png'),
-        os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png'),
-        os.path.join(settings.BASE_DIR, 'schools', 'static', 'images', 'logo.png'),
-    ]
-    
-    for path in possible_logo_paths:
-        if os.path.exists(path):
-            try:
-                logo_image = Image(path, width=50*mm, height=50*mm)
-                break
-            except Exception as e:
-                print(f"Error loading logo from {path}: {e}")
-                logo_image = None
+    path = receipt_logo_path()
+    if path:
+        try:
+            logo_image = load_logo_image(path, width=50*mm, height=50*mm)
+        except Exception as e:
+            print(f"Error loading logo from {path}: {e}")
+            logo_image = None
     
     # School Header with Logo
     if logo_image:
@@ -986,7 +1029,7 @@ def generate_food_fee_receipt(fee, qr_code=None):
     accent_color = colors.HexColor('#f7fafc')  # Light background
     
     # Get styles
-    styles = getSampleStyleSheet()
+    styles = sample_styles()
     
     # Create custom styles (same as payment receipt)
     school_name_style = ParagraphStyle(
@@ -1054,20 +1097,13 @@ def generate_food_fee_receipt(fee, qr_code=None):
     
     # Try to load school logo
     logo_image = None
-    possible_logo_paths = [
-        os.path.join(settings.STATIC_ROOT, 'images', 'logo.png'),
-        os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png'),
-        os.path.join(settings.BASE_DIR, 'schools', 'static', 'images', 'logo.png'),
-    ]
-    
-    for path in possible_logo_paths:
-        if os.path.exists(path):
-            try:
-                logo_image = Image(path, width=50*mm, height=50*mm)
-                break
-            except Exception as e:
-                print(f"Error loading logo from {path}: {e}")
-                logo_image = None
+    path = receipt_logo_path()
+    if path:
+        try:
+            logo_image = load_logo_image(path, width=50*mm, height=50*mm)
+        except Exception as e:
+            print(f"Error loading logo from {path}: {e}")
+            logo_image = None
     
     # School Header with Logo
     if logo_image:
@@ -1370,7 +1406,7 @@ def generate_transport_payment_receipt(fee, qr_code=None):
     header_bg = colors.HexColor('#0ea5e9')  # Header background
     
     # Get styles
-    styles = getSampleStyleSheet()
+    styles = sample_styles()
     
     # Create custom styles
     school_name_style = ParagraphStyle(
@@ -1438,20 +1474,13 @@ def generate_transport_payment_receipt(fee, qr_code=None):
     
     # Try to load school logo
     logo_image = None
-    possible_logo_paths = [
-        os.path.join(settings.STATIC_ROOT, 'images', 'logo.png'),
-        os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png'),
-        os.path.join(settings.BASE_DIR, 'schools', 'static', 'images', 'logo.png'),
-    ]
-    
-    for path in possible_logo_paths:
-        if os.path.exists(path):
-            try:
-                logo_image = Image(path, width=50*mm, height=50*mm)
-                break
-            except Exception as e:
-                print(f"Error loading logo from {path}: {e}")
-                logo_image = None
+    path = receipt_logo_path()
+    if path:
+        try:
+            logo_image = load_logo_image(path, width=50*mm, height=50*mm)
+        except Exception as e:
+            print(f"Error loading logo from {path}: {e}")
+            logo_image = None
     
     # Beautiful Header with Gradient Background
     if logo_image:
@@ -1770,7 +1799,7 @@ def generate_meal_payment_receipt(payment, qr_code=None):
     meal_types = [p.get_meal_type_display() for p in all_payments]
     
     # Get styles
-    styles = getSampleStyleSheet()
+    styles = sample_styles()
     
     # Create custom styles
     school_name_style = ParagraphStyle(
@@ -1838,20 +1867,13 @@ def generate_meal_payment_receipt(payment, qr_code=None):
     
     # Try to load school logo
     logo_image = None
-    possible_logo_paths = [
-        os.path.join(settings.STATIC_ROOT, 'images', 'logo.png'),
-        os.path.join(settings.BASE_DIR, 'static', 'images', 'logo.png'),
-        os.path.join(settings.BASE_DIR, 'schools', 'static', 'images', 'logo.png'),
-    ]
-    
-    for path in possible_logo_paths:
-        if os.path.exists(path):
-            try:
-                logo_image = Image(path, width=50*mm, height=50*mm)
-                break
-            except Exception as e:
-                print(f"Error loading logo from {path}: {e}")
-                logo_image = None
+    path = receipt_logo_path()
+    if path:
+        try:
+            logo_image = load_logo_image(path, width=50*mm, height=50*mm)
+        except Exception as e:
+            print(f"Error loading logo from {path}: {e}")
+            logo_image = None
     
     # Beautiful Header with Gradient Background
     if logo_image:
@@ -2127,9 +2149,10 @@ def generate_meal_payment_receipt(payment, qr_code=None):
         buffer.close()
 
 
-def send_transport_fee_receipt(fee):
+def send_transport_fee_receipt(fee, channels=RECEIPT_CHANNELS):
     """
     Automatically send transport fee payment receipt to parent via email and/or WhatsApp
+    `channels` limits delivery to some of RECEIPT_CHANNELS
     """
     try:
         # Ensure fee is a model instance, not a dict
@@ -2144,23 +2167,11 @@ def send_transport_fee_receipt(fee):
         
         student = fee.student
         
-        # Generate QR code for receipt
-        try:
-            qr_data = {
-                'type': 'transport_fee',
-                'receipt_no': fee.reference_number,
-                'student_id': student.id,
-                'amount': str(fee.amount),
-                'date': fee.date.isoformat()
-            }
-            qr_code = generate_receipt_qr(qr_data)
-        except AttributeError as e:
-            logger.error(f"Error accessing fee attributes for QR code generation. Fee type: {type(fee)}, Fee: {fee}")
-            raise ValueError(f"Error accessing fee attributes: {str(e)}. Fee object type: {type(fee)}")
-        
         # Generate PDF receipt using the new beautiful transport receipt template
+        # (a file read when it was rendered before)
         try:
-            pdf_content = generate_transport_payment_receipt(fee, qr_code)
+            from schools.receipt_cache import transport_fee_receipt_pdf
+            pdf_content = transport_fee_receipt_pdf(fee)
         except (AttributeError, ValueError) as e:
             logger.error(f"Error in generate_transport_payment_receipt. Fee type: {type(fee)}, Fee ID: {getattr(fee, 'id', 'N/A')}")
             raise
@@ -2177,7 +2188,7 @@ def send_transport_fee_receipt(fee):
         }
         
         # Send via email if parent email exists
-        if student.parent_email:
+        if 'email' in channels and student.parent_email:
             try:
                 from django.template.loader import render_to_string
                 
@@ -2248,7 +2259,7 @@ Bishop Dr Mando International School
                 logger.error(f"Email sending failed for transport fee {fee.id}: {error_msg}")
         
         # Send via WhatsApp if parent phone exists
-        if student.parent_phone:
+        if 'whatsapp' in channels and student.parent_phone:
             try:
                 from schools.utils.whatsapp import send_whatsapp_message
                 
@@ -2302,9 +2313,10 @@ Thank you for your payment!"""
         return False, error_msg
 
 
-def send_food_fee_receipt(fee):
+def send_food_fee_receipt(fee, channels=RECEIPT_CHANNELS):
     """
     Automatically send food fee payment receipt to parent via email and/or WhatsApp
+    `channels` limits delivery to some of RECEIPT_CHANNELS
     """
     try:
         # Ensure fee is a model instance, not a dict
@@ -2319,23 +2331,11 @@ def send_food_fee_receipt(fee):
         
         student = fee.student
         
-        # Generate QR code for receipt
-        try:
-            qr_data = {
-                'type': 'food_fee',
-                'receipt_no': fee.reference_number,
-                'student_id': student.id,
-                'amount': str(fee.amount),
-                'date': fee.date.isoformat()
-            }
-            qr_code = generate_receipt_qr(qr_data)
-        except AttributeError as e:
-            logger.error(f"Error accessing fee attributes for QR code generation. Fee type: {type(fee)}, Fee: {fee}")
-            raise ValueError(f"Error accessing fee attributes: {str(e)}. Fee object type: {type(fee)}")
-        
         # Generate PDF receipt
+        # (a file read when it was rendered before)
         try:
-            pdf_content = generate_food_fee_receipt(fee, qr_code)
+            from schools.receipt_cache import food_fee_receipt_pdf
+            pdf_content = food_fee_receipt_pdf(fee)
         except (AttributeError, ValueError) as e:
             logger.error(f"Error in generate_food_fee_receipt. Fee type: {type(fee)}, Fee ID: {getattr(fee, 'id', 'N/A')}")
             raise
@@ -2352,7 +2352,7 @@ def send_food_fee_receipt(fee):
         }
         
         # Send via email if parent email exists
-        if student.parent_email:
+        if 'email' in channels and student.parent_email:
             try:
                 from django.template.loader import render_to_string
                 
@@ -2423,7 +2423,7 @@ Bishop Dr Mando International School
                 logger.error(f"Email sending failed for food fee {fee.id}: {error_msg}")
         
         # Send via WhatsApp if parent phone exists
-        if student.parent_phone:
+        if 'whatsapp' in channels and student.parent_phone:
             try:
                 from schools.utils.whatsapp import send_whatsapp_message
                 
@@ -2476,10 +2476,11 @@ Thank you for your payment!"""
         logger.error(f"Error in send_food_fee_receipt for fee {fee_id}: {error_msg}")
         return False, error_msg
 
-def send_meal_payment_receipt(payment):
+def send_meal_payment_receipt(payment, channels=RECEIPT_CHANNELS):
     """
     Automatically send meal payment receipt to parent via email and/or WhatsApp
     Uses parent contact details from student record
+    `channels` limits delivery to some of RECEIPT_CHANNELS
     """
     try:
         # Ensure payment is a model instance
@@ -2494,23 +2495,11 @@ def send_meal_payment_receipt(payment):
         
         student = payment.student
         
-        # Generate QR code for receipt
-        try:
-            qr_data = {
-                'type': 'meal_payment',
-                'receipt_no': payment.reference_number,
-                'student_id': student.id,
-                'amount': str(payment.amount),
-                'date': payment.payment_date.isoformat()
-            }
-            qr_code = generate_receipt_qr(qr_data)
-        except AttributeError as e:
-            logger.error(f"Error accessing payment attributes for QR code generation. Payment type: {type(payment)}, Payment: {payment}")
-            raise ValueError(f"Error accessing payment attributes: {str(e)}. Payment object type: {type(payment)}")
-        
         # Generate PDF receipt using the new beautiful meal payment receipt template
+        # (a file read when it was rendered before)
         try:
-            pdf_content = generate_meal_payment_receipt(payment, qr_code)
+            from schools.receipt_cache import meal_payment_receipt_pdf
+            pdf_content = meal_payment_receipt_pdf(payment)
         except (AttributeError, ValueError) as e:
             logger.error(f"Error in generate_meal_payment_receipt. Payment type: {type(payment)}, Payment ID: {getattr(payment, 'id', 'N/A')}")
             raise
@@ -2542,7 +2531,7 @@ def send_meal_payment_receipt(payment):
         meal_types_str = ', '.join(meal_types) if len(meal_types) > 1 else meal_types[0]
         
         # Send via email if parent email exists
-        if student.parent_email:
+        if 'email' in channels and student.parent_email:
             try:
                 from django.template.loader import render_to_string
                 
@@ -2615,7 +2604,7 @@ Bishop Dr Mando International School
                 logger.error(f"Email sending failed for meal payment {payment.id}: {error_msg}")
         
         # Send via WhatsApp if parent phone exists
-        if student.parent_phone:
+        if 'whatsapp' in channels and student.parent_phone:
             try:
                 from schools.utils.whatsapp import send_whatsapp_message
                 
@@ -28,6 +28,9 @@ if _utils_file.exists():
         send_transport_fee_receipt = utils_module.send_transport_fee_receipt
         send_food_fee_receipt = utils_module.send_food_fee_receipt
         send_meal_payment_receipt = utils_module.send_meal_payment_receipt
+        generate_transport_payment_receipt = utils_module.generate_transport_payment_receipt
+        generate_meal_payment_receipt = utils_module.generate_meal_payment_receipt
+        receipt_logo_path = utils_module.receipt_logo_path
         
         __all__ = [
             'generate_payment_receipt', 
@@ -37,7 +40,10 @@ if _utils_file.exists():
             'generate_food_fee_receipt',
             'send_transport_fee_receipt',
             'send_food_fee_receipt',
-            'send_meal_payment_receipt'
+            'send_meal_payment_receipt',
+            'generate_transport_payment_receipt',
+            'generate_meal_payment_receipt',
+            'receipt_logo_path'
         ]
     else:
         raise ImportError("Could not load utils.py module")
@@ -0,0 +1,103 @@
+"""
+Database-backed cache for geocoding lookups (Nominatim and Google Maps).
+
+Every forward geocode, reverse geocode and address search goes through
+lookup(), which answers from the GeocodeCache table while the stored answer
+is fresh and only calls the provider on a miss. Addresses are keyed on
+their normalized text (case, spacing and punctuation do not matter) and
+coordinates on their value rounded to COORD_PRECISION decimals (about
+11 m), so pickup-point autocomplete and reverse lookups of a bus that is
+parked or crawling are served locally after the first request.
+
+"No result" answers are cached too, for the shorter GEOCODE_NEGATIVE_TTL.
+Provider errors are never cached: the last stored answer is returned even
+if it has expired, and without one the error propagates to the caller.
+"""
+import hashlib
+import logging
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+GEOCODE = 'geocode'
+REVERSE = 'reverse'
+SEARCH = 'search'
+
+DEFAULT_TTL = 30 * 24 * 60 * 60
+NEGATIVE_TTL = 24 * 60 * 60
+COORD_PRECISION = 4
+
+
+def normalize_address(text):
+    """Lower-case an address and collapse its spacing and separators"""
+    text = re.sub(r'\s*[,;]+\s*', ', ', str(text or '').casefold())
+    return re.sub(r'\s+', ' ', text).strip(' ,.')
+
+
+def coord_key(lat, lng, precision=COORD_PRECISION):
+    """Cache key text of a coordinate pair, rounded to `precision` decimals"""
+    return f"{round(float(lat), precision):.{precision}f},{round(float(lng), precision):.{precision}f}"
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _empty(result):
+    return result is None or result == []
+
+
+def lookup(provider, kind, query, fetch):
+    """
+    The provider's answer for `query` (already normalized or rounded).
+    `fetch()` is only called when there is no fresh answer; it returns the
+    provider's result (None or [] for "not found") as JSON-serializable
+    data and raises on errors.
+    """
+    from ..models import GeocodeCache
+
+    key = _digest(query)
+    now = timezone.now()
+    try:
+        entry = GeocodeCache.objects.filter(provider=provider, kind=kind, key=key).first()
+    except DatabaseError as e:
+        # The cache is an optimization; a missing table must not break geocoding
+        logger.warning(f"Geocode cache unavailable: {e}")
+        return fetch()
+    if entry is not None and entry.expires_at > now:
+        return entry.result
+
+    try:
+        result = fetch()
+    except Exception:
+        if entry is not None:
+            logger.warning(f"{provider} {kind} failed, serving the expired answer for {query!r}")
+            return entry.result
+        raise
+
+    if _empty(result):
+        ttl = getattr(settings, 'GEOCODE_NEGATIVE_TTL', NEGATIVE_TTL)
+    else:
+        ttl = getattr(settings, 'GEOCODE_CACHE_TTL', DEFAULT_TTL)
+    try:
+        GeocodeCache.objects.update_or_create(
+            provider=provider, kind=kind, key=key,
+            defaults={'query': query[:255], 'result': result, 'expires_at': now + timedelta(seconds=ttl)},
+        )
+    except DatabaseError as e:
+        # Lost an insert race with another worker, or the table is unavailable
+        logger.warning(f"Could not cache {provider} {kind} for {query!r}: {e}")
+    return result
+
+
+def purge_expired():
+    """Delete expired answers. Returns the number of rows removed."""
+    from ..models import GeocodeCache
+
+    deleted, _ = GeocodeCache.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,320 @@
+"""
+Shared HTTP client for the outbound integrations (Termii SMS, WhatsApp
+Cloud API, Paystack, M-Pesa Daraja, Google Maps and Nominatim).
+
+Every provider gets one pooled requests.Session per process, so calls
+reuse keep-alive TLS connections instead of opening a new one each time,
+and every call goes through the provider's limits:
+
+- a concurrency cap (a semaphore sized like the connection pool);
+- a rate limit (token bucket of `rate` requests per second). With
+  `shared_rate` the bucket lives in the Django cache, so all worker
+  processes draw from one budget (Nominatim allows 1 request per second
+  per application, not per process); a call that would have to wait more
+  than `max_wait` seconds for a token raises RateLimitedError instead of
+  blocking the worker;
+- default (connect, read) timeouts;
+- a circuit breaker that fails fast with CircuitOpenError after
+  `failure_threshold` consecutive network errors or 5xx answers, and lets a
+  single trial request through once `reset_after` seconds have passed;
+- latency and error counters, read with provider_metrics().
+
+fan_out() runs a function over many items on a thread pool bounded by the
+provider's concurrency cap, for bulk sends.
+
+Limits can be tuned per provider with settings.INTEGRATIONS, e.g.
+{'termii': {'max_concurrency': 4, 'rate': 5}}. Setting 'base_url' there
+sends that provider's traffic to another host (a local stub server in
+tests) while keeping the request paths.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'max_concurrency': 4,
+    'rate': 10,  # requests per second
+    'burst': 10,
+    'timeout': (5, 30),  # (connect, read) seconds
+    'failure_threshold': 5,
+    'reset_after': 30,  # seconds the circuit stays open
+    'base_url': None,
+    'shared_rate': False,  # keep the token bucket in the shared cache
+    'max_wait': None,  # seconds a call may wait for a token before RateLimitedError
+}
+
+PROVIDERS = {
+    'termii': {'max_concurrency': 8, 'rate': 20, 'burst': 20},
+    'whatsapp': {'max_concurrency': 8, 'rate': 20, 'burst': 20},
+    'paystack': {'max_concurrency': 4, 'timeout': (5, 15)},
+    'mpesa': {'max_concurrency': 4, 'timeout': (5, 15)},
+    'google_maps': {'max_concurrency': 4, 'rate': 10, 'timeout': (5, 10), 'shared_rate': True, 'max_wait': 5},
+    # Nominatim usage policy: at most 1 request per second
+    'nominatim': {'max_concurrency': 1, 'rate': 1, 'burst': 1, 'timeout': (5, 10), 'shared_rate': True, 'max_wait': 3},
+}
+
+LATENCY_SAMPLES = 200
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a provider whose circuit is open"""
+
+
+class RateLimitedError(requests.exceptions.ConnectionError):
+    """Raised instead of waiting longer than `max_wait` for a rate-limit token"""
+
+
+class _TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class _SharedTokenBucket:
+    """
+    Token bucket whose state is kept in the Django cache. Each caller takes
+    its token under a short cache.add() lock and then sleeps off its own
+    wait outside the lock; the token count may go negative, which queues
+    later callers behind earlier ones.
+    """
+    LOCK_TIMEOUT = 2
+    POLL_INTERVAL = 0.01
+
+    def __init__(self, name, rate, burst, max_wait=None):
+        self.name = name
+        self.key = f'integration_bucket_{name}'
+        self.lock_key = f'{self.key}_lock'
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self.max_wait = max_wait
+
+    def _reserve(self):
+        now = time.time()
+        state = cache.get(self.key) or {'tokens': self.capacity, 'updated': now}
+        tokens = min(self.capacity, state['tokens'] + max(now - state['updated'], 0) * self.rate)
+        wait = max(1 - tokens, 0) / self.rate
+        if self.max_wait is not None and wait > self.max_wait:
+            return None
+        cache.set(self.key, {'tokens': tokens - 1, 'updated': now}, timeout=max(int(self.capacity / self.rate) + 60, 60))
+        return wait
+
+    def acquire(self):
+        deadline = time.time() + self.LOCK_TIMEOUT
+        while not cache.add(self.lock_key, 1, self.LOCK_TIMEOUT):
+            if time.time() >= deadline:
+                # The holder died without releasing; its lock expires on its own
+                break
+            time.sleep(self.POLL_INTERVAL)
+        try:
+            wait = self._reserve()
+        finally:
+            cache.delete(self.lock_key)
+        if wait is None:
+            raise RateLimitedError(f"{self.name} rate limit reached, try again shortly")
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ProviderClient:
+    """Pooled session plus limits, circuit breaker and metrics for one provider"""
+
+    def __init__(self, name, **options):
+        self.name = name
+        self.options = options
+        self.timeout = options['timeout']
+        self.base_url = options['base_url']
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=options['max_concurrency'])
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.slots = threading.BoundedSemaphore(options['max_concurrency'])
+        self.bucket = None
+        if options['rate'] and options['shared_rate']:
+            self.bucket = _SharedTokenBucket(name, options['rate'], options['burst'], options['max_wait'])
+        elif options['rate']:
+            self.bucket = _TokenBucket(options['rate'], options['burst'])
+
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.last_error = None
+
+    # Circuit breaker
+
+    def _allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.options['reset_after'] or self.trial_in_flight:
+                self.rejected += 1
+                return False
+            # Half-open: let one trial request through
+            self.trial_in_flight = True
+            return True
+
+    def _record(self, elapsed, failed, error=None):
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(elapsed)
+            self.total_latency += elapsed
+            self.max_latency = max(self.max_latency, elapsed)
+            self.trial_in_flight = False
+            if failed:
+                self.errors += 1
+                self.last_error = error
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= self.options['failure_threshold']:
+                    if self.opened_at is None:
+                        logger.warning(f"{self.name}: circuit opened after {self.consecutive_failures} failures")
+                    self.opened_at = time.monotonic()
+            else:
+                if self.opened_at is not None:
+                    logger.info(f"{self.name}: circuit closed")
+                self.consecutive_failures = 0
+                self.opened_at = None
+
+    def _url(self, url):
+        if not self.base_url:
+            return url
+        base = urlsplit(self.base_url)
+        parts = urlsplit(url)
+        return urlunsplit((base.scheme, base.netloc, base.path.rstrip('/') + parts.path, parts.query, parts.fragment))
+
+    def request(self, method, url, **kwargs):
+        if not self._allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open after repeated failures)")
+        kwargs.setdefault('timeout', self.timeout)
+        if self.bucket:
+            try:
+                self.bucket.acquire()
+            except Exception:
+                # No request was made, so a half-open trial must not stay claimed
+                with self.lock:
+                    self.trial_in_flight = False
+                raise
+        with self.slots:
+            with self.lock:
+                self.in_flight += 1
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, self._url(url), **kwargs)
+            except Exception as e:
+                self._record(time.monotonic() - started, True, str(e))
+                raise
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+        failed = response.status_code >= 500
+        self._record(time.monotonic() - started, failed, f"HTTP {response.status_code}" if failed else None)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def metrics(self):
+        with self.lock:
+            samples = sorted(self.latencies)
+            state = 'closed'
+            if self.opened_at is not None:
+                state = 'half-open' if time.monotonic() - self.opened_at >= self.options['reset_after'] else 'open'
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'in_flight': self.in_flight,
+                'avg_ms': round(self.total_latency * 1000 / self.requests, 1) if self.requests else None,
+                'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1) if samples else None,
+                'max_ms': round(self.max_latency * 1000, 1) if self.requests else None,
+                'circuit': state,
+                'last_error': self.last_error,
+            }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def provider_options(name):
+    options = dict(DEFAULTS)
+    options.update(PROVIDERS.get(name, {}))
+    options.update(getattr(settings, 'INTEGRATIONS', {}).get(name, {}))
+    return options
+
+
+def get_client(name):
+    """The process-wide ProviderClient for `name`"""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = ProviderClient(name, **provider_options(name))
+    return client
+
+
+def reset_clients():
+    """Drop every client (settings changed, or between tests)"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.session.close()
+        _clients.clear()
+
+
+def fan_out(name, func, items, max_workers=None):
+    """
+    Call func(item) for every item on a thread pool no wider than the
+    provider's concurrency cap and return the results in input order.
+    func must not touch the database; threads do not share the request's
+    connection.
+    """
+    items = list(items)
+    if not items:
+        return []
+    workers = min(max_workers or provider_options(name)['max_concurrency'], len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'{name}-send') as pool:
+        return list(pool.map(func, items))
+
+
+def provider_metrics():
+    """Latency/error counters of every provider used by this process"""
+    return {name: client.metrics() for name, client in list(_clients.items())}
@@ -1,11 +1,17 @@
 """
 Map utilities for route management and geocoding
 Uses Google Maps API
+
+Geocoding answers are cached in the database (see geocache); directions
+are not, as they depend on live traffic.
 """
 import requests
 import logging
 from django.conf import settings
 
+from . import geocache
+from .integrations import get_client
+
 logger = logging.getLogger(__name__)
 
 GOOGLE_MAPS_API_KEY = getattr(settings, 'GOOGLE_MAPS_API_KEY', '')
@@ -27,21 +33,29 @@ def geocode_address(address):
         logger.warning("Google Maps API key not configured")
         return None, None
     
-    try:
+    def fetch():
         params = {
             'address': address,
             'key': GOOGLE_MAPS_API_KEY
         }
-        response = requests.get(GEOCODE_URL, params=params, timeout=10)
+        response = get_client('google_maps').get(GEOCODE_URL, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
         if data.get('status') == 'OK' and data.get('results'):
             location = data['results'][0]['geometry']['location']
-            return float(location['lat']), float(location['lng'])
-        else:
-            logger.warning(f"Google Geocoding failed for address: {address}, status: {data.get('status')}")
-            return None, None
+            return [float(location['lat']), float(location['lng'])]
+        if data.get('status') == 'ZERO_RESULTS':
+            return None
+        # OVER_QUERY_LIMIT, REQUEST_DENIED, ...: not an answer worth caching
+        raise ValueError(f"status {data.get('status')}")
+
+    try:
+        location = geocache.lookup('google_maps', geocache.GEOCODE, geocache.normalize_address(address), fetch)
+        if location:
+            return location[0], location[1]
+        logger.warning(f"Google Geocoding found no result for address: {address}")
+        return None, None
     except requests.exceptions.RequestException as e:
         logger.error(f"Error during Google Geocoding for {address}: {e}")
         return None, None
@@ -86,7 +100,7 @@ def get_directions(origin, destination, waypoints=None):
             waypoint_str = '|'.join([format_coord(wp) for wp in waypoints])
             params['waypoints'] = waypoint_str
         
-        response = requests.get(DIRECTIONS_URL, params=params, timeout=10)
+        response = get_client('google_maps').get(DIRECTIONS_URL, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -134,20 +148,26 @@ def reverse_geocode(lat, lng):
         logger.warning("Google Maps API key not configured")
         return None
     
-    try:
+    def fetch():
         params = {
             'latlng': f"{lat},{lng}",
             'key': GOOGLE_MAPS_API_KEY
         }
-        response = requests.get(GEOCODE_URL, params=params, timeout=10)
+        response = get_client('google_maps').get(GEOCODE_URL, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
         if data.get('status') == 'OK' and data.get('results'):
             return data['results'][0]['formatted_address']
-        else:
-            logger.warning(f"Google Reverse Geocoding failed for {lat},{lng}, status: {data.get('status')}")
+        if data.get('status') == 'ZERO_RESULTS':
             return None
+        raise ValueError(f"status {data.get('status')}")
+
+    try:
+        address = geocache.lookup('google_maps', geocache.REVERSE, geocache.coord_key(lat, lng), fetch)
+        if not address:
+            logger.warning(f"Google Reverse Geocoding found no result for {lat},{lng}")
+        return address
     except requests.exceptions.RequestException as e:
         logger.error(f"Error during reverse geocoding for {lat},{lng}: {e}")
         return None
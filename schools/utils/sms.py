@@ -1,6 +1,7 @@
 import requests
 from django.conf import settings
 import logging
+from .integrations import CircuitOpenError, fan_out, get_client
 
 logger = logging.getLogger(__name__)
 
@@ -63,85 +64,16 @@ def send_bulk_sms(phone_numbers, message):
         
         logger.info(f"Attempting to send SMS via Termii to {len(formatted_numbers)} recipients")
         
-        # Termii API endpoint
-        url = "https://api.ng.termii.com/api/sms/send"
-        
         # Send to each recipient (Termii's single send endpoint)
         results = []
         success_count = 0
         
-        for number in formatted_numbers:
-            try:
-                # Prepare payload
-                payload = {
-                    "to": number,
-                    "from": sender_id,
-                    "sms": message,
-                    "type": "plain",
-                    "channel": "dnd",  # Use 'dnd' for transactional, 'generic' for promotional
-                    "api_key": api_key
-                }
-                
-                headers = {
-                    'Content-Type': 'application/json'
-                }
-                
-                # Make the request
-                response = requests.post(url, headers=headers, json=payload, timeout=30)
-                
-                logger.info(f"Termii response for {number}: Status {response.status_code}, Body: {response.text}")
-                
-                if response.status_code in [200, 201]:
-                    try:
-                        result = response.json()
-                        if result.get('code') == 'ok' or result.get('message') == 'Successfully Sent':
-                            logger.info(f"SMS sent to {number}, Message ID: {result.get('message_id')}")
-                            results.append({
-                                'number': number,
-                                'status': 'Success',
-                                'message_id': result.get('message_id'),
-                                'balance': result.get('balance'),
-                                'code': result.get('code')
-                            })
-                            success_count += 1
-                        else:
-                            error_msg = result.get('message', 'Unknown error')
-                            logger.error(f"Failed to send SMS to {number}: {error_msg}")
-                            results.append({
-                                'number': number,
-                                'status': 'Failed',
-                                'error': error_msg
-                            })
-                    except ValueError:
-                        # Response is not JSON
-                        logger.info(f"SMS sent to {number} (non-JSON response)")
-                        results.append({
-                            'number': number,
-                            'status': 'Success',
-                            'raw_response': response.text
-                        })
-                        success_count += 1
-                else:
-                    error_msg = f"HTTP {response.status_code}: {response.text}"
-                    logger.error(f"Failed to send SMS to {number}: {error_msg}")
-                    results.append({
-                        'number': number,
-                        'status': 'Failed',
-                        'error': error_msg
-                    })
-                    
-            except requests.exceptions.Timeout:
-                error_msg = "Request timed out"
-                logger.error(f"Timeout sending to {number}")
-                results.append({'number': number, 'status': 'Failed', 'error': error_msg})
-            except requests.exceptions.RequestException as e:
-                error_msg = f"Request failed: {str(e)}"
-                logger.error(f"Request error for {number}: {error_msg}")
-                results.append({'number': number, 'status': 'Failed', 'error': error_msg})
-            except Exception as e:
-                error_msg = f"Unexpected error: {str(e)}"
-                logger.error(f"Unexpected error for {number}: {error_msg}", exc_info=True)
-                results.append({'number': number, 'status': 'Failed', 'error': error_msg})
+        # Bounded parallel fan-out over the pooled Termii session
+        for result in fan_out('termii', lambda number: send_termii_message(number, message, api_key, sender_id),
+                              formatted_numbers):
+            results.append(result)
+            if result['status'] == 'Success':
+                success_count += 1
         
         if success_count > 0:
             return True, {
@@ -160,6 +92,81 @@ def send_bulk_sms(phone_numbers, message):
         logger.error(f"SMS sending failed: {error_msg}", exc_info=True)
         return False, f"Failed to send SMS: {error_msg}"
 
+TERMII_SEND_URL = "https://api.ng.termii.com/api/sms/send"
+
+def send_termii_message(number, message, api_key, sender_id, timeout=30):
+    """
+    Send one SMS to an already formatted number through Termii.
+
+    Returns a result dict with 'number', 'status' ('Success' or 'Failed') and
+    either the provider's message details or an 'error'. Failed results carry
+    'retryable': True when the failure was on the network or provider side
+    (timeouts, connection errors, HTTP 429/5xx) and the send may succeed later.
+    """
+    try:
+        # Prepare payload
+        payload = {
+            "to": number,
+            "from": sender_id,
+            "sms": message,
+            "type": "plain",
+            "channel": "dnd",  # Use 'dnd' for transactional, 'generic' for promotional
+            "api_key": api_key
+        }
+        
+        headers = {
+            'Content-Type': 'application/json'
+        }
+        
+        # Make the request
+        response = get_client('termii').post(TERMII_SEND_URL, headers=headers, json=payload, timeout=timeout)
+        
+        logger.info(f"Termii response for {number}: Status {response.status_code}, Body: {response.text}")
+        
+        if response.status_code in [200, 201]:
+            try:
+                result = response.json()
+            except ValueError:
+                # Response is not JSON
+                logger.info(f"SMS sent to {number} (non-JSON response)")
+                return {'number': number, 'status': 'Success', 'raw_response': response.text}
+            if result.get('code') == 'ok' or result.get('message') == 'Successfully Sent':
+                logger.info(f"SMS sent to {number}, Message ID: {result.get('message_id')}")
+                return {
+                    'number': number,
+                    'status': 'Success',
+                    'message_id': result.get('message_id'),
+                    'balance': result.get('balance'),
+                    'code': result.get('code')
+                }
+            error_msg = result.get('message', 'Unknown error')
+            logger.error(f"Failed to send SMS to {number}: {error_msg}")
+            return {'number': number, 'status': 'Failed', 'error': error_msg, 'retryable': False}
+        
+        error_msg = f"HTTP {response.status_code}: {response.text}"
+        logger.error(f"Failed to send SMS to {number}: {error_msg}")
+        return {
+            'number': number,
+            'status': 'Failed',
+            'error': error_msg,
+            'retryable': response.status_code == 429 or response.status_code >= 500
+        }
+            
+    except CircuitOpenError as e:
+        logger.error(f"Not sending to {number}: {str(e)}")
+        return {'number': number, 'status': 'Failed', 'error': str(e), 'retryable': True}
+    except requests.exceptions.Timeout:
+        logger.error(f"Timeout sending to {number}")
+        return {'number': number, 'status': 'Failed', 'error': "Request timed out", 'retryable': True}
+    except requests.exceptions.RequestException as e:
+        error_msg = f"Request failed: {str(e)}"
+        logger.error(f"Request error for {number}: {error_msg}")
+        return {'number': number, 'status': 'Failed', 'error': error_msg, 'retryable': True}
+    except Exception as e:
+        error_msg = f"Unexpected error: {str(e)}"
+        logger.error(f"Unexpected error for {number}: {error_msg}", exc_info=True)
+        return {'number': number, 'status': 'Failed', 'error': error_msg, 'retryable': False}
+
 def format_phone_number(phone):
     """
     Format phone number to international format (E.164)
@@ -0,0 +1,118 @@
+"""
+Access-token cache for provider credentials (M-Pesa Daraja OAuth today).
+
+get_token(name, fetch, credentials) returns a cached token and only calls
+`fetch()` -> (token, expires_in) when there is none or it is about to
+expire. Tokens are kept in a process-local dict in front of the shared
+Django cache, so most calls cost neither a cache read nor an HTTP round
+trip, and a token fetched by one worker process is reused by the others.
+
+A token is renewed REFRESH_MARGIN seconds (at most half its lifetime)
+before `expires_in` runs out. Renewal is single-flight: a thread lock per
+token inside the process and a cache.add() lock across processes, so a
+burst of concurrent STK pushes triggers one token request. Callers that
+lose the race keep using the still-valid token, or wait up to
+WAIT_FOR_REFRESH seconds for the winner's.
+
+Any provider whose credentials are exchanged for expiring bearer tokens can
+use the same helper with its own `fetch`; the cache key includes a hash of
+the credentials so tenants or rotated keys never share a token.
+"""
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache
+
+REFRESH_MARGIN = 120  # seconds before expiry a token is renewed
+LOCK_TIMEOUT = 30  # seconds a cross-process refresh lock is held at most
+WAIT_FOR_REFRESH = 10  # seconds to wait for another process's refresh
+POLL_INTERVAL = 0.1
+
+_local = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _cache_key(name, credentials):
+    digest = hashlib.sha256(f'{name}:{credentials}'.encode()).hexdigest()[:16]
+    return f'provider_token_{name}_{digest}'
+
+
+def _lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _entry(token, expires_in):
+    now = time.time()
+    expires_in = max(int(expires_in), 1)
+    return {
+        'token': token,
+        'expires_at': now + expires_in,
+        'refresh_at': now + expires_in - min(REFRESH_MARGIN, expires_in / 2),
+    }
+
+
+def _fresh(entry, now):
+    return bool(entry) and now < entry['refresh_at']
+
+
+def _valid(entry, now):
+    return bool(entry) and now < entry['expires_at']
+
+
+def _store(key, entry):
+    _local[key] = entry
+    cache.set(key, entry, timeout=max(int(entry['expires_at'] - time.time()), 1))
+
+
+def get_token(name, fetch, credentials='', force_refresh=False):
+    """
+    Cached token for `name`. `fetch` is only called when the token is
+    missing, due for renewal, or `force_refresh` is set (e.g. after the
+    provider answered 401); its exceptions propagate to the caller.
+    """
+    key = _cache_key(name, credentials)
+    entry = _local.get(key)
+    if not force_refresh and _fresh(entry, time.time()):
+        return entry['token']
+
+    with _lock(key):
+        now = time.time()
+        stale = _local.get(key)
+        if not force_refresh and _fresh(stale, now):
+            return stale['token']
+        shared = cache.get(key)
+        if shared and (not force_refresh or not stale or shared['token'] != stale['token']) and _fresh(shared, now):
+            _local[key] = shared
+            return shared['token']
+        rejected = stale['token'] if force_refresh and stale else None
+
+        lock_key = f'{key}_refresh'
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            # Another process is renewing: a token that has not expired yet is still good
+            for candidate in (shared, stale):
+                if _valid(candidate, now) and candidate['token'] != rejected:
+                    return candidate['token']
+            deadline = now + WAIT_FOR_REFRESH
+            while time.time() < deadline:
+                time.sleep(POLL_INTERVAL)
+                shared = cache.get(key)
+                if _valid(shared, time.time()) and shared['token'] != rejected:
+                    _local[key] = shared
+                    return shared['token']
+            # The other refresh never landed; fetch our own
+
+        try:
+            token, expires_in = fetch()
+            _store(key, _entry(token, expires_in))
+            return token
+        finally:
+            cache.delete(lock_key)
+
+
+def invalidate_token(name, credentials=''):
+    key = _cache_key(name, credentials)
+    _local.pop(key, None)
+    cache.delete(key)
@@ -1,13 +1,20 @@
 """
 WhatsApp Business API integration using Meta's WhatsApp Cloud API
 """
+import hashlib
 import requests
 import json
 from django.conf import settings
+from django.core.cache import cache
 import logging
+from .integrations import fan_out, get_client
 
 logger = logging.getLogger(__name__)
 
+# Uploaded media stays on WhatsApp for 30 days; reuse a document's media ID
+# for a little less than that instead of uploading the same PDF again
+MEDIA_ID_TTL = 25 * 24 * 60 * 60
+
 def format_phone_number(phone):
     """
     Format phone number to international format for WhatsApp
@@ -101,7 +108,7 @@ def send_whatsapp_message(phone_number, message):
         
         # Make API request with connection verification
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = get_client('whatsapp').post(url, headers=headers, json=payload, timeout=30)
         except requests.exceptions.ConnectionError as e:
             # Provide more detailed error information
             error_details = str(e)
@@ -200,6 +207,45 @@ def send_whatsapp_message(phone_number, message):
         logger.error(f"WhatsApp unexpected error: {str(e)}")
         return False, error_msg
 
+def upload_whatsapp_media(pdf_bytes, filename="receipt.pdf"):
+    """
+    Upload a PDF to the WhatsApp media endpoint
+
+    Returns:
+        tuple: (media_id or None, error message or None)
+    """
+    phone_number_id = getattr(settings, 'WHATSAPP_PHONE_NUMBER_ID', None)
+    access_token = getattr(settings, 'WHATSAPP_ACCESS_TOKEN', None)
+    api_version = getattr(settings, 'WHATSAPP_API_VERSION', 'v22.0')
+
+    upload_url = f"https://graph.facebook.com/{api_version}/{phone_number_id}/media"
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+    }
+    files = {
+        'file': (filename, pdf_bytes, 'application/pdf'),
+        'type': (None, 'document'),
+        'messaging_product': (None, 'whatsapp'),
+    }
+
+    logger.info(f"Uploading PDF {filename} to WhatsApp API")
+    upload_response = get_client('whatsapp').post(upload_url, headers=headers, files=files, timeout=30)
+
+    if upload_response.status_code != 200:
+        error_data = upload_response.json() if upload_response.text else {}
+        error_info = error_data.get('error', {})
+        error_message = error_info.get('message', f"HTTP {upload_response.status_code}: {upload_response.text}")
+        logger.error(f"WhatsApp media upload failed: {error_message}")
+        return None, error_message
+
+    media_id = upload_response.json().get('id')
+    if not media_id:
+        logger.error("No media ID returned from WhatsApp upload")
+        return None, "Failed to upload PDF to WhatsApp"
+
+    logger.info(f"PDF uploaded successfully. Media ID: {media_id}")
+    return media_id, None
+
 def send_whatsapp_pdf(phone_number, pdf_content, filename="receipt.pdf", caption=None):
     """
     Send PDF document via WhatsApp using Meta's WhatsApp Business API
@@ -241,38 +287,18 @@ def send_whatsapp_pdf(phone_number, pdf_content, filename="receipt.pdf", caption
         else:
             return False, "PDF content must be bytes or BytesIO"
         
-        # WhatsApp API endpoint for media upload
-        # First, upload the media to get a media ID
-        upload_url = f"https://graph.facebook.com/{api_version}/{phone_number_id}/media"
-        
-        headers = {
-            'Authorization': f'Bearer {access_token}',
-        }
-        
-        # Upload the PDF file
-        files = {
-            'file': (filename, pdf_bytes, 'application/pdf'),
-            'type': (None, 'document'),
-            'messaging_product': (None, 'whatsapp'),
-        }
-        
-        logger.info(f"Uploading PDF to WhatsApp API for {formatted_number}")
-        
-        upload_response = requests.post(upload_url, headers=headers, files=files, timeout=30)
-        
-        if upload_response.status_code != 200:
-            error_data = upload_response.json() if upload_response.text else {}
-            error_info = error_data.get('error', {})
-            error_message = error_info.get('message', f"HTTP {upload_response.status_code}: {upload_response.text}")
-            logger.error(f"WhatsApp media upload failed: {error_message}")
-            return False, error_message
-        
-        media_id = upload_response.json().get('id')
-        if not media_id:
-            logger.error("No media ID returned from WhatsApp upload")
-            return False, "Failed to upload PDF to WhatsApp"
-        
-        logger.info(f"PDF uploaded successfully. Media ID: {media_id}")
+        # Identical documents (a receipt re-sent, or sent again after a failed
+        # message) reuse the media ID of the first upload
+        media_key = f"whatsapp_media_{phone_number_id}_{hashlib.sha256(pdf_bytes).hexdigest()}"
+        media_id = cache.get(media_key)
+        reused = bool(media_id)
+        if reused:
+            logger.info(f"Reusing uploaded WhatsApp media {media_id} for {formatted_number}")
+        else:
+            media_id, error_message = upload_whatsapp_media(pdf_bytes, filename)
+            if not media_id:
+                return False, error_message
+            cache.set(media_key, media_id, MEDIA_ID_TTL)
         
         # Now send the document message
         message_url = f"https://graph.facebook.com/{api_version}/{phone_number_id}/messages"
@@ -299,7 +325,7 @@ def send_whatsapp_pdf(phone_number, pdf_content, filename="receipt.pdf", caption
         
         logger.info(f"Sending document message to {formatted_number}")
         
-        message_response = requests.post(message_url, headers=message_headers, json=payload, timeout=30)
+        message_response = get_client('whatsapp').post(message_url, headers=message_headers, json=payload, timeout=30)
         
         if message_response.status_code == 200:
             response_data = message_response.json()
@@ -314,6 +340,10 @@ def send_whatsapp_pdf(phone_number, pdf_content, filename="receipt.pdf", caption
             error_info = error_data.get('error', {})
             error_message = error_info.get('message', f"HTTP {message_response.status_code}: {message_response.text}")
             logger.error(f"WhatsApp document send failed: {error_message}")
+            if reused and 'media' in str(error_message).lower():
+                # The stored media ID has expired or was rejected: upload the document afresh once
+                cache.delete(media_key)
+                return send_whatsapp_pdf(phone_number, pdf_bytes, filename=filename, caption=caption)
             return False, error_message
             
     except requests.exceptions.ConnectionError as e:
@@ -357,9 +387,9 @@ def send_bulk_whatsapp(phone_numbers, message):
             'total': len(phone_numbers)
         }
         
-        # Send to each recipient
-        for phone_number in phone_numbers:
-            success, response = send_whatsapp_message(phone_number, message)
+        # Send to the recipients in parallel, bounded by the WhatsApp client's limits
+        sent = fan_out('whatsapp', lambda phone_number: send_whatsapp_message(phone_number, message), phone_numbers)
+        for phone_number, (success, response) in zip(phone_numbers, sent):
             if success:
                 results['successful'].append(phone_number)
             else:
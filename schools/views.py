@@ -49,10 +49,10 @@ from .paystack_utils import initiate_paystack_stk, verify_paystack_payment # Swi
 from .models import (
     Student, Teacher, Grade, Assessment, AssessmentResult, 
     Payment, Employee, Salary, Leave, Term, Subject, Schedule,
-    Attendance, TERM_CHOICES, SMSMessage, CommunicationTemplate, Department,
+    Attendance, AttendanceDailyRollup, TERM_CHOICES, SMSMessage, CommunicationTemplate, Department,
     EmployeeAttendance, Deduction, Vehicle, Route, StudentTransportAssignment, TransportFee,
     MealPricing, StudentMealPayment, MealConsumption, SyncQueue, SyncStatus,
-    Branch, SalaryAdvance
+    Branch, SalaryAdvance, StudentFeeLedger
 )
 from django.db import transaction
 from django.contrib.auth.models import User, Group
@@ -63,7 +63,14 @@ from .forms import (
     StudentTransportAssignmentForm, TransportFeeForm, MealPricingForm, StudentMealPaymentForm
 )
 from .decorators import admin_required, accountant_required, can_manage_students
-from .utils import generate_payment_receipt, generate_receipt_qr
+from . import fee_ledger
+from . import attendance as attendance_writer
+from . import student_export
+from . import student_import
+from . import sms_queue
+from . import receipt_cache
+from . import receipt_outbox
+from .utils import generate_receipt_qr
 from django.views.decorators.http import require_http_methods
 from datetime import datetime, date
 from decimal import Decimal, InvalidOperation
@@ -444,7 +451,8 @@ def api_student_list(request):
         school = SchoolConfig.get_config(user=request.user, request=request)
         
         # Base Query - Filtered by School
-        students = Student.objects.filter(school=school).select_related('grade').all().order_by('-created_at')
+        # Balances are read from the prefetched fee ledger, so each page costs one extra query
+        students = Student.objects.filter(school=school).select_related('grade', 'branch').prefetch_related('fee_ledger').order_by('-created_at')
         
         # Filtering
         search = request.GET.get('search', '')
@@ -497,9 +505,12 @@ def api_student_list(request):
             # Annotation to calculate balance in DB
             # Balance = (Fees due based on current_term) - (Total Payments)
             
-            # 1. Total Payments
+            # 1. Total Payments (from the fee ledger rather than the raw payments table)
+            paid_subquery = StudentFeeLedger.objects.filter(student=OuterRef('pk')).order_by().values('student').annotate(
+                total=Sum('paid')
+            ).values('total')[:1]
             students_with_payments = students.annotate(
-                total_paid_annot=Coalesce(Sum('payments__amount'), Value(0), output_field=DecimalField())
+                total_paid_annot=Coalesce(Subquery(paid_subquery), Value(0), output_field=DecimalField())
             )
             
             # 2. Total Due (Dynamic based on current_term)
@@ -636,7 +647,9 @@ def api_grade_update_fees(request, pk):
             update_fields['term3_fees'] = term3_fees
             
         if update_fields:
-            Student.objects.filter(grade=grade).update(**update_fields)
+            students = Student.objects.filter(grade=grade)
+            students.update(**update_fields)
+            fee_ledger.sync_ledger_fees(students)
             
         return JsonResponse({'success': True, 'message': 'Fees updated successfully for grade and students'})
         
@@ -741,7 +754,7 @@ def api_student_detail(request, pk):
         from django.db.models import Sum
         from config.models import SchoolConfig
         school = SchoolConfig.get_config(user=request.user, request=request)
-        student = Student.objects.select_related('grade').get(pk=pk, school=school)
+        student = Student.objects.select_related('grade', 'branch').prefetch_related('fee_ledger').get(pk=pk, school=school)
 
         if request.method == 'DELETE':
             # Also delete associated user if it exists
@@ -1081,133 +1094,15 @@ def api_student_create(request):
 def api_dashboard(request):
     """API endpoint for dashboard statistics"""
     try:
-        from django.db import transaction
-        import uuid
-        from django.db.models import Sum, Count, F, Value, DecimalField, Q
-        from django.db.models.functions import Coalesce
-        from datetime import  timedelta
-        import calendar
-        
         from config.models import SchoolConfig
+        from .dashboard import get_dashboard_snapshot
         
         # Get Currrent School
         school = SchoolConfig.get_config(user=request.user, request=request)
         
-        today = timezone.now().date()
-        
-        # Student Stats
-        all_students = Student.objects.filter(school=school)
-        total_students = all_students.count()
-        new_students = all_students.filter(
-            created_at__month=timezone.now().month,
-            created_at__year=timezone.now().year
-        ).count()
-        
-        # Teacher Stats
-        teacher_stats = Teacher.objects.filter(school=school).aggregate(
-            total=Count('id'),
-            active=Count('id', filter=Q(status='ACTIVE'))
-        )
-        
-        # Attendance Stats
-        todays_attendance = Attendance.objects.filter(school=school, date=today)
-        present_today = todays_attendance.filter(status='PRESENT').count()
-        attendance_rate = (present_today / total_students * 100) if total_students > 0 else 0
-        
-        # Fee Stats (School Fees Target)
-        # 1. Tuition Target (Cumulative year)
-        tuition_target = all_students.aggregate(
-            total=Sum(F('admission_fee') + F('term1_fees') + F('term2_fees') + F('term3_fees'))
-        )['total'] or 0
-
-        # 2. Collected Tuition
-        tuition_collected = all_students.aggregate(
-            total=Coalesce(Sum('payments__amount'), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2))
-        )['total'] or 0
-
-        # 3. Transport Target (System estimation)
-        try:
-            from transport.models import TransportAssignment, TransportTransaction
-            transport_target = TransportAssignment.objects.filter(account__school=school, active=True).aggregate(
-                total=Sum(F('route__cost_per_term') * 3)
-            )['total'] or 0
-            transport_collected = TransportTransaction.objects.filter(school=school, type='PAYMENT').aggregate(sum=Sum('amount'))['sum'] or 0
-        except:
-            transport_target = 0
-            transport_collected = 0
-
-        # 4. Food Target (System estimation)
-        try:
-            from food.models import FoodSubscription, FoodTransaction
-            food_target = FoodSubscription.objects.filter(account__school=school, active=True).aggregate(
-                total=Sum(F('meal_item__cost') * 3)
-            )['total'] or 0
-            food_collected = FoodTransaction.objects.filter(school=school, type='PAYMENT').aggregate(sum=Sum('amount'))['sum'] or 0
-            
-            # Legacy food income (if any)
-            try:
-                food_income_fee = FoodFee.objects.filter(school=school, status='COMPLETED').aggregate(sum=Sum('amount'))['sum'] or 0
-                food_income_meal = StudentMealPayment.objects.filter(school=school, status='COMPLETED').aggregate(sum=Sum('amount'))['sum'] or 0
-                food_collected = float(food_collected) + float(food_income_fee) + float(food_income_meal)
-            except:
-                pass
-        except:
-            food_target = 0
-            food_collected = 0
-        
-        # Combined KPI Totals
-        expected_total = float(tuition_target) + float(transport_target) + float(food_target)
-        collected_total = float(tuition_collected) + float(transport_collected) + float(food_collected)
-        
-        # Override local variables for simple JSON return if needed
-        total_fees = expected_total
-        fees_collected = collected_total
-        outstanding = max(0, expected_total - collected_total)
-        
-        # Chart Data (Last 6 months)
-        chart_labels = []
-        chart_data = []
-        
-        for i in range(5, -1, -1):
-            current = today - timedelta(days=today.day - 1) - timedelta(days=30*i)
-            month_start = current.replace(day=1)
-            month_end = current.replace(day=calendar.monthrange(current.year, current.month)[1])
-            
-            month_total = Payment.objects.filter(
-                school=school,
-                date__gte=month_start,
-                date__lte=month_end
-            ).aggregate(
-                total=Coalesce(Sum('amount'), Value('0.00'), output_field=DecimalField(max_digits=10, decimal_places=2))
-            )['total']
-            
-            chart_labels.append(current.strftime('%b'))
-            chart_data.append(float(month_total))
-            
-        recent_payments = Payment.objects.filter(school=school).select_related('student').order_by('-date')[:5]
-        recent_payments_data = [{
-            'id': p.id,
-            'student_name': p.student.get_full_name(),
-            'amount': float(p.amount),
-            'date': p.date.strftime('%Y-%m-%d'),
-            'method': p.payment_method
-        } for p in recent_payments]
-
-        return JsonResponse({
-            'stats': {
-                'total_students': total_students,
-                'new_students': new_students,
-                'total_teachers': teacher_stats['total'],
-                'attendance_rate': round(attendance_rate, 1),
-                'total_revenue': float(collected_total or 0),
-                'revenue_growth': 12.5, # Placeholder or calc real growth
-            },
-            'chart_data': {
-                'labels': chart_labels,
-                'revenue': chart_data
-            },
-            'recent_payments': recent_payments_data
-        })
+        # Served from a short-lived per-school snapshot; writes to payments,
+        # students and attendance drop it (see schools.signals)
+        return JsonResponse(get_dashboard_snapshot(school))
 
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -1440,7 +1335,7 @@ def api_teacher_detail(request, pk):
                 nssf = float(ss.nssf)
                 loans = float(ss.loans)
                 advances = float(ss.get_advances())
-                net_salary = float(ss.net_salary())
+                net_salary = float(ss.net_salary(advances))
             except Exception as e:
                 print(f"Error fetching salary structure: {e}")
                 # Fallback to model property if it exists
@@ -2519,10 +2414,9 @@ def calculate_attendance_rate(date):
     if total_students == 0:
         return 0
         
-    present_students = Attendance.objects.filter(
-        date=date,
-        status='PRESENT'
-    ).count()
+    present_students = AttendanceDailyRollup.objects.filter(
+        date=date
+    ).aggregate(present=Sum('present'))['present'] or 0
     
     return round((present_students / total_students) * 100, 1)
 
@@ -2779,12 +2673,11 @@ def student_create(request):
             
             # Send receipt
             try:
-                from .utils import send_payment_receipt
-                send_payment_receipt(payment)
+                # Queued for the receipt outbox worker; the parent is not contacted inside this request
+                receipt_outbox.enqueue(receipt_outbox.PAYMENT, payment)
             except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"Error sending receipt: {str(e)}")
+                # Log error but don't fail the payment recording
+                logging.getLogger(__name__).error(f"Error queuing receipt: {str(e)}")
             
             # Clear session data
             if 'pending_student_data' in request.session:
@@ -3627,15 +3520,22 @@ def student_delete(request, pk):
 
 @login_required
 def export_students(request):
-    """Export filtered students data to Excel with proper formatting"""
+    """
+    Export filtered students to Excel (default) or CSV (?format=csv).
+    Both are streamed from a chunked query, so there is no row cap.
+    """
+    from config.models import SchoolConfig
+    school = SchoolConfig.get_config(user=request.user, request=request)
+
     # Get filter parameters
     grade_id = request.GET.get('grade')
     gender = request.GET.get('gender')
     fee_status = request.GET.get('fee_status')
     search_query = request.GET.get('search')
+    export_format = request.GET.get('format', 'xlsx')
 
-    # Start with all students
-    students = Student.objects.select_related('grade').order_by('grade__name', 'admission_number')
+    # Start with the school's students
+    students = Student.objects.filter(school=school).order_by('grade__name', 'admission_number')
 
     # Apply filters
     if grade_id:
@@ -3648,130 +3548,27 @@ def export_students(request):
             Q(last_name__icontains=search_query) |
             Q(admission_number__icontains=search_query)
         )
+    students = student_export.annotate_fee_balance(students)
     if fee_status:
-        if fee_status == 'paid':
-            students = students.filter(payments__amount__gte=F('grade__term_fees'))
-        elif fee_status == 'partial':
-            students = students.filter(
-                payments__amount__gt=0,
-                payments__amount__lt=F('grade__term_fees')
-            )
-        elif fee_status == 'unpaid':
-            students = students.filter(
-                Q(payments__amount__isnull=True) |
-                Q(payments__amount=0)
-            )
-
-    # Limit export size to prevent memory issues and process kills
-    MAX_EXPORT_SIZE = 1000
-    student_count = students.count()
-    
-    if student_count > MAX_EXPORT_SIZE:
-        messages.error(
-            request, 
-            f'Export limited to {MAX_EXPORT_SIZE} students. You have {student_count} students matching your filters. '
-            f'Please use more specific filters to reduce the number.'
-        )
-        return redirect('student_list')
-    
-    # Limit queryset
-    students = students[:MAX_EXPORT_SIZE]
-
+        students = student_export.filter_fee_status(students, fee_status)
 
-    # Create workbook and active sheet
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Students List"
-
-    # Add title and date
-    ws['A1'] = "STUDENTS LIST"
-    ws['A2'] = f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M')}"
+    if export_format == 'csv':
+        return student_export.csv_response(students)
 
     # Add filter information if any filters are applied
     filter_info = []
     if grade_id:
-        grade = Grade.objects.get(id=grade_id)
-        filter_info.append(f"Grade: {grade.name}")
+        grade = Grade.objects.filter(id=grade_id).first()
+        if grade:
+            filter_info.append(f"Grade: {grade.name}")
     if gender:
         filter_info.append(f"Gender: {'Male' if gender == 'M' else 'Female'}")
     if fee_status:
         filter_info.append(f"Fee Status: {fee_status.title()}")
     if search_query:
         filter_info.append(f"Search: {search_query}")
-    
-    if filter_info:
-        ws['A3'] = "Filters: " + ", ".join(filter_info)
-
-    # Style header cells
-    header_cells = [ws['A1'], ws['A2']]
-    if filter_info:
-        header_cells.append(ws['A3'])
-    
-    for cell in header_cells:
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal='left')
-
-    # Add headers starting at row 5 to leave space for title and filters
-    current_row = 5
-    headers = ['Admission Number', 'Student Name', 'Grade', 'Gender', 'Parent Contact', 'Term', 'Fee Balance']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=current_row, column=col)
-        cell.value = header
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-    # Add data
-    current_row += 1
-    for student in students:
-        row_data = [
-            student.admission_number,
-            student.get_full_name(),
-            student.grade.name if student.grade else '',
-            student.get_gender_display(),
-            student.parent_phone,
-            f"Term {student.current_term}",
-            student.get_balance()
-        ]
-        
-        for col, value in enumerate(row_data, 1):
-            cell = ws.cell(row=current_row, column=col)
-            cell.value = value
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-        current_row += 1
-
-    # Adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column_letter].width = adjusted_width
 
-    # Create response
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = 'attachment; filename=students_list.xlsx'
-    wb.save(response)
-    return response
+    return student_export.xlsx_response(students, filter_info)
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -3781,205 +3578,37 @@ def api_students_bulk_import(request):
     try:
         from openpyxl import load_workbook
         from config.models import SchoolConfig
-        from django.contrib.auth.models import User, Group
-        from django.db import transaction
         import uuid
-        from datetime import datetime, date
-        
+
         if 'file' not in request.FILES:
             return JsonResponse({'error': 'No file uploaded'}, status=400)
-            
+
         file = request.FILES['file']
         config = SchoolConfig.get_config(user=request.user, request=request)
-        
-        wb = load_workbook(file, data_only=True)
-        ws = wb.active
-        
-        # Define header mapping
-        headers = {}
-        for idx, cell in enumerate(ws[1]):
-            if cell.value:
-                headers[cell.value.strip().lower()] = idx
-        
-        # Expected header names (lowercase)
-        column_definitions = {
-            'registration_no': ['registration no.', 'admission number', 'adm no', 'adm', 'reg no', 'admission no', 'stno'],
-            'first_name': ['first name', 'given name', 'fname', 'name', 'full name', 'student name'],
-            'last_name': ['last name', 'surname', 'family name', 'lname'],
-            'gender': ['gender (m/f)', 'gender', 'sex', 'm/f'],
-            'grade': ['grade', 'class', 'form', 'level', 'current class', 'student class'],
-            'date_of_birth': ['date of birth (yyyy-mm-dd)', 'date of birth', 'dob', 'birth date']
-        }
-        
-        # Find critical columns
-        col_map = {}
-        for key, aliases in column_definitions.items():
-            for alias in aliases:
-                if alias in headers:
-                    col_map[key] = headers[alias]
-                    break
-        
-        # Only First Name is absolutely critical for a profile to exist
-        if 'first_name' not in col_map:
-            return JsonResponse({
-                'error': f'Missing Name column. Please ensure your Excel has a "Name" or "First Name" column. Found: {list(headers.keys())}'
-            }, status=400)
 
-        results = {
-            'total': 0,
-            'imported': 0,
-            'skipped': 0,
-            'errors': []
-        }
-
-        # Cache grades for efficiency
-        grades_map = {g.name.strip().lower(): g for g in Grade.objects.filter(school=config)}
-        students_group, _ = Group.objects.get_or_create(name='Students')
-
-        rows = list(ws.iter_rows(min_row=2, values_only=True))
-        results['total'] = len(rows)
-        
-        # Limit import size to prevent memory issues and process kills
-        MAX_IMPORT_SIZE = 500
-        if len(rows) > MAX_IMPORT_SIZE:
-            return JsonResponse({
-                'error': f'Import limited to {MAX_IMPORT_SIZE} students per file. Your file has {len(rows)} rows. '
-                        f'Please split your file into smaller batches.',
-                'success': False
-            }, status=400)
-
-        seen_admission_numbers = set()
-        for row_idx, row in enumerate(rows):
-
-            try:
-                with transaction.atomic():
-                    # Get values safely using mapping
-                    def get_val(key):
-                        idx = col_map.get(key)
-                        if idx is not None and idx < len(row):
-                            return row[idx]
-                        return None
-
-                    # Basic Info
-                    raw_name = get_val('first_name')
-                    if not raw_name: continue # Skip completely empty rows
-                    
-                    name_parts = str(raw_name).strip().split(' ', 1)
-                    first_name = name_parts[0]
-                    last_name = name_parts[1] if len(name_parts) > 1 else ""
-                    
-                    # If specific last name column exists, it overrides
-                    specific_last_name = get_val('last_name')
-                    if specific_last_name:
-                        last_name = str(specific_last_name).strip()
-                    
-                    # Admission Number
-                    admission_number = str(get_val('registration_no')).strip() if get_val('registration_no') else None
-                    if not admission_number:
-                        admission_number = config.generate_admission_number()
-                    
-                    # Check for duplicates (in DB or this file)
-                    if admission_number in seen_admission_numbers:
-                        results['skipped'] += 1
-                        results['errors'].append(f"Row {row_idx+2}: Duplicate Admission Number #{admission_number} found in Excel.")
-                        continue
-                    
-                    if Student.objects.filter(school=config, admission_number=admission_number).exists():
-                        results['skipped'] += 1
-                        results['errors'].append(f"Row {row_idx+2}: Admission Number #{admission_number} already exists in system.")
-                        continue
-                    
-                    seen_admission_numbers.add(admission_number)
-
-                    # Gender
-                    gender_raw = str(get_val('gender')).strip().upper() if get_val('gender') else 'M'
-                    gender = 'M'
-                    if gender_raw.startswith('F'): gender = 'F'
-                    elif gender_raw.startswith('O'): gender = 'O'
-                    
-                    # Grade (Optional now)
-                    grade_obj = None
-                    grade_raw = get_val('grade')
-                    if grade_raw:
-                        grade_name = str(grade_raw).strip().lower()
-                        grade_obj = grades_map.get(grade_name)
-                        
-                        if not grade_obj:
-                            # If they provided a grade but we don't recognize it, log it but keep going if possible?
-                            # No, better to log error for that row.
-                            results['skipped'] += 1
-                            results['errors'].append(f"Row {row_idx+2}: Class '{grade_raw}' not found.")
-                            continue
-
-                    # Date of Birth
-                    dob = date(2015, 1, 1) # Sensible default
-                    dob_val = get_val('date_of_birth')
-                    if dob_val:
-                        if isinstance(dob_val, (date, datetime)):
-                            dob = dob_val if isinstance(dob_val, date) else dob_val.date()
-                        else:
-                            try:
-                                dob = datetime.strptime(str(dob_val).strip(), '%Y-%m-%d').date()
-                            except:
-                                pass
-
-                    # Prep User Data (replica of StudentForm logic)
-                    base_username = f"STD{admission_number}"
-                    username = base_username
-                    counter = 1
-                    while User.objects.filter(username=username).exists():
-                        username = f"{base_username}{counter}"
-                        counter += 1
-                    
-                    raw_password = config.student_portal_password
-                    
-                    # Create User
-                    user = User.objects.create_user(
-                        username=username,
-                        password=raw_password,
-                        first_name=first_name,
-                        last_name=last_name
-                    )
-                    user.groups.add(students_group)
-                    
-                    # Create Student
-                    student = Student.objects.create(
-                        school=config,
-                        user=user,
-                        admission_number=admission_number,
-                        first_name=first_name,
-                        last_name=last_name,
-                        gender=gender,
-                        grade=grade_obj,
-                        date_of_birth=dob,
-                        admission_fee=config.admission_fee,
-                        current_term=int(config.current_term.replace('TERM_', '')) if 'TERM_' in config.current_term else 1,
-                        term1_fees=grade_obj.term1_fees if grade_obj else 0,
-                        term2_fees=grade_obj.term2_fees if grade_obj else 0,
-                        term3_fees=grade_obj.term3_fees if grade_obj else 0
-                    )
-
-                    # Create Admission Fee Payment Record
-                    ref_number = f'REF-BULK-{uuid.uuid4().hex[:6].upper()}'
-                    Payment.objects.create(
-                        school=config,
-                        student=student,
-                        amount=config.admission_fee,
-                        payment_method='CASH',
-                        transaction_id=ref_number,
-                        reference_number=ref_number,
-                        term=student.current_term,
-                        status='COMPLETED'
-                    )
+        # Read-only mode streams the sheet instead of loading every cell
+        wb = load_workbook(file, read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            rows = ws.iter_rows(values_only=True)
+            col_map, headers = student_import.map_columns(next(rows, None))
 
-                    results['imported'] += 1
+            # Only First Name is absolutely critical for a profile to exist
+            if 'first_name' not in col_map:
+                return JsonResponse({
+                    'error': f'Missing Name column. Please ensure your Excel has a "Name" or "First Name" column. Found: {headers}'
+                }, status=400)
 
-            except Exception as row_err:
-                results['skipped'] += 1
-                results['errors'].append(f"Row {row_idx+2}: {str(row_err)}")
+            # The client may pass its own id to poll the progress endpoint during the upload
+            import_id = request.POST.get('import_id') or uuid.uuid4().hex
+            expected = ws.max_row - 1 if ws.max_row else None
+            results = student_import.import_students(config, rows, col_map, import_id=import_id, total=expected)
+        finally:
+            wb.close()
 
         return JsonResponse({
             'success': True,
+            'import_id': import_id,
             'summary': results
         })
 
@@ -3987,6 +3616,16 @@ def api_students_bulk_import(request):
         traceback.print_exc()
         return JsonResponse({'error': str(e)}, status=500)
 
+@login_required
+def api_students_bulk_import_progress(request, import_id):
+    """Progress of a running (or recently finished) bulk student import"""
+    from config.models import SchoolConfig
+    config = SchoolConfig.get_config(user=request.user, request=request)
+    progress = student_import.get_import_progress(config, import_id)
+    if progress is None:
+        return JsonResponse({'error': 'Import not found'}, status=404)
+    return JsonResponse({'success': True, 'progress': progress})
+
 @login_required
 def import_students(request):
     """Old template-based import redirect"""
@@ -4604,22 +4243,12 @@ def record_payment(request, student_id):
             
             # Automatically send receipt to parent
             try:
-                from .utils import send_payment_receipt
-                logger = logging.getLogger(__name__)
-                success, result = send_payment_receipt(payment)
-                if success:
-                    if isinstance(result, dict):
-                        if result.get('email_sent'):
-                            messages.info(request, 'Receipt sent to parent email')
-                        if result.get('whatsapp_sent'):
-                            messages.info(request, 'Receipt notification sent to parent WhatsApp')
-                else:
-                    # Log error but don't fail the payment recording
-                    logger.warning(f"Receipt sending failed: {result}")
+                # Queued for the receipt outbox worker; the parent is not contacted inside this request
+                if receipt_outbox.enqueue(receipt_outbox.PAYMENT, payment):
+                    messages.info(request, 'Receipt queued for delivery to the parent')
             except Exception as e:
                 # Log error but don't fail the payment recording
-                logger = logging.getLogger(__name__)
-                logger.error(f"Error sending receipt: {str(e)}")
+                logging.getLogger(__name__).error(f"Error queuing receipt: {str(e)}")
             
             messages.success(
                 request, 
@@ -4661,19 +4290,12 @@ def payment_add(request, student_id):
             
             # Automatically send receipt to parent via WhatsApp
             try:
-                from .utils import send_payment_receipt
-                import logging
-                logger = logging.getLogger(__name__)
-                success, result = send_payment_receipt(payment)
-                if success:
-                    if isinstance(result, dict) and result.get('whatsapp_sent'):
-                        messages.info(request, 'Receipt notification sent to parent WhatsApp')
-                else:
-                    logger.warning(f"Receipt sending failed: {result}")
+                # Queued for the receipt outbox worker; the parent is not contacted inside this request
+                if receipt_outbox.enqueue(receipt_outbox.PAYMENT, payment):
+                    messages.info(request, 'Receipt queued for delivery to the parent')
             except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"Error sending receipt: {str(e)}")
+                # Log error but don't fail the payment recording
+                logging.getLogger(__name__).error(f"Error queuing receipt: {str(e)}")
             
             return redirect('student_detail', pk=student_id)
     else:
@@ -4775,35 +4397,17 @@ def mark_attendance(request, student_id=None, grade_id=None):
                     'message': 'Invalid date format'
                 }, status=400)
             
-            created_count = 0
-            updated_count = 0
-            errors = []
-            
-            for student_data in students_data:
-                student_id = student_data.get('student_id')
-                status = student_data.get('status')
-                remarks = student_data.get('remarks', '')
-                
-                if not student_id or not status:
-                    continue
-                
-                try:
-                    student = Student.objects.get(pk=student_id)
-                    attendance, created = Attendance.objects.update_or_create(
-                        student=student,
-                        date=attendance_date,
-                        defaults={
-                            'status': status,
-                            'remarks': remarks,
-                            'recorded_by': request.user
-                        }
-                    )
-                    if created:
-                        created_count += 1
-                    else:
-                        updated_count += 1
-                except Exception as e:
-                    errors.append(f"Error for student {student_id}: {str(e)}")
+            from config.models import SchoolConfig
+            school = SchoolConfig.get_config(user=request.user, request=request)
+            entries = [{
+                'student_id': student_data.get('student_id'),
+                'status': student_data.get('status'),
+                'remarks': student_data.get('remarks', '')
+            } for student_data in students_data]
+            result = attendance_writer.mark_attendance(school, attendance_date, entries, recorded_by=request.user)
+            created_count = result['created']
+            updated_count = result['updated'] + result['unchanged']
+            errors = [f"Error for student {error['student_id']}: {error['error']}" for error in result['errors']]
             
             return JsonResponse({
                 'success': True,
@@ -5477,19 +5081,12 @@ def payment_create(request):
             
             # Automatically send receipt to parent via WhatsApp
             try:
-                from .utils import send_payment_receipt
-                import logging
-                logger = logging.getLogger(__name__)
-                success, result = send_payment_receipt(payment)
-                if success:
-                    if isinstance(result, dict) and result.get('whatsapp_sent'):
-                        messages.info(request, 'Receipt notification sent to parent WhatsApp')
-                else:
-                    logger.warning(f"Receipt sending failed: {result}")
+                # Queued for the receipt outbox worker; the parent is not contacted inside this request
+                if receipt_outbox.enqueue(receipt_outbox.PAYMENT, payment):
+                    messages.info(request, 'Receipt queued for delivery to the parent')
             except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"Error sending receipt: {str(e)}")
+                # Log error but don't fail the payment recording
+                logging.getLogger(__name__).error(f"Error queuing receipt: {str(e)}")
             
             messages.success(request, 'Payment recorded successfully')
             return redirect('payment_detail', pk=payment.pk)
@@ -5796,20 +5393,12 @@ def payment_edit(request, pk):
             
             # Automatically send receipt to parent after update
             try:
-                from .utils import send_payment_receipt
-                import logging
-                logger = logging.getLogger(__name__)
-                success, result = send_payment_receipt(payment)
-                if success:
-                    if isinstance(result, dict):
-                        if result.get('whatsapp_sent'):
-                            messages.info(request, 'Updated receipt notification sent to parent WhatsApp')
-                else:
-                    logger.warning(f"Receipt sending failed: {result}")
+                # Queued for the receipt outbox worker; the parent is not contacted inside this request
+                if receipt_outbox.enqueue(receipt_outbox.PAYMENT, payment):
+                    messages.info(request, 'Receipt queued for delivery to the parent')
             except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"Error sending receipt: {str(e)}")
+                # Log error but don't fail the payment recording
+                logging.getLogger(__name__).error(f"Error queuing receipt: {str(e)}")
             
             messages.success(request, 'Payment updated successfully')
             return redirect('payment_detail', pk=payment.pk)
@@ -6209,16 +5798,18 @@ def api_sms_send_bulk(request):
             sent_by=request.user
         )
         
-        # Trigger sending (this now handles personalization)
+        # Queue the campaign; the process_sms_queue worker delivers it
         success, response = sms.send()
         
         if success:
             return JsonResponse({
                 'success': True, 
-                'message': 'SMS sent successfully',
+                'message': 'SMS queued for delivery',
+                'sms_id': sms.id,
+                'status': sms.status,
                 'recipients': sms.recipients_count,
                 'response': response
-            })
+            }, status=202)
         else:
             return JsonResponse({
                 'success': False, 
@@ -6230,6 +5821,27 @@ def api_sms_send_bulk(request):
         import traceback
         return JsonResponse({'error': str(e), 'traceback': traceback.format_exc()}, status=500)
 
+@require_http_methods(["GET"])
+@login_required
+def api_sms_status(request, pk):
+    """API endpoint the frontend polls for the delivery progress of a campaign"""
+    from config.models import SchoolConfig
+    school = SchoolConfig.get_config(user=request.user, request=request)
+    sms = get_object_or_404(SMSMessage, pk=pk, school=school)
+    return JsonResponse({'success': True, 'sms': sms_queue.campaign_status(sms)})
+
+@require_http_methods(["GET"])
+@login_required
+def api_receipt_delivery_status(request, kind, object_id):
+    """Delivery state of a payment's receipt on each channel (email, WhatsApp)"""
+    from config.models import SchoolConfig
+    model = receipt_outbox.receipt_models().get(kind)
+    if model is None:
+        return JsonResponse({'error': 'Unknown receipt type'}, status=404)
+    school = SchoolConfig.get_config(user=request.user, request=request)
+    get_object_or_404(model, pk=object_id, school=school)
+    return JsonResponse({'success': True, 'delivery': receipt_outbox.delivery_status(kind, object_id)})
+
 @csrf_exempt
 @login_required
 @require_http_methods(["GET"])
@@ -6318,11 +5930,11 @@ def send_sms(request):
             sms.sent_by = request.user
             sms.save()
             
-            # Send the SMS
+            # Queue the SMS for the process_sms_queue worker
             success, response = sms.send()
             
             if success:
-                messages.success(request, 'SMS sent successfully')
+                messages.success(request, f"SMS queued for {response['queued']} recipients")
             else:
                 messages.error(request, f'Failed to send SMS: {response}')
                 
@@ -6497,17 +6109,8 @@ def payment_receipt(request, payment_id):
         # Get the payment object with related student data
         payment = get_object_or_404(Payment.objects.select_related('student', 'student__grade'), id=payment_id)
         
-        # Generate QR code for verification
-        qr_data = {
-            'payment_id': payment.id,
-            'amount': str(payment.amount),
-            'date': payment.date.strftime('%Y-%m-%d'),
-            'reference': payment.reference_number
-        }
-        qr_code = generate_receipt_qr(qr_data)
-        
-        # Generate PDF receipt
-        pdf_content = generate_payment_receipt(payment, qr_code)
+        # Generate PDF receipt (a file read when it was rendered before)
+        pdf_content = receipt_cache.payment_receipt_pdf(payment)
         
         if not pdf_content:
             raise ValueError("PDF generation failed - no content generated")
@@ -6608,15 +6211,6 @@ def record_attendance(request):
                 'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'
             }, status=400)
         
-        # Get student
-        try:
-            student = Student.objects.get(id=student_id)
-        except Student.DoesNotExist:
-            return JsonResponse({
-                'success': False,
-                'error': 'Student not found'
-            }, status=404)
-        
         # Parse date
         try:
             from datetime import datetime
@@ -6629,18 +6223,20 @@ def record_attendance(request):
             }, status=400)
         
         # Create or update attendance
-        attendance, created = Attendance.objects.update_or_create(
-            student=student,
-            date=attendance_date,
-            defaults={
-                'status': status,
-                'recorded_by': request.user
-            }
+        from config.models import SchoolConfig
+        school = SchoolConfig.get_config(user=request.user, request=request)
+        result = attendance_writer.mark_attendance(
+            school, attendance_date, [{'student_id': student_id, 'status': status}], recorded_by=request.user
         )
+        if result['errors']:
+            return JsonResponse({
+                'success': False,
+                'error': 'Student not found'
+            }, status=404)
         
         return JsonResponse({
             'success': True, 
-            'created': created,
+            'created': bool(result['created']),
             'message': f'Attendance marked as {status} successfully'
         })
         
@@ -6732,11 +6328,8 @@ def download_payment_pdf(request, pk):
         # Get the payment object with related student data
         payment = get_object_or_404(Payment.objects.select_related('student', 'student__grade'), pk=pk)
         
-        # Generate QR code for verification
-        qr_code = generate_payment_qr(payment)
-        
-        # Generate PDF receipt
-        pdf_content = generate_payment_receipt(payment, qr_code)
+        # Generate PDF receipt (a file read when it was rendered before)
+        pdf_content = receipt_cache.payment_receipt_pdf(payment)
         
         if not pdf_content:
             raise ValueError("PDF generation failed - no content generated")
@@ -7803,24 +7396,12 @@ def transport_fee_create(request):
             
             # Automatically send receipt to parent
             try:
-                from .utils import send_transport_fee_receipt
-                import logging
-                logger = logging.getLogger(__name__)
-                success, result = send_transport_fee_receipt(fee)
-                if success:
-                    if isinstance(result, dict):
-                        if result.get('email_sent'):
-                            messages.info(request, 'Receipt sent to parent email')
-                        if result.get('whatsapp_sent'):
-                            messages.info(request, 'Receipt notification sent to parent WhatsApp')
-                else:
-                    # Log error but don't fail the payment recording
-                    logger.warning(f"Receipt sending failed: {result}")
+                # Queued for the receipt outbox worker; the parent is not contacted inside this request
+                if receipt_outbox.enqueue(receipt_outbox.TRANSPORT_FEE, fee):
+                    messages.info(request, 'Receipt queued for delivery to the parent')
             except Exception as e:
                 # Log error but don't fail the payment recording
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"Error sending receipt: {str(e)}")
+                logging.getLogger(__name__).error(f"Error queuing receipt: {str(e)}")
             
             messages.success(request, f'Transport fee payment recorded for {fee.student.get_full_name()}')
             return redirect('transport_fee_detail', pk=fee.pk)
@@ -8205,22 +7786,12 @@ def meal_payment_create(request):
                 
                 # Automatically send receipt to parent
                 try:
-                    from .utils import send_meal_payment_receipt
-                    success, result = send_meal_payment_receipt(payment)
-                    if success:
-                        if isinstance(result, dict):
-                            if result.get('email_sent'):
-                                messages.info(request, 'Receipt sent to parent email')
-                            if result.get('whatsapp_sent'):
-                                messages.info(request, 'Receipt notification sent to parent WhatsApp')
-                    else:
-                        # Log error but don't fail the payment recording
-                        logger = logging.getLogger(__name__)
-                        logger.warning(f"Receipt sending failed: {result}")
+                    # Queued for the receipt outbox worker; the parent is not contacted inside this request
+                    if receipt_outbox.enqueue(receipt_outbox.MEAL_PAYMENT, payment):
+                        messages.info(request, 'Receipt queued for delivery to the parent')
                 except Exception as e:
                     # Log error but don't fail the payment recording
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Error sending receipt: {str(e)}")
+                    logging.getLogger(__name__).error(f"Error queuing receipt: {str(e)}")
                 
                 messages.success(request, f'Meal payment recorded successfully for {payment.student.get_full_name()}')
                 return redirect('meal_payment_detail', pk=payment.pk)
@@ -8660,31 +8231,23 @@ def api_attendance_mark_batch(request):
         if not attendance_list or not date_str:
             return JsonResponse({'error': 'Attendance data and date are required'}, status=400)
             
-        saved_count = 0
+        from config.models import SchoolConfig
+        school = SchoolConfig.get_config(user=request.user, request=request)
         
-        with transaction.atomic():
-            for item in attendance_list:
-                student_id = item.get('student_id')
-                status = item.get('status')
-                remarks = item.get('remarks', '')
-                
-                if not student_id or not status:
-                    continue
-                    
-                student = Student.objects.get(pk=student_id)
-                
-                Attendance.objects.update_or_create(
-                    student=student,
-                    date=date_str,
-                    defaults={
-                        'status': status,
-                        'remarks': remarks,
-                        'recorded_by': request.user
-                    }
-                )
-                saved_count += 1
-                
-        return JsonResponse({'success': True, 'saved_count': saved_count})
+        entries = [{
+            'student_id': item.get('student_id'),
+            'status': item.get('status'),
+            'remarks': item.get('remarks', '')
+        } for item in attendance_list]
+        result = attendance_writer.mark_attendance(school, date_str, entries, recorded_by=request.user)
+        
+        return JsonResponse({
+            'success': True,
+            'saved_count': result['created'] + result['updated'] + result['unchanged'],
+            'created': result['created'],
+            'updated': result['updated'],
+            'errors': result['errors']
+        })
         
     except Student.DoesNotExist:
         return JsonResponse({'error': 'One or more students not found'}, status=404)
@@ -9033,14 +8596,14 @@ def verify_subscription_payment(request):
             return JsonResponse({'error': 'Reference is required'}, status=400)
         
         # Call Paystack verification API
-        import requests
+        from .utils.integrations import get_client
         headers = {
             'Authorization': f'Bearer {settings.PAYSTACK_SECRET_KEY}',
             'Content-Type': 'application/json'
         }
         
         verify_url = f'https://api.paystack.co/transaction/verify/{reference}'
-        response = requests.get(verify_url, headers=headers)
+        response = get_client('paystack').get(verify_url, headers=headers)
         
         if response.status_code == 200:
             result = response.json()
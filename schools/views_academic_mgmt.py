@@ -5,6 +5,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.db import transaction
 from .models import Student, Grade, Term
+from . import fee_ledger
 from config.models import SchoolConfig
 import json
 
@@ -80,6 +81,7 @@ def api_promote_students(request):
                         target_grade = all_grades.get(target_name)
                         if target_grade:
                             # Move to next grade and ADAPT changes (Fees from new grade)
+                            promoted_ids = list(students_qs.values_list('pk', flat=True))
                             students_qs.update(
                                 grade=target_grade, 
                                 current_term=1,
@@ -88,6 +90,7 @@ def api_promote_students(request):
                                 term2_fees=target_grade.term2_fees,
                                 term3_fees=target_grade.term3_fees
                             )
+                            fee_ledger.sync_ledger_fees(Student.objects.filter(pk__in=promoted_ids))
                     
                     total_promoted += count
             
@@ -1,9 +1,11 @@
-from django.http import JsonResponse
+from django.http import FileResponse, JsonResponse
+from django.shortcuts import get_object_or_404
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum
-from .models import Expense
+from .models import Expense, Grade, StatementJob
+from . import term_statements
 import json
 from datetime import datetime
 
@@ -142,3 +144,82 @@ def api_expense_detail(request, expense_id):
             
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+@csrf_exempt
+@login_required
+@require_http_methods(["GET", "POST"])
+def api_statement_jobs(request):
+    """
+    List the school's recent term statement jobs, or queue a new one
+    (term, optional grade_id, format ZIP or PDF) for the
+    `process_statement_jobs` worker
+    """
+    from config.models import SchoolConfig
+
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    school = SchoolConfig.get_config(user=request.user, request=request)
+
+    if request.method == "GET":
+        jobs = StatementJob.objects.filter(school=school).select_related('grade')[:20]
+        return JsonResponse({'success': True, 'jobs': [term_statements.job_status(job) for job in jobs]})
+
+    try:
+        data = json.loads(request.body or '{}')
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    try:
+        term = int(data.get('term'))
+    except (TypeError, ValueError):
+        term = None
+    if term not in (1, 2, 3):
+        return JsonResponse({'success': False, 'error': 'term must be 1, 2 or 3'}, status=400)
+    output_format = str(data.get('format', 'ZIP')).upper()
+    if output_format not in dict(StatementJob.FORMAT_CHOICES):
+        return JsonResponse({'success': False, 'error': 'format must be ZIP or PDF'}, status=400)
+    grade = None
+    if data.get('grade_id'):
+        grade = Grade.objects.filter(pk=data['grade_id'], school=school).first()
+        if grade is None:
+            return JsonResponse({'success': False, 'error': 'Grade not found'}, status=404)
+
+    job = StatementJob.objects.create(
+        school=school, grade=grade, term=term, output_format=output_format, requested_by=request.user,
+    )
+    return JsonResponse({
+        'success': True,
+        'message': 'Statements queued',
+        'job': term_statements.job_status(job),
+    }, status=202)
+
+@login_required
+@require_http_methods(["GET"])
+def api_statement_job_detail(request, pk):
+    """Progress of a term statement job; the frontend polls this"""
+    from config.models import SchoolConfig
+
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    school = SchoolConfig.get_config(user=request.user, request=request)
+    job = get_object_or_404(StatementJob.objects.select_related('grade'), pk=pk, school=school)
+    return JsonResponse({'success': True, 'job': term_statements.job_status(job)})
+
+@login_required
+@require_http_methods(["GET"])
+def api_statement_job_download(request, pk):
+    """Download the ZIP or merged PDF of a finished term statement job"""
+    from config.models import SchoolConfig
+
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({'error': 'Permission denied'}, status=403)
+    school = SchoolConfig.get_config(user=request.user, request=request)
+    job = get_object_or_404(StatementJob, pk=pk, school=school)
+    if job.status != 'DONE' or not job.file:
+        return JsonResponse({'success': False, 'error': 'Statements are not ready yet'}, status=409)
+    extension = 'pdf' if job.output_format == 'PDF' else 'zip'
+    return FileResponse(
+        job.file.open('rb'),
+        as_attachment=True,
+        filename=f"statements_term{job.term}_{job.pk}.{extension}",
+        content_type='application/pdf' if extension == 'pdf' else 'application/zip',
+    )
@@ -173,6 +173,13 @@ def api_super_stats(request):
         }
     })
 
+@user_passes_test(is_superuser)
+@require_http_methods(["GET"])
+def api_super_integration_metrics(request):
+    """Latency, error and circuit-breaker state of the outbound integrations in this worker process"""
+    from schools.utils.integrations import provider_metrics
+    return JsonResponse({'providers': provider_metrics()})
+
 @user_passes_test(is_superuser)
 @require_http_methods(["GET"])
 def api_super_subscriptions(request):
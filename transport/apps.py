@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TransportConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transport'
+
+    def ready(self):
+        import transport.signals  # Import the signals
@@ -0,0 +1,42 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .tracking import can_watch, last_position, route_group
+
+
+class RoutePositionConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes the live position of a route's bus. On connect the client gets
+    the last known position, then every newer fix the driver app posts.
+    """
+
+    async def connect(self):
+        self.route_id = self.scope['url_route']['kwargs']['route_id']
+        self.group_name = None
+        if not await self._allowed():
+            await self.close(code=4403)
+            return
+        self.group_name = route_group(self.route_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        position = await database_sync_to_async(last_position)(self.route_id)
+        if position:
+            await self.send_json(position)
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Watchers only listen; positions come in through the ingest endpoint
+        pass
+
+    async def vehicle_position(self, event):
+        await self.send_json(event['position'])
+
+    @database_sync_to_async
+    def _allowed(self):
+        from .models import Route
+
+        route = Route.objects.filter(pk=self.route_id).first()
+        return route is not None and can_watch(self.scope.get('user'), route)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from transport.tracking import purge_positions, RETENTION_DAYS
+
+
+class Command(BaseCommand):
+    help = 'Deletes GPS track points older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=RETENTION_DAYS,
+            help=f'Keep this many days of track (default: {RETENTION_DAYS})',
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_positions(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} track points older than {options['days']} days"))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0007_route_school_transportadvancerequest_school_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehiclePosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField()),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('speed', models.FloatField(blank=True, null=True)),
+                ('heading', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('accuracy', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('route', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vehicle_positions', to='transport.route')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='transport.transportvehicle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['route', 'recorded_at'], name='transport_v_route_i_d11977_idx')],
+                'unique_together': {('vehicle', 'recorded_at')},
+            },
+        ),
+    ]
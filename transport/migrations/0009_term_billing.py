@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0008_vehicle_positions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transporttransaction',
+            name='academic_year',
+            field=models.CharField(blank=True, max_length=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='transporttransaction',
+            name='term',
+            field=models.IntegerField(blank=True, choices=[(1, 'Term 1'), (2, 'Term 2'), (3, 'Term 3')], null=True),
+        ),
+    ]
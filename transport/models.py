@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
-from schools.models import Student
+from schools.models import Student, TERM_CHOICES
+from schools import account_balances
 
 class Route(models.Model):
     school = models.ForeignKey('config.SchoolConfig', on_delete=models.CASCADE, related_name='transport_routes', null=True, blank=True)
@@ -101,11 +102,18 @@ class TransportTransaction(models.Model):
     date = models.DateTimeField(default=timezone.now)
     recorded_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True)
 
+    # Set on the termly charges of a billing run (finance.term_billing)
+    term = models.IntegerField(choices=TERM_CHOICES, null=True, blank=True)
+    academic_year = models.CharField(max_length=9, null=True, blank=True)
+
     def save(self, *args, **kwargs):
         if not self.school and self.account and self.account.school:
             self.school = self.account.school
-        super().save(*args, **kwargs)
-        self.account.update_balance()
+        # Apply this write's change to the account totals (reversing the stored version on edits)
+        with transaction.atomic():
+            previous = account_balances.stored_state(self)
+            super().save(*args, **kwargs)
+            account_balances.transaction_saved(self, previous)
 
     def __str__(self):
         return f"{self.type} - {self.amount} ({self.account.student.last_name})"
@@ -259,3 +267,28 @@ class TransportAdvanceRequest(models.Model):
     action_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='reviewed_driver_advances')
     action_date = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+class VehiclePosition(models.Model):
+    """
+    One GPS fix of a vehicle, appended in batches by the driver app.
+    Rows are never updated; the school is the vehicle's, and speed is in
+    km/h, heading in degrees and accuracy in metres.
+    """
+    vehicle = models.ForeignKey(TransportVehicle, on_delete=models.CASCADE, related_name='positions')
+    route = models.ForeignKey(Route, on_delete=models.SET_NULL, null=True, blank=True, related_name='vehicle_positions', db_index=False)
+    recorded_at = models.DateTimeField()
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    speed = models.FloatField(null=True, blank=True)
+    heading = models.PositiveSmallIntegerField(null=True, blank=True)
+    accuracy = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        # A re-sent batch must not store a fix twice
+        unique_together = ['vehicle', 'recorded_at']
+        indexes = [
+            models.Index(fields=['route', 'recorded_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} @ {self.recorded_at}: {self.latitude}, {self.longitude}"
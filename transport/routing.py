@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/transport/routes/<int:route_id>/position/', consumers.RoutePositionConsumer.as_asgi()),
+]
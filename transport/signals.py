@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from schools import account_balances
+
+from .models import TransportAssignment, TransportTransaction
+from .route_planner import invalidate_route_plan
+
+
+@receiver([post_save, post_delete], sender=TransportAssignment)
+def invalidate_route_plan_on_assignment_change(sender, instance, **kwargs):
+    """A moved, added or removed pickup changes the route's run sheet"""
+    invalidate_route_plan(instance.route_id)
+
+
+@receiver(post_delete, sender=TransportTransaction)
+def reverse_deleted_transport_transaction(sender, instance, **kwargs):
+    account_balances.transaction_deleted(instance)
@@ -0,0 +1,173 @@
+"""
+Live vehicle tracking.
+
+The driver app posts its GPS fixes in batches; ingest() validates them,
+appends them to the VehiclePosition track with one bulk INSERT (re-sent
+fixes are ignored by the (vehicle, recorded_at) key) and, when the batch
+holds a newer fix than the last one seen, stores that fix in the cache and
+pushes it to the route's channel group. Everyone watching a bus over the
+WebSocket in transport.consumers gets the position pushed to them, and
+the REST fallback reads it from the cache, so watchers never query the
+track table.
+
+With the in-memory channel layer the push only reaches WebSockets served
+by the same process; set CHANNEL_REDIS_URL when running several.
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = 500
+MAX_AGE = timedelta(days=1)  # older fixes are rejected as stale
+MAX_CLOCK_SKEW = timedelta(minutes=5)  # fixes further in the future are rejected
+POSITION_TIMEOUT = 12 * 60 * 60
+RETENTION_DAYS = 90
+
+
+def route_group(route_id):
+    return f'route_{route_id}_positions'
+
+
+def _position_key(route_id):
+    return f'route_position_{route_id}'
+
+
+def _parse_time(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Epoch seconds, or milliseconds as sent by most mobile SDKs
+        seconds = value / 1000 if value > 1e11 else value
+        return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        # UTC throughout, so ISO strings of two fixes compare like their times
+        return parsed.astimezone(dt_timezone.utc) if parsed is not None else None
+    return None
+
+
+def _optional(value, low, high):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if low <= value <= high else None
+
+
+def parse_points(items, now=None):
+    """
+    Valid fixes out of a posted batch as dicts, ordered by time, and the
+    number rejected. A fix needs lat, lng and a time `t` (epoch seconds or
+    milliseconds, or ISO 8601); speed (km/h), heading and accuracy are
+    optional.
+    """
+    now = now or timezone.now()
+    points = {}
+    rejected = 0
+    for item in items[:MAX_BATCH]:
+        try:
+            lat = float(item['lat'])
+            lng = float(item['lng'])
+            recorded_at = _parse_time(item.get('t'))
+        except (KeyError, TypeError, ValueError, OverflowError, OSError):
+            rejected += 1
+            continue
+        if (recorded_at is None or not -90 <= lat <= 90 or not -180 <= lng <= 180
+                or recorded_at > now + MAX_CLOCK_SKEW or recorded_at < now - MAX_AGE):
+            rejected += 1
+            continue
+        heading = _optional(item.get('heading'), 0, 360)
+        accuracy = _optional(item.get('accuracy'), 0, 32767)
+        points[recorded_at] = {
+            'recorded_at': recorded_at,
+            'latitude': lat,
+            'longitude': lng,
+            'speed': _optional(item.get('speed'), 0, 400),
+            'heading': int(heading) % 360 if heading is not None else None,
+            'accuracy': int(accuracy) if accuracy is not None else None,
+        }
+    rejected += max(len(items) - MAX_BATCH, 0)
+    return [points[t] for t in sorted(points)], rejected
+
+
+def position_payload(vehicle, point):
+    return {
+        'vehicle_id': vehicle.id,
+        'plate': vehicle.plate_number,
+        'lat': point['latitude'],
+        'lng': point['longitude'],
+        'speed': point['speed'],
+        'heading': point['heading'],
+        'accuracy': point['accuracy'],
+        'recorded_at': point['recorded_at'].isoformat(),
+    }
+
+
+def publish(route_id, payload):
+    """Push a position to everyone watching the route"""
+    from channels.layers import get_channel_layer
+
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(layer.group_send)(route_group(route_id), {'type': 'vehicle.position', 'position': payload})
+    except Exception as e:
+        # Tracking is best effort; the fix is stored either way
+        logger.warning(f"Could not publish position of route {route_id}: {e}")
+
+
+def ingest(vehicle, items):
+    """
+    Store a batch of fixes for `vehicle` and publish the newest one.
+    Returns (accepted, rejected); re-sent fixes count as accepted.
+    """
+    from .models import VehiclePosition
+
+    points, rejected = parse_points(items)
+    if not points:
+        return 0, rejected
+    route_id = vehicle.route_id
+    VehiclePosition.objects.bulk_create(
+        [VehiclePosition(vehicle=vehicle, route_id=route_id, **point) for point in points],
+        ignore_conflicts=True,
+    )
+
+    latest = points[-1]
+    if route_id is not None:
+        current = cache.get(_position_key(route_id))
+        if not current or current['vehicle_id'] != vehicle.id or current['recorded_at'] < latest['recorded_at'].isoformat():
+            payload = position_payload(vehicle, latest)
+            cache.set(_position_key(route_id), payload, POSITION_TIMEOUT)
+            publish(route_id, payload)
+    return len(points), rejected
+
+
+def last_position(route_id):
+    """Newest known position on a route, or None"""
+    return cache.get(_position_key(route_id))
+
+
+def can_watch(user, route):
+    """Staff, drivers and students of the route's school may follow its bus"""
+    from config.models import SchoolConfig
+
+    if not user or not user.is_authenticated:
+        return False
+    if user.is_superuser:
+        return True
+    return route.school_id is not None and route.school_id in SchoolConfig.get_user_school_ids(user)
+
+
+def purge_positions(days=RETENTION_DAYS):
+    """Delete fixes older than `days` days. Returns the number of rows removed."""
+    from .models import VehiclePosition
+
+    deleted, _ = VehiclePosition.objects.filter(recorded_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
@@ -13,6 +13,10 @@ urlpatterns = [
     path('api/transport/drivers/<int:driver_id>/', views.api_transport_driver_detail, name='api_transport_driver_detail'),
     path('api/transport/driver/dashboard/', views.api_driver_dashboard, name='api_driver_dashboard'),
     path('api/transport/student/<int:student_id>/location/update/', views.api_update_student_transport_location, name='api_update_student_transport_location'),
+    path('api/transport/driver/locations/', views.api_driver_locations, name='api_driver_locations'),
+    path('api/transport/routes/<int:route_id>/position/', views.api_route_position, name='api_route_position'),
+    path('api/transport/geocode/search/', views.api_geocode_search, name='api_geocode_search'),
+    path('api/transport/geocode/reverse/', views.api_geocode_reverse, name='api_geocode_reverse'),
     path('api/driver/expenses/', views.api_driver_expenses, name='api_driver_expenses'),
     path('api/driver/leaves/', views.api_driver_leaves, name='api_driver_leaves'),
     path('api/driver/advances/', views.api_driver_advances, name='api_driver_advances'),
@@ -7,6 +7,7 @@ from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from .models import TransportStudentAccount, TransportTransaction, Route, TransportAssignment, TransportVehicle, TransportDriver, TransportExpense, TransportLeaveRequest, TransportAdvanceRequest
 from schools.models import Student
+from finance.term_billing import current_period
 import json
 
 @login_required
@@ -150,13 +151,16 @@ def api_transport_student_detail(request, student_id):
                     pickup_location_embed=pickup_location_embed
                 )
                 
-                # Auto-charge for the route
+                # Auto-charge for the route, tagged so the term's billing run counts it
+                term, academic_year = current_period(account.school or account.student.school)
                 TransportTransaction.objects.create(
                     account=account,
                     type='CHARGE',
                     amount=route.cost_per_term,
                     description=f"Route Assignment: {route.name}",
-                    recorded_by=request.user
+                    recorded_by=request.user,
+                    term=term,
+                    academic_year=academic_year
                 )
 
                 return JsonResponse({'success': True})
@@ -530,16 +534,25 @@ def api_driver_dashboard(request):
         if not route:
             return JsonResponse({'error': 'Vehicle not assigned to a route'}, status=400)
 
-        assignments = TransportAssignment.objects.filter(
-            route=route, 
-            active=True
-        ).select_related('account__student')
+        from datetime import timedelta
+        from .route_planner import plan_route, orient
+        assignments, plan = plan_route(route)
+        by_id = {a.id: a for a in assignments}
+        try:
+            driver_lat = float(request.GET['lat'])
+            driver_lng = float(request.GET['lng'])
+        except (KeyError, ValueError):
+            driver_lat = driver_lng = None
+        now = timezone.now()
         
+        # Students in pickup order, with the run sheet's distances and ETAs
         students_data = []
-        for a in assignments:
+        for stop in orient(plan, assignments, driver_lat, driver_lng):
+            a = by_id[stop['assignment_id']]
             student = a.account.student
             phone = student.parent_phone or student.guardian_phone or 'N/A'
             photo_url = student.photo.url if student.photo else None
+            eta = now + timedelta(minutes=stop['eta_minutes']) if stop['eta_minutes'] is not None else None
             
             students_data.append({
                 'id': student.id,
@@ -548,7 +561,12 @@ def api_driver_dashboard(request):
                 'pickup_point': a.pickup_point,
                 'lat': a.latitude,
                 'lng': a.longitude,
-                'photo_url': photo_url
+                'photo_url': photo_url,
+                'sequence': stop['sequence'],
+                'leg_km': stop['leg_km'],
+                'cumulative_km': stop['cumulative_km'],
+                'eta_minutes': stop['eta_minutes'],
+                'eta': eta.isoformat() if eta else None,
             })
 
         return JsonResponse({
@@ -561,12 +579,70 @@ def api_driver_dashboard(request):
             'route': {
                 'id': route.id,
                 'name': route.name,
+                'total_km': plan['total_km'],
+                'duration_minutes': plan['duration_minutes'],
+                'unlocated_stops': plan['unlocated'],
             },
             'students': students_data
         })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@csrf_exempt
+@login_required
+def api_driver_locations(request):
+    """Batched GPS fixes from the driver app: {"points": [{"lat", "lng", "t", ...}]}"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    user = request.user
+    if not hasattr(user, 'transport_driver_profile'):
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    vehicle = getattr(user.transport_driver_profile, 'vehicle', None)
+    if not vehicle:
+        return JsonResponse({'error': 'No vehicle assigned'}, status=400)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    points = data.get('points') if isinstance(data, dict) else data
+    if not isinstance(points, list):
+        return JsonResponse({'error': 'points must be a list'}, status=400)
+
+    from .tracking import ingest
+    accepted, rejected = ingest(vehicle, points)
+    return JsonResponse({'success': True, 'accepted': accepted, 'rejected': rejected})
+
+@login_required
+def api_route_position(request, route_id):
+    """Last known bus position on a route, for clients without a WebSocket"""
+    from .tracking import can_watch, last_position
+    route = get_object_or_404(Route, pk=route_id)
+    if not can_watch(request.user, route):
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    return JsonResponse({'position': last_position(route.id)})
+
+@login_required
+def api_geocode_search(request):
+    """Pickup-point autocomplete, answered from the geocode cache after first use"""
+    from schools.utils.nominatim import search_addresses
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 5)), 1), 10)
+    except ValueError:
+        limit = 5
+    return JsonResponse({'results': search_addresses(query, limit)})
+
+@login_required
+def api_geocode_reverse(request):
+    """Address of a GPS position, answered from the geocode cache after first use"""
+    from schools.utils.nominatim import reverse_geocode
+    try:
+        lat = float(request.GET['lat'])
+        lng = float(request.GET['lng'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat and lng are required'}, status=400)
+    return JsonResponse({'address': reverse_geocode(lat, lng)})
+
 @csrf_exempt
 @login_required
 def api_update_student_transport_location(request, student_id):